@@ -0,0 +1,90 @@
+"""
+Counts the account calls (positions, account profile, instrument lookups) and the quote calls TradingAgent makes
+against FakeBroker when created, in a trading round buying and selling a few symbols, and for a snapshot, after
+indexing the instruments like the trader does at startup. Also checks that the fills after a snapshot leave it
+unchanged.
+Run from the Robin directory: python -m benchmarks.bench_account_calls
+"""
+import os
+import tempfile
+
+# The instrument index is stored under the package root.
+os.environ.setdefault("ROBIN_PACKAGE_ROOT", tempfile.mkdtemp(prefix="robin_account_"))
+
+import logging
+
+import pytz
+
+from datetime import datetime
+
+from benchmarks.bench_intraday_loop import make_bars
+from trading.broker import set_broker
+from trading.fake_broker import FakeBroker
+from trading.instrument_index import get_instrument_index
+from trading.trading_agent import TradingAgent
+from util.util import SimulatedClock, set_clock
+
+SYMBOL_COUNT = 26
+
+HELD_SYMBOL_COUNT = 10
+
+ACCOUNT_CALLS = [
+	'get_open_stock_positions', 'load_account_profile', 'get_symbol_by_url', 'get_instruments_by_symbols',
+	'get_quotes'
+]
+
+
+def account_calls(broker: FakeBroker, before: dict) -> dict:
+	calls = broker.call_counts()
+	return {name: calls.get(name, 0) - before.get(name, 0) for name in ACCOUNT_CALLS}
+
+
+def main():
+	logging.disable(logging.INFO)
+	symbols = [f'S{i:04d}' for i in range(SYMBOL_COUNT)]
+	broker = FakeBroker(make_bars(symbols))
+	set_broker(broker)
+	set_clock(SimulatedClock(pytz.timezone('US/Eastern').localize(datetime(2024, 6, 10, 11, 0))))
+	for symbol in symbols[:HELD_SYMBOL_COUNT]:
+		broker.order_buy_fractional_by_price(symbol, 1000)
+
+	phases = []
+	before = broker.call_counts()
+	get_instrument_index().build(symbols)
+	phases.append(('index', account_calls(broker, before)))
+
+	before = broker.call_counts()
+	agent = TradingAgent(symbols, None)
+	phases.append(('create', account_calls(broker, before)))
+
+	before = broker.call_counts()
+	for symbol in symbols[HELD_SYMBOL_COUNT:HELD_SYMBOL_COUNT + 3]:
+		agent.buy(symbol, uuid=symbol)
+	for symbol in symbols[:2]:
+		agent.clean_positions(symbol, uuid=symbol)
+	agent.wait_for_orders()
+	phases.append(('3 buys, 2 sells', account_calls(broker, before)))
+
+	before = broker.call_counts()
+	snapshot = agent.snapshot()
+	phases.append(('snapshot', account_calls(broker, before)))
+
+	# A snapshot is a copy, the fills after it leave it unchanged.
+	positions = dict(snapshot.positions)
+	active_orders = {symbol: list(orders) for symbol, orders in snapshot.active_orders.items()}
+	agent.clean_positions(symbols[2], uuid=symbols[2])
+	agent.wait_for_orders()
+	assert len(agent.get_active_orders(symbols[2])) == 0
+	assert snapshot.positions == positions and snapshot.active_orders == active_orders
+	agent.stop()
+
+	print(f"{'phase':>16} {'positions':>10} {'account_profile':>16} {'symbol_by_url':>14} {'instruments':>12} "
+		  f"{'quotes':>7} {'total':>6}")
+	for phase, calls in phases:
+		print(f"{phase:>16} {calls['get_open_stock_positions']:>10} {calls['load_account_profile']:>16} "
+			  f"{calls['get_symbol_by_url']:>14} {calls['get_instruments_by_symbols']:>12} "
+			  f"{calls['get_quotes']:>7} {sum(calls.values()):>6}")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,214 @@
+"""
+Checks AlphaStrategy.action_batch against the per-symbol evaluation AlphaStrategy.action did before, and times
+both over synthetic bars. Run from the Robin directory: python -m benchmarks.bench_alpha_strategy
+"""
+import logging
+import timeit
+
+import numpy as np
+import pandas as pd
+
+from datetime import timedelta
+
+from benchmarks.bench_indicator_kernels import legacy_gold_cross, legacy_main_force_data
+from trading.bar_ids import format_bar_id, make_bar_ids, parse_bar_id
+from trading.bar_store import BarStore
+from trading.base_strategy import Action, ActionMetadata, BaseStrategy
+from trading.indicator_engine import compute_indicators, indicator_specs
+from trading.strategies.alpha_strategy import AlphaStrategy, MIN_PURCHASE_GAP
+from trading.trading_agent import OrderMetadata
+
+SYMBOL_COUNTS = [26, 100, 500]
+
+BAR_COUNT = 600
+
+EVALUATION_COUNT = 40
+
+REPEAT = 3
+
+
+class SnapshotCollector(object):
+	"""
+	Serves fixed snapshots with the requested indicators, in place of StockHistoricalCollector.
+	"""
+
+	def __init__(self, snapshots):
+		self._snapshots = snapshots
+		self._derived = dict()
+
+	def get_snapshot(self, symbol, metadata_list=None, bollinger=None, rsi_metadata=None):
+		if symbol not in self._derived:
+			snapshot = self._snapshots[symbol]
+			self._derived[symbol] = snapshot.with_columns(
+				compute_indicators(snapshot.columns, metadata_list, bollinger, rsi_metadata),
+				indicator_specs(metadata_list, bollinger, rsi_metadata))
+		return self._derived[symbol]
+
+
+class OrderBook(object):
+	def __init__(self, active_orders):
+		self._active_orders = active_orders
+
+	def get_active_orders(self, symbol):
+		return self._active_orders[symbol]
+
+
+def legacy_action(strategy: AlphaStrategy, symbol: str, test_datetime=None) -> ActionMetadata:
+	snapshot = strategy.get_snapshot(symbol)
+	should_buy = BaseStrategy.should_buy(strategy, symbol, snapshot)
+	if symbol in ["CELH", "DELL"]:
+		should_buy = False
+	should_sell = BaseStrategy.should_sell(strategy, symbol, snapshot)
+	if not should_buy and not should_sell:
+		return ActionMetadata(action=Action.HOLD, amount=0, uuid="")
+
+	df = snapshot.frame()
+	if test_datetime:
+		df = df.loc[df["begins_at"] < test_datetime - timedelta(minutes=5)]
+
+	active_orders = strategy._trade_agent.get_active_orders(symbol)
+	main_force_entry, main_force_pulling_up = legacy_main_force_data(df)
+	golden_cross = legacy_gold_cross(df)
+	bar_row = len(df) - 1
+	uuid = format_bar_id(int(df['bar_id'].values[bar_row]))
+
+	if should_buy:
+		for active_order in active_orders:
+			order_row = snapshot.row_of(parse_bar_id(active_order.uuid))
+			if order_row is not None and len(df) - MIN_PURCHASE_GAP <= order_row < len(df):
+				should_buy = False
+				break
+		golden_pit = list((df['term_line_8'] < 15) & (df['term_line_21'] < 15) & (df['term_line_55'] < 15))[-1]
+		if should_buy and golden_pit and (golden_cross[-1] or main_force_entry[-1]):
+			return ActionMetadata(action=Action.BUY, amount=1, uuid=uuid)
+
+	if should_sell:
+		over_buys = list(df['rsi'] > 80)
+		max_buy_price = max([active_order.price for active_order in active_orders])
+		resistance_signals = [df['close_price'][i] >= df['upper_band'][i] for i in range(len(df))]
+		has_resistance_signal = False
+		over_buy = False
+		if not main_force_pulling_up[-1]:
+			i = 2
+			while main_force_pulling_up[-i] and i <= len(main_force_pulling_up):
+				if resistance_signals[-i]:
+					has_resistance_signal = True
+				if over_buys[-i]:
+					over_buy = True
+				i += 1
+		sell_price_valid = list(df['upper_band'])[-1] >= max_buy_price * 1.005
+		if has_resistance_signal and sell_price_valid:
+			return ActionMetadata(action=Action.SELL, amount=0, uuid=uuid)
+
+	return ActionMetadata(action=Action.HOLD, amount=0, uuid="")
+
+
+def synthetic_strategy(symbol_count: int, bar_count: int, seed: int = 0) -> AlphaStrategy:
+	rng = np.random.default_rng(seed)
+	begins_at = pd.date_range('2024-07-08 13:30:00+00:00', periods=bar_count, freq='5min')
+	snapshots = dict()
+	active_orders = dict()
+	for i in range(symbol_count):
+		symbol = f'S{i:04d}'
+		close_prices = 100 + np.cumsum(rng.normal(0, 0.3, bar_count))
+		open_prices = close_prices + rng.normal(0, 0.1, bar_count)
+		store = BarStore(retention=bar_count)
+		store.append({
+			'begins_at': begins_at,
+			'open_price': open_prices,
+			'close_price': close_prices,
+			'high_price': np.maximum(open_prices, close_prices) + np.abs(rng.normal(0, 0.2, bar_count)),
+			'low_price': np.minimum(open_prices, close_prices) - np.abs(rng.normal(0, 0.2, bar_count)),
+			'volume': rng.integers(1000, 100000, bar_count),
+			'bar_id': make_bar_ids(symbol, begins_at),
+		})
+		snapshots[symbol] = store.snapshot(1)
+		# Every other symbol holds a position, bought at a random bar and price.
+		active_orders[symbol] = []
+		if i % 2 == 1:
+			bar = int(rng.integers(bar_count // 2, bar_count))
+			active_orders[symbol].append(OrderMetadata(
+				uuid=format_bar_id(int(store.values('bar_id')[bar])),
+				stock=symbol,
+				time=begins_at[bar].to_pydatetime(),
+				price=float(close_prices[bar] * rng.uniform(0.9, 1.0)),
+				share=1,
+				remain_portion=-1
+			))
+	return AlphaStrategy(SnapshotCollector(snapshots), OrderBook(active_orders))
+
+
+def evaluation_times(bar_count: int):
+	begins_at = pd.date_range('2024-07-08 13:30:00+00:00', periods=bar_count, freq='5min')
+	return [begins_at[i].to_pydatetime() + timedelta(minutes=10)
+			for i in np.linspace(100, bar_count - 2, EVALUATION_COUNT).astype(int)] + [None]
+
+
+def check_equivalence(symbol_count: int):
+	strategy = synthetic_strategy(symbol_count, BAR_COUNT)
+	symbols = [f'S{i:04d}' for i in range(symbol_count)]
+	counts = {action: 0 for action in Action}
+	for test_datetime in evaluation_times(BAR_COUNT):
+		actions = strategy.action_batch(symbols, test_datetime)
+		for symbol in symbols:
+			assert actions[symbol] == legacy_action(strategy, symbol, test_datetime), (symbol, test_datetime)
+			counts[actions[symbol].action] += 1
+	return counts
+
+
+def check_failures(symbol_count: int):
+	"""
+	A symbol whose evaluation raises is held without changing the actions of the others, and a sell filled while the
+	symbols are evaluated fails none of them.
+	"""
+	symbols = [f'S{i:04d}' for i in range(symbol_count)]
+	expected = synthetic_strategy(symbol_count, BAR_COUNT).action_batch(symbols)
+
+	strategy = synthetic_strategy(symbol_count, BAR_COUNT)
+	get_snapshot = strategy.get_snapshot
+
+	def failing_get_snapshot(symbol):
+		if symbol == symbols[1]:
+			raise ConnectionError(f"No snapshot for {symbol}.")
+		return get_snapshot(symbol)
+
+	strategy.get_snapshot = failing_get_snapshot
+	actions = strategy.action_batch(symbols)
+	assert strategy.failed_symbols == symbols[1:2]
+	assert actions[symbols[1]] == ActionMetadata(action=Action.HOLD, amount=0, uuid="")
+	assert all([actions[symbol] == expected[symbol] for symbol in symbols if symbol != symbols[1]])
+
+	strategy = synthetic_strategy(symbol_count, BAR_COUNT)
+	should_sell = strategy.should_sell
+
+	def filled_should_sell(symbol, snapshot=None, active_orders=None):
+		result = should_sell(symbol, snapshot, active_orders)
+		# The OrderTracker thread resolving a sell of the symbol.
+		strategy._trade_agent._active_orders[symbol] = []
+		return result
+
+	strategy.should_sell = filled_should_sell
+	assert strategy.action_batch(symbols) == expected
+	assert strategy.failed_symbols == []
+
+
+def main():
+	# check_failures logs the errors it raises.
+	logging.disable(logging.ERROR)
+	check_failures(SYMBOL_COUNTS[0])
+	print("A failing symbol is held alone, a sell filled during the evaluation fails no symbol.")
+	print(f"{'symbols':>8} {'per_symbol_ms':>14} {'batch_ms':>10} {'speedup':>8}  actions")
+	for symbol_count in SYMBOL_COUNTS:
+		counts = check_equivalence(symbol_count)
+		strategy = synthetic_strategy(symbol_count, BAR_COUNT)
+		symbols = [f'S{i:04d}' for i in range(symbol_count)]
+		test_datetime = evaluation_times(BAR_COUNT)[-2]
+		per_symbol = min(timeit.repeat(
+			lambda: [legacy_action(strategy, symbol, test_datetime) for symbol in symbols], number=1, repeat=REPEAT))
+		batch = min(timeit.repeat(lambda: strategy.action_batch(symbols, test_datetime), number=1, repeat=REPEAT))
+		print(f"{symbol_count:>8} {per_symbol * 1000:>14.2f} {batch * 1000:>10.2f} {per_symbol / batch:>7.1f}x  "
+			  f"{', '.join(f'{action.name}={count}' for action, count in counts.items())}")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,78 @@
+"""
+Checks that Backtester fills the same orders as stepping AlphaStrategy through the session like run_test_cycles,
+and times both. Run from the Robin directory: python -m benchmarks.bench_backtester
+"""
+import logging
+import time as timer
+
+import pandas as pd
+
+from datetime import timedelta
+
+from benchmarks.bench_alpha_strategy import BAR_COUNT, synthetic_strategy
+from trading.backtester import Backtester, SimulatedTradingAgent
+from trading.base_strategy import Action
+from trading.strategies.alpha_strategy import AlphaStrategy
+
+SYMBOL_COUNTS = [26, 100]
+
+SESSION_STEPS = 78
+
+
+def session_times():
+	begins_at = pd.date_range('2024-07-08 13:30:00+00:00', periods=BAR_COUNT, freq='5min')
+	return [begins_at[BAR_COUNT - SESSION_STEPS - 1 + i].to_pydatetime() + timedelta(minutes=10)
+			for i in range(SESSION_STEPS)]
+
+
+def prepare(symbol_count: int):
+	symbols = [f'S{i:04d}' for i in range(symbol_count)]
+	strategy: AlphaStrategy = synthetic_strategy(symbol_count, BAR_COUNT)
+	agent = SimulatedTradingAgent(symbols)
+	strategy._trade_agent = agent
+	for symbol in symbols:
+		strategy.get_snapshot(symbol)
+	return symbols, strategy, agent
+
+
+def stepping_run(symbols, strategy: AlphaStrategy, agent: SimulatedTradingAgent):
+	"""
+	run_test_cycles before the backtester: evaluate every symbol at every step over the bars before it.
+	"""
+	orders = []
+	for time in session_times():
+		actions = strategy.action_batch(symbols, time)
+		for symbol in symbols:
+			df = strategy.get_snapshot(symbol).frame()
+			price = list(df.loc[df["begins_at"] < time - timedelta(minutes=5)]["close_price"])[-1]
+			if actions[symbol].action == Action.BUY:
+				orders.append(agent.test_buy(symbol=symbol, uuid=actions[symbol].uuid, price=price, time=time))
+			elif actions[symbol].action == Action.SELL:
+				orders.append(agent.test_clean_all_position(
+					symbol=symbol, uuid=actions[symbol].uuid, price=price, time=time))
+	return orders
+
+
+def backtester_run(symbols, strategy: AlphaStrategy, agent: SimulatedTradingAgent):
+	return Backtester(strategy, agent).run(symbols, session_times())
+
+
+def main():
+	logging.disable(logging.INFO)
+	print(f"{'symbols':>8} {'steps':>6} {'stepping_ms':>12} {'backtester_ms':>14} {'speedup':>8} {'orders':>7}")
+	for symbol_count in SYMBOL_COUNTS:
+		stepping_setup = prepare(symbol_count)
+		backtester_setup = prepare(symbol_count)
+		start = timer.perf_counter()
+		expected = stepping_run(*stepping_setup)
+		stepping = timer.perf_counter() - start
+		start = timer.perf_counter()
+		orders = backtester_run(*backtester_setup)
+		backtester = timer.perf_counter() - start
+		assert orders == expected, (orders, expected)
+		print(f"{symbol_count:>8} {SESSION_STEPS:>6} {stepping * 1000:>12.1f} {backtester * 1000:>14.1f} "
+			  f"{stepping / backtester:>7.1f}x {len(orders):>7}")
+
+
+if __name__ == "__main__":
+	main()
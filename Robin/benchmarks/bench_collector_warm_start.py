@@ -0,0 +1,95 @@
+"""
+Checks that StockHistoricalCollector warm-started from the bar archive of an earlier day catches up with the bars
+published since, against a FakeBroker rejecting the historicals requests robin_stocks rejects. The first run stops
+in the middle of a session, the next one starts two trading days later: the collector must hold the regular session
+bars of the gap, every bar of the current day, the same bars as a cold start without archive, and keep appending
+the new bars.
+Run from the Robin directory: python -m benchmarks.bench_collector_warm_start
+"""
+import os
+import tempfile
+
+# The collector archives its bars under the package root.
+os.environ.setdefault("ROBIN_PACKAGE_ROOT", tempfile.mkdtemp(prefix="robin_warm_start_"))
+
+import logging
+
+import pandas as pd
+import pytz
+
+from datetime import datetime, timedelta
+
+from benchmarks.bench_intraday_loop import make_bars
+from trading.bar_archive import BarArchive
+from trading.broker import set_broker
+from trading.fake_broker import FakeBroker
+from trading.fetch_scheduler import FetchScheduler
+from trading.stock_historical_collector import StockHistoricalCollector
+from util.util import SimulatedClock, set_clock
+
+SYMBOL_COUNT = 30
+
+TIMEZONE = pytz.timezone('US/Eastern')
+
+# The first run stops here.
+STOPPED_AT = TIMEZONE.localize(datetime(2024, 6, 7, 12, 0))
+
+# The next run starts here, after the weekend.
+RESTARTED_AT = TIMEZONE.localize(datetime(2024, 6, 10, 10, 30))
+
+NEW_BARS = 3
+
+
+def completed(begins_at: pd.DatetimeIndex, now: datetime) -> pd.DatetimeIndex:
+	return begins_at[begins_at <= pd.Timestamp(now) - pd.Timedelta(minutes=5)]
+
+
+def stored(collector: StockHistoricalCollector, symbol: str) -> pd.DatetimeIndex:
+	return pd.DatetimeIndex(collector.get_snapshot(symbol).values('begins_at'))
+
+
+def main():
+	logging.disable(logging.INFO)
+	symbols = [f'S{i:04d}' for i in range(SYMBOL_COUNT)]
+	bars = make_bars(symbols)
+	begins_at = bars[symbols[0]]['begins_at']
+	set_broker(FakeBroker(bars))
+	with tempfile.TemporaryDirectory() as root:
+		set_clock(SimulatedClock(STOPPED_AT))
+		StockHistoricalCollector(symbols, fetch_scheduler=FetchScheduler(), archive=BarArchive(root))
+
+		set_clock(SimulatedClock(RESTARTED_AT))
+		collector = StockHistoricalCollector(symbols, fetch_scheduler=FetchScheduler(), archive=BarArchive(root))
+		local_times = begins_at.tz_convert(TIMEZONE)
+		regular_gap = begins_at[
+			(begins_at >= pd.Timestamp(STOPPED_AT)) & (local_times.date < RESTARTED_AT.date())
+			& (local_times.strftime('%H%M') >= '0930') & (local_times.strftime('%H%M') < '1600')]
+		today = completed(begins_at[local_times.date == RESTARTED_AT.date()], RESTARTED_AT)
+		for symbol in symbols:
+			symbol_begins_at = stored(collector, symbol)
+			assert symbol_begins_at.is_monotonic_increasing and symbol_begins_at.is_unique
+			assert regular_gap.isin(symbol_begins_at).all(), f"{symbol} misses the regular bars of the gap"
+			assert today.isin(symbol_begins_at).all(), f"{symbol} misses the bars of the current day"
+		assert set(collector.wait_for_new_bars(timeout=0)) == set(symbols)
+		with tempfile.TemporaryDirectory() as cold_root:
+			cold_collector = StockHistoricalCollector(
+				symbols, fetch_scheduler=FetchScheduler(), archive=BarArchive(cold_root))
+		for symbol in symbols:
+			assert stored(collector, symbol).equals(stored(cold_collector, symbol)), \
+				f"{symbol} has other bars than a cold start"
+			assert (collector.get_snapshot(symbol).values('close_price')
+					== cold_collector.get_snapshot(symbol).values('close_price')).all()
+
+		now = RESTARTED_AT + timedelta(minutes=5 * NEW_BARS)
+		set_clock(SimulatedClock(now))
+		collector._collect_stock_info('day')
+		assert set(collector.wait_for_new_bars(timeout=0)) == set(symbols)
+		for symbol in symbols:
+			assert stored(collector, symbol)[-1] == completed(begins_at, now)[-1]
+
+	print(f"{'symbols':>8} {'gap_regular_bars':>17} {'today_bars':>11} {'new_bars':>9}")
+	print(f"{SYMBOL_COUNT:>8} {len(regular_gap):>17} {len(today):>11} {NEW_BARS:>9}")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,207 @@
+"""
+Decision latency of the trading hot path over synthetic bars of several sizes: reading the bars with their
+indicators (get_historical_info_by_symbol), the AlphaStrategy signals (gold_cross, main_force_data), deciding the
+actions per symbol and in a batch, and a full trader loop iteration (fetching the new bars from FakeBroker, publishing
+them and trading the symbols with new bars). The timings are written to RESULTS_FILE, compared with the timings
+already there, so a regression of the hot path shows up in the diff under review.
+Run from the Robin directory: python -m benchmarks.bench_decision_latency [--output path] [--max-bars n]
+"""
+import os
+import tempfile
+
+# The trader writes its orders under the package root.
+os.environ.setdefault("ROBIN_PACKAGE_ROOT", tempfile.mkdtemp(prefix="robin_latency_"))
+
+import argparse
+import json
+import logging
+import platform
+import statistics
+import time as timer
+
+import numpy as np
+import pandas as pd
+
+from datetime import timedelta
+
+from intraday_stock_trader import trade_stocks
+from trading.bar_archive import BarArchive
+from trading.broker import set_broker
+from trading.fake_broker import FakeBroker
+from trading.fetch_scheduler import FetchScheduler
+from trading.historicals_parser import select_rows
+from trading.order_dispatcher import OrderDispatcher
+from trading.stock_historical_collector import StockHistoricalCollector
+from trading.strategies.alpha_strategy import AlphaStrategy
+from trading.trading_agent import TradingAgent
+from util.util import PACKAGE_ROOT, SimulatedClock, mkdir, set_clock
+
+# (symbols, bars per symbol)
+SIZES = [
+	(1, 100),
+	(1, 1000),
+	(1, 10000),
+	(1, 50000),
+	(10, 1000),
+	(10, 50000),
+	(100, 1000),
+	(100, 10000),
+	(1000, 100),
+	(1000, 1000),
+]
+
+LOOP_ITERATIONS = 5
+
+REPEAT = 3
+
+# Last bar of every synthetic series.
+LAST_BEGINS_AT = pd.Timestamp('2024-07-09 19:55:00+00:00')
+
+RESULTS_FILE = f"{os.path.dirname(os.path.abspath(__file__))}/results/decision_latency.json"
+
+
+def synthetic_bars(symbols, bar_count: int, seed: int = 0):
+	"""
+	Round the clock 5-minute bars up to LAST_BEGINS_AT as a random walk per symbol.
+	"""
+	rng = np.random.default_rng(seed)
+	begins_at = pd.date_range(end=LAST_BEGINS_AT, periods=bar_count, freq='5min')
+	bars = dict()
+	for symbol in symbols:
+		close_prices = 100 + np.cumsum(rng.normal(0, 0.3, bar_count))
+		open_prices = close_prices + rng.normal(0, 0.1, bar_count)
+		bars[symbol] = {
+			'begins_at': begins_at,
+			'open_price': open_prices,
+			'close_price': close_prices,
+			'high_price': np.maximum(open_prices, close_prices) + np.abs(rng.normal(0, 0.2, bar_count)),
+			'low_price': np.minimum(open_prices, close_prices) - np.abs(rng.normal(0, 0.2, bar_count)),
+			'volume': rng.integers(1000, 100000, bar_count),
+		}
+	return bars
+
+
+def set_time(time: pd.Timestamp):
+	set_clock(SimulatedClock(time.to_pydatetime()))
+
+
+def timings(fn, repeat: int = REPEAT):
+	samples = []
+	for _ in range(repeat):
+		start = timer.perf_counter()
+		fn()
+		samples.append((timer.perf_counter() - start) * 1000)
+	return {'min_ms': round(min(samples), 3), 'median_ms': round(statistics.median(samples), 3)}
+
+
+def prepare(symbols, bar_count: int, archive_root: str):
+	"""
+	A collector holding all but the last LOOP_ITERATIONS bars of every symbol with the strategy indicators published,
+	in front of a FakeBroker serving all of them.
+	"""
+	bars = synthetic_bars(symbols, bar_count)
+	broker = FakeBroker(bars, cash_position=len(symbols) * 1000 + 50000)
+	set_broker(broker)
+	primed = bar_count - LOOP_ITERATIONS
+	# Before the first bar, the collector finds nothing to fetch when created.
+	set_time(LAST_BEGINS_AT - timedelta(minutes=5) * bar_count)
+	collector = StockHistoricalCollector(
+		symbols,
+		retention=bar_count,
+		fetch_scheduler=FetchScheduler(calls_per_second=1e9),
+		archive=BarArchive(archive_root),
+		resolutions=[],
+		broker=broker
+	)
+	for symbol in symbols:
+		collector._append_bars(symbol, select_rows(bars[symbol], np.arange(primed)), archive=False)
+	set_time(bars[symbols[0]]['begins_at'][primed - 1] + timedelta(minutes=5))
+	strategy = AlphaStrategy(collector, TradingAgent(symbols, None))
+	for symbol in symbols:
+		strategy.get_snapshot(symbol)
+		collector._publish(symbol)
+	collector.wait_for_new_bars(timeout=0)
+	return bars, collector, strategy
+
+
+def measure(symbol_count: int, bar_count: int, archive_root: str):
+	symbols = [f'S{i:04d}' for i in range(symbol_count)]
+	bars, collector, strategy = prepare(symbols, bar_count, archive_root)
+	parameters = strategy.parameters
+
+	def historical_info():
+		return [collector.get_historical_info_by_symbol(
+			symbol, parameters.hjk_metadata_list, parameters.bollinger, parameters.rsi_metadata) for symbol in symbols]
+
+	frames = historical_info()
+	results = {
+		'get_historical_info_by_symbol': timings(historical_info),
+		'gold_cross': timings(lambda: [AlphaStrategy.gold_cross(df) for df in frames]),
+		'main_force_data': timings(lambda: [AlphaStrategy.main_force_data(df) for df in frames]),
+		'action': timings(lambda: [strategy.action(symbol) for symbol in symbols]),
+		'action_batch': timings(lambda: strategy.action_batch(symbols)),
+	}
+
+	# Every iteration, one more bar completes: fetch and publish it, then trade the symbols with new bars.
+	order_dispatcher = OrderDispatcher()
+	loop_samples = []
+	for begins_at in bars[symbols[0]]['begins_at'][bar_count - LOOP_ITERATIONS:]:
+		set_time(begins_at + timedelta(minutes=5))
+		start = timer.perf_counter()
+		collector._collect_stock_info('day')
+		fresh_symbols = collector.wait_for_new_bars(timeout=0)
+		trade_stocks(fresh_symbols, strategy._trade_agent, strategy, order_dispatcher, is_extended_hour=False)
+		loop_samples.append((timer.perf_counter() - start) * 1000)
+		assert len(fresh_symbols) == symbol_count
+	results['loop_iteration'] = {
+		'min_ms': round(min(loop_samples), 3), 'median_ms': round(statistics.median(loop_samples), 3)
+	}
+	strategy._trade_agent.wait_for_orders()
+	strategy._trade_agent.stop()
+	order_dispatcher.shutdown()
+	return results
+
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument('--output', default=RESULTS_FILE)
+	parser.add_argument('--max-bars', type=int, default=max(bars for _, bars in SIZES))
+	args = parser.parse_args()
+
+	logging.disable(logging.INFO)
+	mkdir(f"{PACKAGE_ROOT}/Data/Orders")
+	baseline = dict()
+	if os.path.exists(args.output):
+		with open(args.output) as f:
+			baseline = {(run['symbols'], run['bars']): run['timings'] for run in json.load(f)['runs']}
+
+	runs = []
+	print(f"{'symbols':>8} {'bars':>6} {'measure':>30} {'min_ms':>10} {'median_ms':>10} {'vs_baseline':>12}")
+	for symbol_count, bar_count in SIZES:
+		if bar_count > args.max_bars:
+			continue
+		# The loop iterations archive the new bars, every size starts from an empty archive.
+		with tempfile.TemporaryDirectory() as archive_root:
+			results = measure(symbol_count, bar_count, archive_root)
+		runs.append({'symbols': symbol_count, 'bars': bar_count, 'timings': results})
+		for name, result in results.items():
+			previous = baseline.get((symbol_count, bar_count), dict()).get(name)
+			ratio = f"{result['median_ms'] / previous['median_ms']:>11.2f}x" if previous else f"{'-':>12}"
+			print(f"{symbol_count:>8} {bar_count:>6} {name:>30} {result['min_ms']:>10.2f} "
+				  f"{result['median_ms']:>10.2f} {ratio}")
+
+	mkdir(os.path.dirname(args.output))
+	with open(args.output, 'w') as f:
+		f.write(json.dumps({
+			'python': platform.python_version(),
+			'machine': platform.machine(),
+			'cpu_count': os.cpu_count(),
+			'repeat': REPEAT,
+			'loop_iterations': LOOP_ITERATIONS,
+			'runs': runs,
+		}, indent=4))
+		f.write('\n')
+
+
+if __name__ == "__main__":
+	main()
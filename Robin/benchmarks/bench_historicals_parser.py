@@ -0,0 +1,81 @@
+"""
+Compares parse_historicals with the per-symbol DataFrame parsing StockHistoricalCollector used before.
+Run from the Robin directory: python -m benchmarks.bench_historicals_parser
+"""
+import datetime
+import timeit
+
+import numpy as np
+import pandas as pd
+
+from collections import defaultdict
+
+from trading.historicals_parser import parse_historicals
+
+SYMBOL_COUNTS = [26, 100, 500]
+
+BARS_PER_SYMBOL = 192
+
+REPEAT = 5
+
+
+def synthetic_historicals(symbol_count: int, bars_per_symbol: int, seed: int = 0):
+	rng = np.random.default_rng(seed)
+	start = datetime.datetime(2024, 7, 8, 8, 0, 0)
+	historical_info = []
+	for i in range(symbol_count):
+		close_prices = 100 + np.cumsum(rng.normal(0, 0.3, bars_per_symbol))
+		for j in range(bars_per_symbol):
+			close_price = close_prices[j]
+			historical_info.append({
+				'begins_at': (start + datetime.timedelta(minutes=5 * j)).strftime('%Y-%m-%dT%H:%M:%SZ'),
+				'open_price': f'{close_price + 0.05:.6f}',
+				'close_price': f'{close_price:.6f}',
+				'high_price': f'{close_price + 0.2:.6f}',
+				'low_price': f'{close_price - 0.2:.6f}',
+				'volume': int(rng.integers(1000, 100000)),
+				'session': 'reg',
+				'interpolated': False,
+				'symbol': f'S{i:04d}',
+			})
+	return historical_info
+
+
+def legacy_parse(historical_info):
+	stock_info_dict = defaultdict(list)
+	for info in historical_info:
+		stock_info_dict[info['symbol']].append(info)
+	stock_info_dataframes = {symbol: pd.DataFrame(stock_info_dict[symbol]) for symbol in stock_info_dict}
+	for symbol in stock_info_dataframes:
+		updated_df = stock_info_dataframes[symbol]
+		updated_df['begins_at'] = pd.to_datetime(updated_df['begins_at'])
+		updated_df['open_price'] = updated_df['open_price'].astype(float)
+		updated_df['close_price'] = updated_df['close_price'].astype(float)
+		updated_df['low_price'] = updated_df['low_price'].astype(float)
+		updated_df['high_price'] = updated_df['high_price'].astype(float)
+	return stock_info_dataframes
+
+
+def check_equivalence(historical_info):
+	legacy = legacy_parse(historical_info)
+	parsed = parse_historicals(historical_info)
+	assert set(legacy) == set(parsed)
+	for symbol in legacy:
+		for column in parsed[symbol]:
+			expected = legacy[symbol]['session'] == 'reg' if column == 'regular' else legacy[symbol][column]
+			np.testing.assert_array_equal(np.asarray(expected), np.asarray(parsed[symbol][column]))
+
+
+def main():
+	print(f"{'symbols':>8} {'bars':>8} {'legacy_ms':>10} {'parser_ms':>10} {'speedup':>8}")
+	for symbol_count in SYMBOL_COUNTS:
+		historical_info = synthetic_historicals(symbol_count, BARS_PER_SYMBOL)
+		check_equivalence(historical_info)
+		legacy = min(timeit.repeat(lambda: legacy_parse(historical_info), number=1, repeat=REPEAT))
+		parser = min(timeit.repeat(lambda: parse_historicals(historical_info), number=1, repeat=REPEAT))
+		print(f"{symbol_count:>8} {len(historical_info):>8} {legacy * 1000:>10.2f} {parser * 1000:>10.2f} "
+			  f"{legacy / parser:>7.1f}x")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,146 @@
+"""
+Checks trading.indicator_kernels against the per-call helpers AlphaStrategy defined before, on 1-D and 2-D input,
+and times both. Run from the Robin directory: python -m benchmarks.bench_indicator_kernels
+"""
+import timeit
+
+import numpy as np
+import pandas as pd
+
+from trading import indicator_kernels
+from trading.strategies.alpha_strategy import AlphaStrategy
+
+BAR_COUNTS = [200, 2000]
+
+SYMBOL_COUNT = 100
+
+REPEAT = 5
+
+
+def legacy_sma(values: np.array, window):
+	return np.array(pd.Series(values).rolling(window).mean())
+
+
+def legacy_wsma(values: np.array, window, weight):
+	wsma = np.full_like(values, np.nan)
+	for i in range(len(values)):
+		if i == 0:
+			wsma[i] = np.mean(values[:window])
+		else:
+			wsma[i] = (values[i] * weight + wsma[i-1] * (window - weight)) / window
+	return wsma
+
+
+def legacy_ema(values, window):
+	return np.array(pd.Series(values).ewm(span=window, adjust=False).mean())
+
+
+def legacy_llv(values, window):
+	return np.array(pd.Series(values).rolling(window).min())
+
+
+def legacy_hhv(values, window):
+	return np.array(pd.Series(values).rolling(window).max())
+
+
+def legacy_ref(values, period):
+	return np.roll(values, period)
+
+
+def legacy_cross(series1, series2):
+	return (series1 > series2) & (np.roll(series1, 1) <= np.roll(series2, 1))
+
+
+def legacy_main_force_data(df: pd.DataFrame):
+	close_prices = df['close_price'].values
+	open_prices = df['open_price'].values
+	low_prices = df['low_price'].values
+	high_prices = df['high_price'].values
+	sma, wsma, ema, llv, hhv, ref = legacy_sma, legacy_wsma, legacy_ema, legacy_llv, legacy_hhv, legacy_ref
+
+	var1 = ref((low_prices + open_prices + close_prices + high_prices) / 4, 1)
+	with np.errstate(divide='ignore', invalid='ignore'):
+		var2 = wsma(np.abs(low_prices - var1), 13, 1) / wsma(np.maximum(low_prices - var1, 0), 10, 1)
+	var3 = ema(var2, 10)
+	var4 = llv(low_prices, 33)
+	var5 = ema(np.where(low_prices <= var4, var3, 0), 3)
+	with np.errstate(divide='ignore', invalid='ignore'):
+		var21 = wsma(np.abs(high_prices - var1), 13, 1) / wsma(np.minimum(high_prices - var1, 0), 10, 1)
+	var31 = ema(var21, 10)
+	var41 = hhv(high_prices, 33)
+	var51 = ema(np.where(high_prices >= var41, var31, 0), 3)
+	return list(var5 > ref(var5, 1)), list(var51 < ref(var51, 1))
+
+
+def legacy_gold_cross(df: pd.DataFrame):
+	close_prices = df['close_price'].values
+	low_prices = df['low_price'].values
+	high_prices = df['high_price'].values
+	sma = legacy_sma
+
+	AL = (close_prices + low_prices + high_prices) / 3
+	AO = sma(AL, 5) - sma(AL, 13)
+	BBD = (AO - sma(AO, 3)) * 100
+	BBD_support = sma(BBD, 5)
+	return list(legacy_cross(BBD, BBD_support))
+
+
+def synthetic_bars(bar_count: int, seed: int = 0) -> pd.DataFrame:
+	rng = np.random.default_rng(seed)
+	close_prices = 100 + np.cumsum(rng.normal(0, 0.3, bar_count))
+	open_prices = close_prices + rng.normal(0, 0.1, bar_count)
+	return pd.DataFrame({
+		'open_price': open_prices,
+		'close_price': close_prices,
+		'high_price': np.maximum(open_prices, close_prices) + np.abs(rng.normal(0, 0.2, bar_count)),
+		'low_price': np.minimum(open_prices, close_prices) - np.abs(rng.normal(0, 0.2, bar_count)),
+	})
+
+
+def kernel_cases(values: np.ndarray):
+	return [
+		('sma', lambda x: indicator_kernels.sma(x, 13), lambda x: legacy_sma(x, 13)),
+		('wsma', lambda x: indicator_kernels.wsma(x, 13, 1), lambda x: legacy_wsma(x, 13, 1)),
+		('ema', lambda x: indicator_kernels.ema(x, 10), lambda x: legacy_ema(x, 10)),
+		('llv', lambda x: indicator_kernels.llv(x, 33), lambda x: legacy_llv(x, 33)),
+		('hhv', lambda x: indicator_kernels.hhv(x, 33), lambda x: legacy_hhv(x, 33)),
+		('ref', lambda x: indicator_kernels.ref(x, 1), lambda x: legacy_ref(x, 1)),
+		('cross', lambda x: indicator_kernels.cross(x, x[..., ::-1]), lambda x: legacy_cross(x, x[::-1])),
+	]
+
+
+def check_equivalence(bar_count: int):
+	frames = [synthetic_bars(bar_count, seed) for seed in range(SYMBOL_COUNT)]
+	matrix = np.stack([frame['close_price'].values for frame in frames])
+	for name, kernel, legacy in kernel_cases(matrix):
+		np.testing.assert_allclose(kernel(matrix[0]), legacy(matrix[0]), rtol=1e-12, err_msg=name)
+		batch = kernel(matrix)
+		for row in range(len(matrix)):
+			np.testing.assert_allclose(batch[row], legacy(matrix[row]), rtol=1e-12, err_msg=name)
+	for frame in frames[:10]:
+		main_force = AlphaStrategy.main_force_data(frame)
+		assert (main_force.main_force_entry, main_force.main_force_pulling_up) == legacy_main_force_data(frame)
+		assert AlphaStrategy.gold_cross(frame) == legacy_gold_cross(frame)
+
+
+def main():
+	print(f"{'kernel':>8} {'bars':>6} {'legacy_ms':>10} {'kernel_ms':>10} {'batch_ms':>10} {'speedup':>8}")
+	for bar_count in BAR_COUNTS:
+		check_equivalence(bar_count)
+		matrix = np.stack([synthetic_bars(bar_count, seed)['close_price'].values for seed in range(SYMBOL_COUNT)])
+		for name, kernel, legacy in kernel_cases(matrix):
+			# Legacy and per-symbol kernel calls over every symbol against one call over the symbol matrix.
+			legacy_time = min(timeit.repeat(lambda: [legacy(row) for row in matrix], number=1, repeat=REPEAT))
+			kernel_time = min(timeit.repeat(lambda: [kernel(row) for row in matrix], number=1, repeat=REPEAT))
+			batch_time = min(timeit.repeat(lambda: kernel(matrix), number=1, repeat=REPEAT))
+			print(f"{name:>8} {bar_count:>6} {legacy_time * 1000:>10.2f} {kernel_time * 1000:>10.2f} "
+				  f"{batch_time * 1000:>10.2f} {legacy_time / batch_time:>7.1f}x")
+		frame = synthetic_bars(bar_count)
+		legacy_time = min(timeit.repeat(lambda: legacy_main_force_data(frame), number=1, repeat=REPEAT))
+		kernel_time = min(timeit.repeat(lambda: AlphaStrategy.main_force_data(frame), number=1, repeat=REPEAT))
+		print(f"{'main_force_data':>15} {bar_count:>6} {legacy_time * 1000:>10.2f} {kernel_time * 1000:>10.2f} "
+			  f"{legacy_time / kernel_time:>7.1f}x")
+
+
+if __name__ == "__main__":
+	main()
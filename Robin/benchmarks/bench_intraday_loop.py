@@ -0,0 +1,144 @@
+"""
+Runs the live intraday_collecting loop offline against FakeBroker, with a simulated clock running SPEED times faster
+than real time from the end of the regular session of a synthetic trading day to the end of the after hours, and
+reports how much faster than real time the loop kept up, the loops run, the orders placed and the broker calls.
+Then checks that the trader stops its threads when the final trading snapshot fails for a missing quote.
+Run from the Robin directory: python -m benchmarks.bench_intraday_loop
+"""
+import os
+import tempfile
+
+# The trader reads its stock list and writes its orders and snapshots under the package root.
+os.environ.setdefault("ROBIN_PACKAGE_ROOT", tempfile.mkdtemp(prefix="robin_intraday_"))
+
+import logging
+import threading
+import time as timer
+
+import numpy as np
+import pandas as pd
+import pytz
+
+from datetime import date, datetime
+
+import intraday_stock_trader
+from trading.broker import set_broker
+from trading.fake_broker import FakeBroker
+from trading.order_journal import read_orders
+from trading.order_tracker import OrderTracker
+from trading.stock_historical_collector import StockHistoricalCollector
+from trading.walk_forward import trading_sessions
+from util.util import PACKAGE_ROOT, SimulatedClock, mkdir, set_clock
+
+SYMBOL_COUNT = 30
+
+SPEED = 100
+
+# Two days of extended hours bars before the replayed one, for the indicator lookback.
+START_DATE = date(2024, 6, 6)
+
+END_DATE = date(2024, 6, 10)
+
+CLOCK_START = pytz.timezone('US/Eastern').localize(datetime(2024, 6, 10, 15, 30))
+
+
+def make_bars(symbols, seed: int = 0):
+	"""
+	Extended hours bars, 4:00 to 20:00 ET, of every trading day from START_DATE to END_DATE as a random walk per symbol.
+	"""
+	rng = np.random.default_rng(seed)
+	begins_at = pd.DatetimeIndex(np.concatenate([
+		pd.date_range(session - pd.Timedelta(hours=5, minutes=30), periods=192, freq='5min').tz_convert('UTC')
+		for session in trading_sessions(START_DATE, END_DATE)
+	]))
+	bars = dict()
+	for symbol in symbols:
+		close_prices = 100 + np.cumsum(rng.normal(0, 0.3, len(begins_at)))
+		open_prices = close_prices + rng.normal(0, 0.1, len(begins_at))
+		bars[symbol] = {
+			'begins_at': begins_at,
+			'open_price': open_prices,
+			'close_price': close_prices,
+			'high_price': np.maximum(open_prices, close_prices) + np.abs(rng.normal(0, 0.2, len(begins_at))),
+			'low_price': np.minimum(open_prices, close_prices) - np.abs(rng.normal(0, 0.2, len(begins_at))),
+			'volume': rng.integers(1000, 100000, len(begins_at)),
+		}
+	return bars
+
+
+# Ten minutes before the end of the after hours.
+SHUTDOWN_CLOCK_START = pytz.timezone('US/Eastern').localize(datetime(2024, 6, 10, 19, 50))
+
+
+class MissingQuoteBroker(FakeBroker):
+	"""
+	Leaves the quote of the first symbol out, so every trading snapshot fails.
+	"""
+
+	def get_quotes(self, symbols) -> list:
+		return [quote for quote in super().get_quotes(symbols) if quote['symbol'] != 'S0000']
+
+
+class LoopCounter(logging.Handler):
+	"""
+	Counts the loops of intraday_collecting from its log lines, dropping every other record.
+	"""
+
+	def __init__(self):
+		super().__init__()
+		self.loops = 0
+		self.errors = 0
+
+	def emit(self, record: logging.LogRecord):
+		if record.levelno >= logging.ERROR:
+			self.errors += 1
+		elif 'Running loop for' in record.getMessage():
+			self.loops += 1
+
+
+def main():
+	symbols = [f'S{i:04d}' for i in range(SYMBOL_COUNT)]
+	mkdir(f"{PACKAGE_ROOT}/Config")
+	mkdir(f"{PACKAGE_ROOT}/Data/TradingSnapshot")
+	with open(f"{PACKAGE_ROOT}/Config/stock_list.txt", 'w') as f:
+		f.write(",".join(symbols))
+
+	counter = LoopCounter()
+	logging.basicConfig(level=logging.INFO, handlers=[counter], force=True)
+	broker = FakeBroker(make_bars(symbols), latency=0.02, error_rate=0.002, fill_delay=2)
+	set_broker(broker)
+	clock = SimulatedClock(CLOCK_START, speed=SPEED)
+	set_clock(clock)
+
+	start = timer.perf_counter()
+	intraday_stock_trader.intraday_collecting()
+	real = timer.perf_counter() - start
+	simulated = (clock.now() - CLOCK_START).total_seconds()
+
+	orders = len(read_orders())
+	calls = broker.call_counts()
+	print(f"{'symbols':>8} {'simulated_s':>12} {'real_s':>8} {'speedup':>8} {'loops':>6} {'orders':>7} "
+		  f"{'broker_calls':>13} {'injected_errors':>16} {'logged_errors':>14}")
+	print(f"{SYMBOL_COUNT:>8} {simulated:>12.0f} {real:>8.1f} {simulated / real:>7.1f}x {counter.loops:>6} "
+		  f"{orders:>7} {sum(calls.values()) - calls.get('errors', 0):>13} {calls.get('errors', 0):>16} "
+		  f"{counter.errors:>14}")
+	assert counter.loops > 0
+	check_shutdown(symbols)
+
+
+def check_shutdown(symbols):
+	set_broker(MissingQuoteBroker(make_bars(symbols)))
+	set_clock(SimulatedClock(SHUTDOWN_CLOCK_START, speed=SPEED))
+	logging.disable(logging.ERROR)
+	intraday_stock_trader.intraday_collecting()
+	logging.disable(logging.NOTSET)
+	leaked = [
+		thread for thread in threading.enumerate()
+		if isinstance(thread, (StockHistoricalCollector, OrderTracker)) and thread.is_alive()
+	]
+	assert not leaked, leaked
+	print("The trader stops its threads when the final trading snapshot fails.")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,85 @@
+"""
+Runs the StockHistoricalCollector thread against a FakeBroker publishing every 5-minute bar PUBLISH_DELAY clock
+seconds after it closes, with a simulated clock, and reports the clock seconds from the close of a bar to the new bar
+event of wait_for_new_bars. Compared with the fixed 60 seconds poll the collector used before scheduling its fetches
+from the bar closes.
+Run from the Robin directory: python -m benchmarks.bench_new_bar_latency
+"""
+import os
+import tempfile
+
+# The collector archives its bars under the package root.
+os.environ.setdefault("ROBIN_PACKAGE_ROOT", tempfile.mkdtemp(prefix="robin_bar_latency_"))
+
+import logging
+
+import numpy as np
+import pytz
+
+from datetime import datetime, timedelta
+
+from benchmarks.bench_intraday_loop import make_bars
+from trading.bar_archive import BarArchive
+from trading.fake_broker import FakeBroker
+from trading.fetch_scheduler import FetchScheduler
+from trading.stock_historical_collector import BAR_LENGTH, StockHistoricalCollector
+from util.util import SimulatedClock, get_datetime, set_clock
+
+SYMBOL_COUNT = 30
+
+SPEED = 20
+
+BARS = 4
+
+# Clock seconds between the close of a bar and its historicals.
+PUBLISH_DELAY = 8
+
+# In the middle of a bar, like a trader started at any time.
+CLOCK_START = pytz.timezone('US/Eastern').localize(datetime(2024, 6, 10, 10, 2, 30))
+
+
+class DelayedBroker(FakeBroker):
+	def _completed_rows(self, symbol: str, now: datetime) -> int:
+		return super()._completed_rows(symbol, now - timedelta(seconds=PUBLISH_DELAY))
+
+
+class FixedPollCollector(StockHistoricalCollector):
+	"""
+	The collector polling every 60 clock seconds.
+	"""
+
+	def _next_fetch_delay(self) -> float:
+		return 60
+
+
+def measure(collector_class, symbols, bars, root: str) -> np.ndarray:
+	set_clock(SimulatedClock(CLOCK_START, speed=SPEED))
+	broker = DelayedBroker(bars)
+	collector = collector_class(
+		symbols, fetch_scheduler=FetchScheduler(calls_per_second=1e9), archive=BarArchive(root), broker=broker)
+	collector.wait_for_new_bars(timeout=0)
+	collector.start()
+	latencies = []
+	while len(latencies) < BARS:
+		fresh_symbols = collector.wait_for_new_bars(timeout=2 * BAR_LENGTH.total_seconds())
+		assert set(fresh_symbols) == set(symbols), "Some symbols missed the bar"
+		close = collector.get_snapshot(symbols[0]).last('begins_at') + BAR_LENGTH
+		latencies.append((get_datetime() - close).total_seconds())
+	collector.stop()
+	collector.join()
+	return np.array(latencies)
+
+
+def main():
+	logging.disable(logging.INFO)
+	symbols = [f'S{i:04d}' for i in range(SYMBOL_COUNT)]
+	bars = make_bars(symbols)
+	print(f"{'collector':>12} {'bars':>5} {'mean_latency_s':>15} {'max_latency_s':>14}")
+	for name, collector_class in [('fixed_poll', FixedPollCollector), ('bar_close', StockHistoricalCollector)]:
+		with tempfile.TemporaryDirectory() as root:
+			latencies = measure(collector_class, symbols, bars, root)
+		print(f"{name:>12} {len(latencies):>5} {latencies.mean():>15.1f} {latencies.max():>14.1f}")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,156 @@
+"""
+Times a decision round where ACTION_COUNT symbols signal BUY at once, submitted through OrderDispatcher against a
+FakeBroker answering every call after LATENCY seconds, one order at a time and on a pool. The account holds cash for
+PORTION_COUNT portions only, every round must submit exactly that many buys however many run concurrently. A
+snapshot is taken during the round and the longest wait for the agent lock, which the fills need, is reported: the
+lock is not held while the broker answers. Also checks that trade_stocks returns the symbols to trade again: the
+ones whose evaluation failed and the buys beyond the cash.
+Run from the Robin directory: python -m benchmarks.bench_order_dispatch
+"""
+import os
+import tempfile
+
+# The instrument index is stored under the package root.
+os.environ.setdefault("ROBIN_PACKAGE_ROOT", tempfile.mkdtemp(prefix="robin_dispatch_"))
+
+import logging
+import time as timer
+
+from threading import Event, Thread
+
+import pytz
+
+from datetime import datetime
+
+from benchmarks.bench_intraday_loop import make_bars
+from intraday_stock_trader import trade_stocks
+from trading.base_strategy import Action, ActionMetadata, BaseStrategy
+from trading.broker import set_broker
+from trading.fake_broker import FakeBroker
+from trading.instrument_index import get_instrument_index
+from trading.order_dispatcher import DEFAULT_MAX_WORKERS, OrderDispatcher
+from trading.trading_agent import DEFAULT_PORTION_SIZE, TradingAgent
+from util.util import SimulatedClock, set_clock
+
+SYMBOL_COUNT = 26
+
+ACTION_COUNT = 8
+
+PORTION_COUNT = 5
+
+LATENCY = 0.2
+
+
+class LockWaits(Thread):
+	"""
+	Takes the lock of the agent every millisecond and records the longest wait.
+	"""
+
+	def __init__(self, agent: TradingAgent):
+		super().__init__(daemon=True)
+		self._agent = agent
+		self._stopped = Event()
+		self.max_wait = 0.0
+
+	def run(self):
+		while not self._stopped.wait(0.001):
+			start = timer.perf_counter()
+			with self._agent._lock:
+				self.max_wait = max(self.max_wait, timer.perf_counter() - start)
+
+	def stop(self):
+		self._stopped.set()
+		self.join()
+
+
+class BuyingStrategy(BaseStrategy):
+	"""
+	Signals BUY for every symbol, evaluating the failing symbol raises.
+	"""
+
+	def __init__(self, trading_agent: TradingAgent, failing_symbol: str):
+		super().__init__(None, trading_agent)
+		self._failing_symbol = failing_symbol
+
+	def action(self, stock, time):
+		if stock == self._failing_symbol:
+			raise ConnectionError(f"No bars for {stock}.")
+		return ActionMetadata(action=Action.BUY, amount=1, uuid=stock)
+
+
+def make_agent(symbols, latency: float) -> TradingAgent:
+	broker = FakeBroker(make_bars(symbols), cash_position=PORTION_COUNT * DEFAULT_PORTION_SIZE + 500, latency=latency)
+	set_broker(broker)
+	set_clock(SimulatedClock(pytz.timezone('US/Eastern').localize(datetime(2024, 6, 10, 11, 0))))
+	get_instrument_index().build(symbols)
+	return TradingAgent(symbols, None)
+
+
+def check_retry(symbols):
+	agent = make_agent(symbols, latency=0)
+	dispatcher = OrderDispatcher()
+	stocks = symbols[:ACTION_COUNT]
+	strategy = BuyingStrategy(agent, stocks[0])
+	retry_stocks = trade_stocks(stocks, agent, strategy, dispatcher, is_extended_hour=False)
+	assert agent.wait_for_orders(timeout=60)
+	bought = [stock for stock in stocks if len(agent.get_active_orders(stock)) == 1]
+	assert len(bought) == PORTION_COUNT
+	assert retry_stocks == [stock for stock in stocks if stock not in bought], retry_stocks
+
+	def failing_action_batch(stocks, time=None):
+		raise ConnectionError("No bars.")
+
+	# Nothing was evaluated, everything is traded again.
+	strategy.action_batch = failing_action_batch
+	assert trade_stocks(stocks, agent, strategy, dispatcher, is_extended_hour=False) == stocks
+	dispatcher.shutdown()
+	agent.stop()
+
+
+def run_round(symbols, max_workers: int) -> dict:
+	agent = make_agent(symbols, latency=LATENCY)
+	dispatcher = OrderDispatcher(max_workers=max_workers)
+	actions = {symbol: ActionMetadata(action=Action.BUY, amount=1, uuid=symbol) for symbol in symbols[:ACTION_COUNT]}
+
+	lock_waits = LockWaits(agent)
+	lock_waits.start()
+	snapshot = Thread(target=agent.snapshot)
+	snapshot.start()
+	start = timer.perf_counter()
+	latencies = dispatcher.dispatch(agent, actions, is_extended_hour=False)
+	elapsed = timer.perf_counter() - start
+	assert agent.wait_for_orders(timeout=60)
+	snapshot.join()
+	lock_waits.stop()
+	dispatcher.shutdown()
+	agent.stop()
+
+	submitted = [latency for latency in latencies.values() if latency is not None]
+	filled = [symbol for symbol in actions if len(agent.get_active_orders(symbol)) == 1]
+	assert len(submitted) == PORTION_COUNT, latencies
+	assert len(filled) == PORTION_COUNT, filled
+	return {
+		'round_s': elapsed,
+		'submitted': len(submitted),
+		'max_lock_wait_ms': lock_waits.max_wait * 1000,
+		'max_latency_ms': max(submitted) * 1000,
+		'p50_latency_ms': dispatcher.latency_summary()['p50_ms'],
+	}
+
+
+def main():
+	# The buys beyond the cash of the account fail by design.
+	logging.disable(logging.ERROR)
+	symbols = [f'S{i:04d}' for i in range(SYMBOL_COUNT)]
+	check_retry(symbols)
+	print("trade_stocks returns the symbols that failed to evaluate and the buys that failed to submit.")
+	print(f"{'workers':>8} {'actions':>8} {'submitted':>10} {'round_s':>8} {'p50_latency_ms':>15} {'max_latency_ms':>15} "
+		  f"{'max_lock_wait_ms':>17}")
+	for max_workers in [1, DEFAULT_MAX_WORKERS]:
+		result = run_round(symbols, max_workers)
+		print(f"{max_workers:>8} {ACTION_COUNT:>8} {result['submitted']:>10} {result['round_s']:>8.2f} "
+			  f"{result['p50_latency_ms']:>15.0f} {result['max_latency_ms']:>15.0f} {result['max_lock_wait_ms']:>17.1f}")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,164 @@
+"""
+Checks that the orders appended to OrderJournal read back the same, in bulk and by symbol, and that converting the
+Data/Orders JSON files of the repository journals the same orders. Then times persisting a day of orders the way
+persist_order_details did, reading and rewriting the JSON file of the symbol for every order, against appending
+them to the journal, on the calling thread and including the background writes.
+Run from the Robin directory: python -m benchmarks.bench_order_journal
+"""
+import os
+import tempfile
+
+# The journal is stored under the package root.
+os.environ.setdefault("ROBIN_PACKAGE_ROOT", tempfile.mkdtemp(prefix="robin_journal_"))
+
+import dataclasses
+import glob
+import json
+import logging
+import time as timer
+
+import numpy as np
+import pytz
+
+from datetime import datetime, timedelta
+
+from trading.order_journal import OrderJournal, convert_order_files, parse_order, read_orders
+from trading.trading_agent import OrderMetadata
+from util.util import get_yyyymmdd_date, json_serial, mkdir
+
+REPOSITORY_ORDERS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Data', 'Orders')
+
+SYMBOL_COUNT = 26
+
+ORDER_COUNTS = [10, 100, 300]
+
+
+def make_orders(symbols, orders_per_symbol: int, seed: int = 0):
+	rng = np.random.default_rng(seed)
+	time = pytz.timezone('US/Eastern').localize(datetime(2024, 6, 10, 9, 30))
+	orders = []
+	for i in range(orders_per_symbol * len(symbols)):
+		time += timedelta(seconds=1)
+		orders.append(OrderMetadata(
+			uuid=f"{i:08d}",
+			stock=symbols[rng.integers(len(symbols))],
+			time=time,
+			price=float(rng.uniform(10, 500)),
+			share=float(rng.uniform(-10, 10)),
+			remain_portion=int(rng.integers(50))
+		))
+	return orders
+
+
+def persist_order_json(directory: str, order: OrderMetadata):
+	"""
+	persist_order_details before the journal.
+	"""
+	output_file = f"{directory}/{order.stock}.{get_yyyymmdd_date()}.json"
+	orders = []
+	if os.path.exists(output_file):
+		with open(output_file, 'r') as f:
+			orders = json.loads(f.read())
+	orders.append(dataclasses.asdict(order))
+	with open(output_file, 'w') as outfile:
+		outfile.write(json.dumps(orders, default=json_serial, indent=4))
+
+
+def check_round_trip(symbols):
+	with tempfile.TemporaryDirectory() as directory:
+		orders = make_orders(symbols, 20)
+		journal = OrderJournal(directory, flush_interval=0.01)
+		journal.start()
+		for order in orders[:len(orders) // 2]:
+			journal.append(order)
+		journal.close()
+		# Reopened like the next run of the trader.
+		journal = OrderJournal(directory)
+		for order in orders[len(orders) // 2:]:
+			journal.append(order)
+		journal.close()
+		assert read_orders(directory) == orders
+		assert read_orders(directory, symbols=symbols[:2]) == [order for order in orders if order.stock in symbols[:2]]
+		# A crash in the middle of a line leaves it out and the next orders are appended after the last full line.
+		path = glob.glob(f"{directory}/*.jsonl")[0]
+		with open(path, 'ab') as f:
+			f.write(b'{"uuid": "partial"')
+		assert read_orders(directory) == orders
+		journal = OrderJournal(directory)
+		journal.append(orders[0])
+		journal.close()
+		assert read_orders(directory) == orders + orders[:1]
+		# Used as a context manager, the journal is closed with its orders written when the trader fails.
+		try:
+			with OrderJournal(directory) as journal:
+				journal.append(orders[1])
+				raise RuntimeError("Trader failed.")
+		except RuntimeError:
+			pass
+		assert not journal.is_alive()
+		assert read_orders(directory) == orders + orders[:2]
+
+
+def check_conversion():
+	legacy = []
+	for path in glob.glob(f"{REPOSITORY_ORDERS_PATH}/*.json"):
+		with open(path) as f:
+			legacy.extend([parse_order(record) for record in json.load(f)])
+	with tempfile.TemporaryDirectory() as directory:
+		assert convert_order_files(REPOSITORY_ORDERS_PATH, directory) == len(legacy)
+		journaled = read_orders(directory)
+		assert sorted(journaled, key=lambda order: (order.time, order.uuid)) \
+			== sorted(legacy, key=lambda order: (order.time, order.uuid))
+		assert convert_order_files(REPOSITORY_ORDERS_PATH, directory) == 0
+	return len(glob.glob(f"{REPOSITORY_ORDERS_PATH}/*.json")), len(legacy)
+
+
+def time_persist(symbols, orders_per_symbol: int) -> dict:
+	orders = make_orders(symbols, orders_per_symbol)
+	with tempfile.TemporaryDirectory() as directory:
+		mkdir(f"{directory}/Orders")
+		samples = []
+		start = timer.perf_counter()
+		for order in orders:
+			order_start = timer.perf_counter()
+			persist_order_json(f"{directory}/Orders", order)
+			samples.append(timer.perf_counter() - order_start)
+		json_total = timer.perf_counter() - start
+		json_max = max(samples)
+
+		journal = OrderJournal(f"{directory}/OrderJournal")
+		journal.start()
+		samples = []
+		start = timer.perf_counter()
+		for order in orders:
+			order_start = timer.perf_counter()
+			journal.append(order)
+			samples.append(timer.perf_counter() - order_start)
+		journal.close()
+		journal_total = timer.perf_counter() - start
+		journal_max = max(samples)
+		assert len(read_orders(f"{directory}/OrderJournal")) == len(orders)
+	return {
+		'orders': len(orders),
+		'json_total_ms': json_total * 1000,
+		'json_max_ms': json_max * 1000,
+		'journal_total_ms': journal_total * 1000,
+		'journal_max_ms': journal_max * 1000,
+	}
+
+
+def main():
+	logging.disable(logging.INFO)
+	symbols = [f'S{i:04d}' for i in range(SYMBOL_COUNT)]
+	check_round_trip(symbols)
+	files, orders = check_conversion()
+	print(f"Journal reads back what was appended, converted {orders} orders of {files} files.")
+	print(f"{'orders':>7} {'json_total_ms':>14} {'json_max_ms':>12} {'journal_total_ms':>17} {'journal_max_ms':>15}")
+	for orders_per_symbol in ORDER_COUNTS:
+		result = time_persist(symbols, orders_per_symbol)
+		print(f"{result['orders']:>7} {result['json_total_ms']:>14.1f} {result['json_max_ms']:>12.2f} "
+			  f"{result['journal_total_ms']:>17.1f} {result['journal_max_ms']:>15.3f}")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,104 @@
+"""
+Times how long the trading loop is held by submitting buy orders through TradingAgent against a FakeBroker filling
+them FILL_DELAY seconds later, and how long the fills take to reach the order listeners, which the OrderTracker
+reports in the background. Before the tracker, every buy held the loop until its fill. Then checks that market
+orders never filled are cancelled after DEFAULT_CANCEL_AFTER, also by a broker ignoring the cancels, and that their
+symbols can be traded again.
+Run from the Robin directory: python -m benchmarks.bench_order_tracker
+"""
+import os
+import tempfile
+
+# The instrument index is stored under the package root.
+os.environ.setdefault("ROBIN_PACKAGE_ROOT", tempfile.mkdtemp(prefix="robin_tracker_"))
+
+import logging
+import time as timer
+
+import pytz
+
+from datetime import datetime
+
+from benchmarks.bench_intraday_loop import make_bars
+from trading.broker import set_broker
+from trading.fake_broker import FakeBroker
+from trading.instrument_index import get_instrument_index
+from trading.order_tracker import CANCEL_GRACE, DEFAULT_CANCEL_AFTER
+from trading.trading_agent import TradingAgent
+from util.util import SimulatedClock, set_clock
+
+SYMBOL_COUNT = 26
+
+ORDER_COUNT = 5
+
+FILL_DELAY = 2
+
+# Clock seconds per real second while waiting for the stuck orders to be cancelled.
+STUCK_SPEED = 300
+
+
+class IgnoringCancelBroker(FakeBroker):
+	"""
+	FakeBroker accepting the cancels without cancelling anything, like an order stuck at the broker.
+	"""
+
+	def cancel_stock_order(self, order_id: str) -> dict:
+		self._call('cancel_stock_order')
+		return dict()
+
+
+def check_stuck_orders(symbols, broker: FakeBroker) -> float:
+	"""
+	Buy symbols whose market orders never fill, wait until they are given up on and buy them again. Return the
+	clock seconds until every stuck order is resolved.
+	"""
+	set_broker(broker)
+	clock = SimulatedClock(pytz.timezone('US/Eastern').localize(datetime(2024, 6, 10, 11, 0)), speed=STUCK_SPEED)
+	set_clock(clock)
+	agent = TradingAgent(symbols, None)
+	start = clock.now()
+	for symbol in symbols[:ORDER_COUNT]:
+		agent.buy(symbol, uuid=symbol)
+	assert agent.wait_for_orders(timeout=2 * (DEFAULT_CANCEL_AFTER + CANCEL_GRACE))
+	resolved = (clock.now() - start).total_seconds()
+	assert all(len(agent.get_active_orders(symbol)) == 0 for symbol in symbols[:ORDER_COUNT])
+	for symbol in symbols[:ORDER_COUNT]:
+		agent.buy(symbol, uuid=f"{symbol}-again")
+	assert broker.call_counts()['order_buy_fractional_by_price'] == 2 * ORDER_COUNT
+	agent.stop()
+	return resolved
+
+
+def main():
+	logging.disable(logging.INFO)
+	symbols = [f'S{i:04d}' for i in range(SYMBOL_COUNT)]
+	broker = FakeBroker(make_bars(symbols), latency=0.02, fill_delay=FILL_DELAY)
+	set_broker(broker)
+	set_clock(SimulatedClock(pytz.timezone('US/Eastern').localize(datetime(2024, 6, 10, 11, 0))))
+	get_instrument_index().build(symbols)
+	agent = TradingAgent(symbols, None)
+	filled_at = dict()
+	agent.add_order_listener(lambda order: filled_at.setdefault(order.stock, timer.perf_counter()))
+
+	start = timer.perf_counter()
+	for symbol in symbols[:ORDER_COUNT]:
+		agent.buy(symbol, uuid=symbol)
+	submitted = timer.perf_counter() - start
+	assert agent.wait_for_orders(timeout=60)
+	filled = max(filled_at.values()) - start
+	agent.stop()
+
+	assert sorted(filled_at) == symbols[:ORDER_COUNT]
+	assert all(len(agent.get_active_orders(symbol)) == 1 for symbol in symbols[:ORDER_COUNT])
+	print(f"{'orders':>7} {'fill_delay_s':>13} {'loop_held_s':>12} {'all_filled_s':>13} {'blocking_loop_held_s':>21}")
+	print(f"{ORDER_COUNT:>7} {FILL_DELAY:>13} {submitted:>12.2f} {filled:>13.2f} {'>=' + str(ORDER_COUNT * FILL_DELAY):>21}")
+
+	never_filled = 10 ** 6
+	cancelled = check_stuck_orders(symbols, FakeBroker(make_bars(symbols), fill_delay=never_filled))
+	given_up = check_stuck_orders(symbols, IgnoringCancelBroker(make_bars(symbols), fill_delay=never_filled))
+	print(f"{'stuck orders':>13} {'cancel_after_s':>15} {'cancelled_after_s':>18} {'given_up_after_s':>17}")
+	print(f"{ORDER_COUNT:>13} {DEFAULT_CANCEL_AFTER:>15} {cancelled:>18.0f} {given_up:>17.0f}")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,107 @@
+"""
+Checks that ParameterSweep ranks the same results as backtesting every grid point on its own, recomputing the
+indicators each time, and times both. Run from the Robin directory: python -m benchmarks.bench_parameter_sweep
+"""
+import logging
+import os
+import time as timer
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.bench_alpha_strategy import SnapshotCollector
+from benchmarks.bench_backtester import SESSION_STEPS
+from trading.backtester import Backtester, SimulatedTradingAgent
+from trading.bar_ids import make_bar_ids
+from trading.bar_store import BarStore
+from trading.parameter_sweep import SWEEP_LOOK_AHEAD_SAMPLES, ParameterSweep, SweepResult, parameter_grid
+from trading.stock_historical_collector import BollingerMetadata
+from trading.strategies.alpha_strategy import AlphaParameters, AlphaStrategy
+
+SYMBOL_COUNT = 40
+
+BAR_COUNT = 600
+
+GRID = dict(
+	golden_pit_threshold=[10, 15, 20, 25],
+	bollinger=[BollingerMetadata(window=20, no_of_std=2), BollingerMetadata(window=20, no_of_std=1.5)],
+	sell_margin=[1.0, 1.005, 1.01],
+)
+
+
+def synthetic_bars(symbol_count: int, bar_count: int, seed: int = 0):
+	rng = np.random.default_rng(seed)
+	begins_at = pd.date_range('2024-07-08 13:30:00+00:00', periods=bar_count, freq='5min')
+	bars = dict()
+	for i in range(symbol_count):
+		symbol = f'S{i:04d}'
+		close_prices = 100 + np.cumsum(rng.normal(0, 0.3, bar_count))
+		open_prices = close_prices + rng.normal(0, 0.1, bar_count)
+		bars[symbol] = {
+			'begins_at': begins_at,
+			'open_price': open_prices,
+			'close_price': close_prices,
+			'high_price': np.maximum(open_prices, close_prices) + np.abs(rng.normal(0, 0.2, bar_count)),
+			'low_price': np.minimum(open_prices, close_prices) - np.abs(rng.normal(0, 0.2, bar_count)),
+			'volume': rng.integers(1000, 100000, bar_count),
+			'bar_id': make_bar_ids(symbol, begins_at),
+		}
+	return bars
+
+
+def sweep_times(bars):
+	begins_at = next(iter(bars.values()))['begins_at']
+	return [begins_at[len(begins_at) - SESSION_STEPS - 1 + i].to_pydatetime() + pd.Timedelta(minutes=10)
+			for i in range(SESSION_STEPS)]
+
+
+def serial_run(bars, grid, times):
+	"""
+	Tuning before the sweep: one backtest after the other, every point computing its own indicators.
+	"""
+	results = []
+	for parameters in grid:
+		snapshots = dict()
+		for symbol, columns in bars.items():
+			store = BarStore(retention=len(columns['bar_id']))
+			store.append(columns)
+			snapshots[symbol] = store.snapshot(1)
+		agent = SimulatedTradingAgent(list(bars))
+		strategy = AlphaStrategy(SnapshotCollector(snapshots), agent, parameters)
+		start_value = agent.get_cash_position()
+		equity = [start_value]
+		Backtester(strategy, agent, SWEEP_LOOK_AHEAD_SAMPLES).run(list(bars), times, lambda _, prices: equity.append(
+			agent.get_cash_position() + sum([agent.get_position(symbol) * price for symbol, price in prices.items()])))
+		results.append((parameters, round(equity[-1] - start_value, 2)))
+	return results
+
+
+def main():
+	logging.disable(logging.INFO)
+	bars = synthetic_bars(SYMBOL_COUNT, BAR_COUNT)
+	times = sweep_times(bars)
+	grid = parameter_grid(**GRID)
+
+	start = timer.perf_counter()
+	expected = serial_run(bars, grid, times)
+	serial = timer.perf_counter() - start
+
+	print(f"{'points':>7} {'symbols':>8} {'steps':>6} {'workers':>8} {'sweep_ms':>10} {'serial_ms':>10} {'speedup':>8}")
+	for max_workers in sorted({1, os.cpu_count() or 1}):
+		start = timer.perf_counter()
+		results = ParameterSweep(bars, max_workers).run(grid, times)
+		sweep = timer.perf_counter() - start
+		by_parameters = {repr(result.parameters): result for result in results}
+		for parameters, pnl in expected:
+			result: SweepResult = by_parameters[repr(parameters)]
+			assert result.pnl == pnl, (parameters, result.pnl, pnl)
+		assert [result.pnl for result in results] == sorted([pnl for _, pnl in expected], reverse=True)
+		print(f"{len(grid):>7} {SYMBOL_COUNT:>8} {len(times):>6} {max_workers:>8} {sweep * 1000:>10.1f} "
+			  f"{serial * 1000:>10.1f} {serial / sweep:>7.1f}x")
+	best: AlphaParameters = results[0].parameters
+	print(f"best: golden_pit_threshold={best.golden_pit_threshold}, bollinger={best.bollinger}, "
+		  f"sell_margin={best.sell_margin}, pnl={results[0].pnl}, max_drawdown={results[0].max_drawdown}")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,110 @@
+"""
+Checks that the running PnL totals of TradingAgent match summing the active orders, over random buys and sells of
+a SimulatedTradingAgent, and that the realized PnL matches the cash flow of the closed positions, and that an agent
+built without a trade snapshot takes snapshots and waits for its orders like a TradingAgent. Then times reading
+the PnL of every symbol, as snapshots do, against summing the active orders, for growing numbers of active orders.
+Run from the Robin directory: python -m benchmarks.bench_pnl_accounting
+"""
+import logging
+import time as timer
+
+import numpy as np
+
+from datetime import datetime, timedelta
+
+from trading.backtester import SimulatedTradingAgent
+
+SYMBOL_COUNT = 26
+
+STEPS = 20000
+
+ORDER_COUNTS = [1, 10, 100, 1000]
+
+REPEATS = 200
+
+
+def summed_pnl(orders, cur_price: float) -> float:
+	return sum([order.share * (cur_price - order.price) for order in orders])
+
+
+def summed_pnl_percentage(orders, cur_price: float) -> float:
+	pnl = summed_pnl(orders, cur_price)
+	starting_price = sum([order.share * order.price for order in orders])
+	return pnl / starting_price * 100 if starting_price > 0 else 0
+
+
+def check_equivalence(symbols):
+	rng = np.random.default_rng(0)
+	time = datetime(2024, 6, 10, 9, 30)
+	agent = SimulatedTradingAgent(symbols, cash_position=1e12, time=time)
+	prices = {symbol: 100.0 for symbol in symbols}
+	realized = {symbol: 0.0 for symbol in symbols}
+	for step in range(STEPS):
+		symbol = symbols[rng.integers(len(symbols))]
+		prices[symbol] = max(1.0, prices[symbol] * (1 + rng.normal(0, 0.01)))
+		time += timedelta(seconds=1)
+		if rng.random() < 0.8:
+			agent.test_buy(symbol, uuid=str(step), price=prices[symbol], time=time)
+		else:
+			orders = agent.get_active_orders(symbol)
+			realized[symbol] += summed_pnl(orders, prices[symbol])
+			agent.test_clean_all_position(symbol, uuid=str(step), price=prices[symbol], time=time)
+		for checked in [symbol, symbols[rng.integers(len(symbols))]]:
+			orders = agent.get_active_orders(checked)
+			assert np.isclose(agent._get_pnl(checked, prices[checked]), summed_pnl(orders, prices[checked]), atol=1e-6)
+			assert np.isclose(
+				agent._get_pnl_percentage(checked, prices[checked]),
+				summed_pnl_percentage(orders, prices[checked]),
+				atol=1e-9
+			)
+	for symbol in symbols:
+		position_pnl = agent.get_position_pnl(symbol)
+		assert np.isclose(position_pnl.realized_pnl, realized[symbol], atol=1e-6)
+		assert np.isclose(position_pnl.shares, agent.get_position(symbol), atol=1e-9)
+	snapshot = agent.test_snapshot(prices, time)
+	assert np.isclose(snapshot.current_net_value - snapshot.daily_start_net_value, snapshot.daily_pnl)
+	assert np.isclose(snapshot.daily_pnl, sum([agent.get_position_pnl(symbol).realized_pnl for symbol in symbols]) + sum(
+		[agent._get_pnl(symbol, prices[symbol]) for symbol in symbols]), atol=1e-3)
+	assert agent.wait_for_orders(timeout=0)
+	agent.stop()
+
+
+def time_reads(symbols, order_count: int) -> dict:
+	agent = SimulatedTradingAgent(symbols, cash_position=1e12)
+	time = datetime(2024, 6, 10, 9, 30)
+	for symbol in symbols:
+		for i in range(order_count):
+			agent.test_buy(symbol, uuid=str(i), price=100 + i % 7, time=time)
+	prices = {symbol: 103.0 for symbol in symbols}
+
+	start = timer.perf_counter()
+	for _ in range(REPEATS):
+		for symbol in symbols:
+			orders = agent.get_active_orders(symbol)
+			summed_pnl(orders, prices[symbol])
+			summed_pnl_percentage(orders, prices[symbol])
+	summed = (timer.perf_counter() - start) / REPEATS
+
+	start = timer.perf_counter()
+	for _ in range(REPEATS):
+		for symbol in symbols:
+			agent._get_pnl(symbol, prices[symbol])
+			agent._get_pnl_percentage(symbol, prices[symbol])
+	running = (timer.perf_counter() - start) / REPEATS
+	return {'summed_us': summed * 1e6, 'running_us': running * 1e6}
+
+
+def main():
+	logging.disable(logging.INFO)
+	symbols = [f'S{i:04d}' for i in range(SYMBOL_COUNT)]
+	check_equivalence(symbols)
+	print(f"Running PnL totals match the summed active orders over {STEPS} random orders.")
+	print(f"{'orders/symbol':>14} {'summed_us':>10} {'running_us':>11} {'speedup':>8}")
+	for order_count in ORDER_COUNTS:
+		result = time_reads(symbols, order_count)
+		print(f"{order_count:>14} {result['summed_us']:>10.1f} {result['running_us']:>11.1f} "
+			  f"{result['summed_us'] / result['running_us']:>7.1f}x")
+
+
+if __name__ == "__main__":
+	main()
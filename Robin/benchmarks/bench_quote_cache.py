@@ -0,0 +1,49 @@
+"""
+Checks that QuoteCache prices every symbol with its own quote when the broker leaves out the quotes of unknown
+tickers, as robin_stocks does, across batches, and that a known symbol read later joins the refresh.
+Run from the Robin directory: python -m benchmarks.bench_quote_cache
+"""
+import logging
+
+import pytz
+
+from datetime import datetime
+
+from benchmarks.bench_intraday_loop import make_bars
+from trading.fake_broker import FakeBroker
+from trading.fetch_scheduler import FetchScheduler
+from trading.quote_cache import QuoteCache
+from util.util import SimulatedClock, set_clock
+
+SYMBOL_COUNT = 26
+
+BATCH_SIZE = 10
+
+MISSING_SYMBOLS = ['MISSING0', 'MISSING1']
+
+
+def main():
+	logging.disable(logging.INFO)
+	symbols = [f'S{i:04d}' for i in range(SYMBOL_COUNT)]
+	broker = FakeBroker(make_bars(symbols))
+	set_clock(SimulatedClock(pytz.timezone('US/Eastern').localize(datetime(2024, 6, 10, 11, 0))))
+	expected = {symbol: float(broker.get_latest_price(symbol)[0]) for symbol in symbols}
+	assert broker.get_latest_price(MISSING_SYMBOLS + symbols[:1]) == broker.get_latest_price(symbols[:1])
+
+	# Unknown tickers first and in the middle of a batch, so the quotes after them shift if matched by position.
+	watched = MISSING_SYMBOLS[:1] + symbols[:SYMBOL_COUNT // 2] + MISSING_SYMBOLS[1:] + symbols[SYMBOL_COUNT // 2:-1]
+	quote_cache = QuoteCache(broker=broker, fetch_scheduler=FetchScheduler(batch_size=BATCH_SIZE))
+	quote_cache.watch(watched)
+	prices = quote_cache.prices(watched)
+	for symbol in MISSING_SYMBOLS:
+		assert prices[symbol] is None, f"{symbol} has the price of another symbol"
+	for symbol in symbols[:-1]:
+		assert prices[symbol] == expected[symbol], f"{symbol} has the price of another symbol"
+	assert quote_cache.price(symbols[-1]) == expected[symbols[-1]]
+	assert quote_cache.prices(watched) == prices
+	print(f"{len(watched) + 1} symbols priced by their own quotes with {len(MISSING_SYMBOLS)} unknown tickers, "
+		  f"{broker.call_counts()['get_quotes']} quote calls.")
+
+
+if __name__ == "__main__":
+	main()
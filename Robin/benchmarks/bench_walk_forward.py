@@ -0,0 +1,97 @@
+"""
+Checks that WalkForward fills the same orders and ends with the same trading snapshot as replaying the sessions
+one after the other in a single process, over a synthetic bar archive, and times both.
+Run from the Robin directory: python -m benchmarks.bench_walk_forward
+"""
+import logging
+import os
+import tempfile
+import time as timer
+
+import numpy as np
+import pandas as pd
+
+from datetime import date
+
+from trading.backtester import (
+	BACKTEST_LOOKBACK, BacktestCollector, Backtester, SimulatedTradingAgent, load_bars, session_times
+)
+from trading.bar_archive import BarArchive
+from trading.strategies.alpha_strategy import AlphaStrategy
+from trading.walk_forward import WalkForward, opening_snapshot, trading_sessions
+
+SYMBOL_COUNT = 30
+
+# The first week only warms up the indicators.
+ARCHIVE_START = date(2024, 6, 24)
+
+START_DATE = date(2024, 7, 1)
+
+END_DATE = date(2024, 7, 31)
+
+
+def write_archive(root: str, symbols, seed: int = 0):
+	"""
+	Regular session bars of every trading day from ARCHIVE_START to END_DATE as a random walk per symbol.
+	"""
+	rng = np.random.default_rng(seed)
+	begins_at = pd.DatetimeIndex(np.concatenate([
+		pd.date_range(session, periods=78, freq='5min').tz_convert('UTC')
+		for session in trading_sessions(ARCHIVE_START, END_DATE)
+	]))
+	archive = BarArchive(root)
+	for symbol in symbols:
+		close_prices = 100 + np.cumsum(rng.normal(0, 0.3, len(begins_at)))
+		open_prices = close_prices + rng.normal(0, 0.1, len(begins_at))
+		archive.append(symbol, {
+			'begins_at': begins_at,
+			'open_price': open_prices,
+			'close_price': close_prices,
+			'high_price': np.maximum(open_prices, close_prices) + np.abs(rng.normal(0, 0.2, len(begins_at))),
+			'low_price': np.minimum(open_prices, close_prices) - np.abs(rng.normal(0, 0.2, len(begins_at))),
+			'volume': rng.integers(1000, 100000, len(begins_at)),
+			'regular': np.ones(len(begins_at), dtype=bool),
+		})
+
+
+def sequential_run(root: str, symbols):
+	"""
+	The sessions one after the other in this process, the positions carried by a single agent.
+	"""
+	sessions = trading_sessions(START_DATE, END_DATE)
+	agent = SimulatedTradingAgent(symbols, trade_snapshot=opening_snapshot(symbols, 50000, sessions[0]))
+	orders = []
+	for session_start in sessions:
+		times = session_times(session_start)
+		bars = load_bars(BarArchive(root), symbols, session_start - BACKTEST_LOOKBACK, times[-1])
+		orders += Backtester(AlphaStrategy(BacktestCollector(bars), agent), agent).run(symbols, times)
+	return orders, agent
+
+
+def main():
+	logging.disable(logging.INFO)
+	symbols = [f'S{i:04d}' for i in range(SYMBOL_COUNT)]
+	with tempfile.TemporaryDirectory() as root:
+		write_archive(root, symbols)
+		start = timer.perf_counter()
+		expected_orders, agent = sequential_run(root, symbols)
+		sequential = timer.perf_counter() - start
+
+		print(f"{'sessions':>9} {'symbols':>8} {'workers':>8} {'walk_forward_ms':>16} {'sequential_ms':>14} "
+			  f"{'speedup':>8} {'orders':>7} {'net_value':>10}")
+		for max_workers in sorted({1, os.cpu_count() or 1}):
+			start = timer.perf_counter()
+			result = WalkForward(symbols, archive_root=root, max_workers=max_workers).run(START_DATE, END_DATE)
+			walk_forward = timer.perf_counter() - start
+			assert result.orders == expected_orders
+			final = result.trade_snapshots[-1]
+			assert final.cash_position == agent.get_cash_position()
+			assert final.positions == {symbol: agent.get_position(symbol) for symbol in symbols}
+			assert result.equity_curve.index.is_monotonic_increasing
+			print(f"{len(result.trade_snapshots):>9} {SYMBOL_COUNT:>8} {max_workers:>8} {walk_forward * 1000:>16.1f} "
+				  f"{sequential * 1000:>14.1f} {sequential / walk_forward:>7.1f}x {len(result.orders):>7} "
+				  f"{final.current_net_value:>10.2f}")
+
+
+if __name__ == "__main__":
+	main()
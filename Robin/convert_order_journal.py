@@ -0,0 +1,12 @@
+from trading.order_journal import ORDER_JOURNAL_PATH, ORDERS_PATH, convert_order_files
+from util.util import log_info, set_log_level
+
+
+def main():
+	set_log_level()
+	log_info(f"Converting the orders of {ORDERS_PATH} to the journal in {ORDER_JOURNAL_PATH}...")
+	convert_order_files()
+
+
+if __name__ == "__main__":
+	main()
@@ -3,12 +3,16 @@ import glob
 import json
 import typing
 
-from time import sleep
 from datetime import timedelta
 
 import dateutil
 
-from trading.base_strategy import Action, ActionMetadata, BaseStrategy
+from trading.backtester import Backtester, session_times
+from trading.base_strategy import ActionMetadata
+from trading.broker import get_broker
+from trading.instrument_index import get_instrument_index
+from trading.order_dispatcher import OrderDispatcher
+from trading.order_journal import OrderJournal
 from trading.stock_historical_collector import StockHistoricalCollector
 from trading.strategies.alpha_strategy import AlphaStrategy
 from trading.trading_agent import TradingAgent, TradeSnapshot, OrderMetadata
@@ -18,6 +22,11 @@ TEST_MODE = False
 
 TEST_DATE_TIME = datetime(2024, 6, 10, 9, 30, 0, tzinfo=pytz.timezone('US/Eastern'))
 
+NEW_BAR_TIMEOUT = 60
+
+# Seconds to wait for the submitted orders to resolve before the final snapshot.
+PENDING_ORDERS_TIMEOUT = 60
+
 
 def prepare_trading_agent(stocks: typing.List[str]):
 	snapshot_files = glob.glob(f"{PACKAGE_ROOT}/Data/TradingSnapshot/*.json")
@@ -55,116 +64,125 @@ def persist_trading_snapshot(
 		outfile.write(snapshot_json)
 
 
-def persist_order_details(order: OrderMetadata):
-	if order is None:
-		return
-	output_file = f"{PACKAGE_ROOT}/Data/Orders/{order.stock}.{get_yyyymmdd_date()}.json"
-	orders = []
-	if os.path.exists(output_file):
-		with open(output_file, 'r') as f:
-			json_data = f.read()
-		orders = json.loads(json_data)
-	orders.append(dataclasses.asdict(order))
-	orders_json = json.dumps(orders, default=json_serial, indent=4)
-	log_info(f"Writing order to: {output_file}...")
-	with open(output_file, 'w') as outfile:
-		outfile.write(orders_json)
-
-
 def run_test_cycles(
 	stocks: typing.List[str],
 	trading_agent: TradingAgent,
-	stock_info_worker: StockHistoricalCollector,
-	strategy: BaseStrategy
+	strategy: AlphaStrategy,
+	order_journal: OrderJournal
 ):
 	log_info("Running test cycles...")
-	time = TEST_DATE_TIME
-	last_snapshot_time = time
+	times = session_times(TEST_DATE_TIME)
+	time = times[-1] + timedelta(minutes=5) if times else TEST_DATE_TIME
+
+	last_snapshot_time = TEST_DATE_TIME
+
+	def persist_hourly(step_time: datetime, prices: typing.Dict[str, float]):
+		nonlocal last_snapshot_time
+		next_time = step_time + timedelta(minutes=5)
+		if last_snapshot_time + timedelta(hours=1) < next_time:
+			persist_trading_snapshot(trading_agent=trading_agent, prices=prices, time=next_time)
+			last_snapshot_time = next_time
+
 	prices = dict()
-	while is_trading_hour(time):
-		log_info(f"CurrentTime: {time}")
-		for stock in stocks:
-			df = stock_info_worker.get_historical_info_by_symbol(stock)
-			action: ActionMetadata = strategy.action(stock, time)
-			price = list(df.loc[df["begins_at"] < time - timedelta(minutes=5)]["close_price"])[-1]
-			prices[stock] = price
-			if action.action == Action.BUY:
-				persist_order_details(trading_agent.test_buy(
-					symbol=stock, uuid=action.uuid, price=price, time=time))
-			elif action.action == Action.SELL:
-				persist_order_details(
-					trading_agent.test_clean_all_position(symbol=stock, uuid=action.uuid, price=price, time=time))
-		time += timedelta(minutes=5)
-		sleep(1)
-		if last_snapshot_time + timedelta(hours=1) < time:
-			persist_trading_snapshot(trading_agent=trading_agent, prices=prices, time=time)
-			last_snapshot_time = time
+
+	def on_step(step_time: datetime, step_prices: typing.Dict[str, float]):
+		prices.update(step_prices)
+		persist_hourly(step_time, prices)
+
+	for order in Backtester(strategy, trading_agent).run(stocks, times, on_step):
+		order_journal.append(order)
 	log_info(f"Current time is not trading hour: {get_current_hhmmss_time()}.")
 	persist_trading_snapshot(trading_agent=trading_agent, prices=prices, time=time)
 
 
+def trade_stocks(
+	stocks: typing.List[str],
+	trading_agent: TradingAgent,
+	strategy: AlphaStrategy,
+	order_dispatcher: OrderDispatcher,
+	is_extended_hour: bool
+) -> typing.List[str]:
+	"""
+	Evaluate the strategy for the stocks and submit the orders of their actions in parallel, the completed orders are
+	persisted by the order listener of the trading agent. Return the stocks to trade again without waiting for their
+	next bar: the ones whose evaluation failed and the ones whose order could not be submitted.
+	"""
+	try:
+		actions: typing.Dict[str, ActionMetadata] = strategy.action_batch(stocks)
+	except Exception as e:
+		log_error(f"Exception when evaluating the strategy.", e)
+		return stocks
+	latencies = order_dispatcher.dispatch(trading_agent, actions, is_extended_hour)
+	failed_stocks = set(strategy.failed_symbols) | {stock for stock, latency in latencies.items() if latency is None}
+	return [stock for stock in stocks if stock in failed_stocks]
+
+
 def intraday_collecting():
 	with open(f"{PACKAGE_ROOT}/Config/stock_list.txt") as f:
 		stocks = f.read().split(",")
-	login()
+	get_broker().login()
+	get_instrument_index().build(stocks)
 	trading_agent = prepare_trading_agent(stocks)
+	with OrderJournal() as order_journal:
+		trading_agent.add_order_listener(order_journal.append)
 
-	while preparing_trade():
-		if TEST_MODE:
-			log_info("TEST MODE, skip loop...")
-			break
+		while preparing_trade():
+			if TEST_MODE:
+				log_info("TEST MODE, skip loop...")
+				break
+			sleep(5)
+
+		log_info("Start Running....")
+		stock_info_worker = StockHistoricalCollector(stocks)
+		stock_info_worker.start()
+		alpha_strategy = AlphaStrategy(stock_info_worker, trading_agent)
+		order_dispatcher = OrderDispatcher()
 		sleep(5)
 
-	log_info("Start Running....")
-	stock_info_worker = StockHistoricalCollector(stocks)
-	stock_info_worker.start()
-	alpha_strategy = AlphaStrategy(stock_info_worker, trading_agent)
-	sleep(5)
+		try:
+			if TEST_MODE:
+				run_test_cycles(stocks, trading_agent, alpha_strategy, order_journal)
+				return
 
-	try:
-		if TEST_MODE:
-			run_test_cycles(stocks, trading_agent, stock_info_worker, alpha_strategy)
-			return
-
-		last_snapshot_time = datetime.now()
-		persist_trading_snapshot(trading_agent=trading_agent)
-		while is_pre_hour() or is_trading_hour() or is_after_hour():
-			is_extended_hour = is_after_hour() or is_pre_hour()
-			log_info("Running loop....")
-			for stock in stocks:
-				try:
-					action: ActionMetadata = alpha_strategy.action(stock)
-					if action.action == Action.BUY:
-						persist_order_details(
-							trading_agent.buy(
-								symbol=stock,
-								uuid=action.uuid,
-								extended_hour=is_extended_hour
-							)
-						)
-					elif action.action == Action.SELL:
-						persist_order_details(
-							trading_agent.clean_positions(
-								symbol=stock,
-								uuid=action.uuid,
-								extended_hour=is_extended_hour
-							)
-						)
-				except Exception as e:
-					log_error(f"Exception when getting stock price for {stock}.", e)
-			if last_snapshot_time + timedelta(hours=1) < datetime.now():
-				persist_trading_snapshot(trading_agent=trading_agent)
-				last_snapshot_time = datetime.now()
-			log_info("Completing loop...")
-			sleep(60)
-		log_info(f"Current time is not trading hour: {get_current_hhmmss_time()}.")
-	except Exception as e:
-		log_error(f"Exception running the main cycle...", e)
-	finally:
-		if not TEST_MODE:
+			last_snapshot_time = get_datetime()
 			persist_trading_snapshot(trading_agent=trading_agent)
-		stock_info_worker.stop()
-		stock_info_worker.join()
+			# Stocks the previous loop failed to trade, traded again with the next new bars or after the timeout.
+			retry_stocks: typing.List[str] = []
+			while is_pre_hour() or is_trading_hour() or is_after_hour():
+				fresh_stocks = stock_info_worker.wait_for_new_bars(timeout=NEW_BAR_TIMEOUT)
+				log_info(f"Running loop for {len(fresh_stocks)} stocks with new bars, {len(retry_stocks)} to retry....")
+				retry_stocks = trade_stocks(
+					[stock for stock in stocks if stock in fresh_stocks or stock in retry_stocks],
+					trading_agent,
+					alpha_strategy,
+					order_dispatcher,
+					is_extended_hour=is_after_hour() or is_pre_hour()
+				)
+				if last_snapshot_time + timedelta(hours=1) < get_datetime():
+					try:
+						persist_trading_snapshot(trading_agent=trading_agent)
+						last_snapshot_time = get_datetime()
+					except Exception as e:
+						log_error(f"Exception when persisting the trading snapshot.", e)
+				log_info("Completing loop...")
+			log_info(f"Current time is not trading hour: {get_current_hhmmss_time()}.")
+		except Exception as e:
+			log_error(f"Exception running the main cycle...", e)
+		finally:
+			try:
+				if not TEST_MODE:
+					if not trading_agent.wait_for_orders(timeout=PENDING_ORDERS_TIMEOUT):
+						log_info(f"Orders still pending after {PENDING_ORDERS_TIMEOUT} seconds.")
+					persist_trading_snapshot(trading_agent=trading_agent)
+			except Exception as e:
+				log_error(f"Exception when persisting the final trading snapshot.", e)
+			finally:
+				# The order tracker and the collector threads must not outlive the day, main starts new ones.
+				trading_agent.stop()
+				order_dispatcher.shutdown()
+				log_info(f"Signal to order latency: {order_dispatcher.latency_summary()}")
+				stock_info_worker.stop()
+				stock_info_worker.join()
 
 
 def main():
@@ -0,0 +1,49 @@
+from datetime import datetime
+
+import pytz
+
+from trading.backtester import BACKTEST_LOOKBACK, load_bars, session_times
+from trading.bar_archive import BarArchive
+from trading.parameter_sweep import ParameterSweep, parameter_grid, write_report
+from trading.stock_historical_collector import BollingerMetadata, HjkMetadata
+from trading.strategies.alpha_strategy import HJK_METADATA_LIST
+from util.util import PACKAGE_ROOT, log_info, set_log_level
+
+SWEEP_DATE_TIME = pytz.timezone('US/Eastern').localize(datetime(2024, 7, 8, 9, 30, 0))
+
+# RSI, the over-buy threshold and the stop loss only show up in the logs of AlphaStrategy so far, sweeping them
+# would not change any order.
+SWEEP_GRID = dict(
+	hjk_metadata_list=[
+		HJK_METADATA_LIST,
+		[
+			HjkMetadata(interval=5, smooth_parameters=[3, 3], std_interval=21, std_multiplier=3),
+			HjkMetadata(interval=13, smooth_parameters=[5], std_interval=37, std_multiplier=2),
+			HjkMetadata(interval=34, smooth_parameters=[5], std_interval=0, std_multiplier=0)
+		],
+	],
+	golden_pit_threshold=[10, 15, 20],
+	bollinger=[
+		BollingerMetadata(window=20, no_of_std=2),
+		BollingerMetadata(window=20, no_of_std=2.5),
+		BollingerMetadata(window=30, no_of_std=2)
+	],
+	sell_margin=[1.0, 1.005, 1.01],
+)
+
+
+def main():
+	set_log_level()
+	with open(f"{PACKAGE_ROOT}/Config/stock_list.txt") as f:
+		stocks = f.read().split(",")
+	times = session_times(SWEEP_DATE_TIME)
+	bars = load_bars(BarArchive(), stocks, SWEEP_DATE_TIME - BACKTEST_LOOKBACK, times[-1])
+	results = ParameterSweep(bars).run(parameter_grid(**SWEEP_GRID), times)
+	write_report(results, SWEEP_DATE_TIME)
+	for result in results[:5]:
+		log_info(f"PnL: {result.pnl}, max drawdown: {result.max_drawdown}, orders: {result.orders}, "
+				 f"parameters: {result.parameters}")
+
+
+if __name__ == "__main__":
+	main()
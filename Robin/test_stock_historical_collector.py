@@ -1,11 +1,11 @@
 from time import sleep
 
+from trading.indicator_kernels import sma, wsma, ema, llv, hhv, ref, cross
 from trading.stock_historical_collector import StockHistoricalCollector, HjkMetadata, BollingerMetadata, RSIMetadata
 from util.util import *
 
 from matplotlib import pyplot as plt
 import numpy as np
-import pandas as pd
 
 TEST_MODE = True
 TEST_STOCKS = ["NVDA"]
@@ -92,31 +92,6 @@ def intraday_collecting():
 					low_prices = df['low_price'].values
 					high_prices = df['high_price'].values
 
-					# Define calculation functions
-					def sma(values: np.array, window):
-						return np.array(pd.Series(values).rolling(window).mean())
-
-					def wsma(values: np.array, window, weight):
-						value = np.full_like(values, np.nan)
-						for i in range(len(values)):
-							if i == 0:
-								value[i] = np.mean(values[:window])
-							else:
-								value[i] = (values[i] * weight + value[i - 1] * (window - weight)) / window
-						return value
-
-					def ema(values, window):
-						return np.array(pd.Series(values).ewm(span=window, adjust=False).mean())
-
-					def llv(values, window):
-						return np.array(pd.Series(values).rolling(window).min())
-
-					def hhv(values, window):
-						return np.array(pd.Series(values).rolling(window).max())
-
-					def ref(values, period):
-						return np.roll(values, period)
-
 					# Perform calculations
 					var1 = ref((low_prices + open_prices + close_prices + high_prices) / 4, 1)
 					with np.errstate(divide='ignore', invalid='ignore'):
@@ -145,9 +120,6 @@ def intraday_collecting():
 						if main_force_pulling_up[i]:
 							plt.axvspan(i, i + 1, color='pink', alpha=0.3)
 
-					def cross(series1, series2):
-						return (series1 > series2) & (np.roll(series1, 1) <= np.roll(series2, 1))
-
 					AL = (close_prices + low_prices + high_prices) / 3
 					AO = sma(AL, 5) - sma(AL, 13)
 					BBD = (AO - sma(AO, 3)) * 100
@@ -0,0 +1,127 @@
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from threading import Lock
+from typing import Dict, List, Optional
+
+from trading.broker import Broker, get_broker
+from trading.instrument_index import InstrumentIndex, get_instrument_index
+from util.util import get_datetime
+
+DEFAULT_TTL = 2
+
+
+@dataclass
+class Position:
+	symbol: str
+	instrument_id: str
+	instrument: str
+	quantity: float
+	average_buy_price: float
+
+
+class AccountState(object):
+	"""
+	AccountState
+	Open positions, their average buy prices and the cash of the account, fetched together and shared by every
+	TradeExecutor and the TradingAgent. A fetched state is served for ttl seconds, or until invalidate is called
+	after an order. Positions are mapped to their symbols by the instrument index.
+	@params:
+	ttl: clock seconds a fetched state is served
+	broker: broker to fetch from, the one set by set_broker by default
+	instrument_index: index of the instruments, the shared one by default
+	"""
+
+	def __init__(
+		self,
+		ttl: float = DEFAULT_TTL,
+		broker: Optional[Broker] = None,
+		instrument_index: Optional[InstrumentIndex] = None
+	):
+		self._ttl = timedelta(seconds=ttl)
+		self._broker = broker
+		self._instrument_index = instrument_index if instrument_index is not None else get_instrument_index()
+		self._lock = Lock()
+		self._fetched_at: Optional[datetime] = None
+		self._fetched_from: Optional[Broker] = None
+		self._positions: Dict[str, Position] = dict()
+		self._buying_power: float = 0
+		self._portfolio_cash: float = 0
+
+	def invalidate(self):
+		"""
+		Fetch the state again on the next read, e.g. after placing an order or while waiting for its fill.
+		"""
+		with self._lock:
+			self._fetched_at = None
+
+	def _refresh(self):
+		"""
+		Fetch the state again if it is older than the ttl, with the lock held.
+		"""
+		now = get_datetime()
+		broker = self._broker if self._broker is not None else get_broker()
+		if broker is not self._fetched_from:
+			# Another account since set_broker.
+			self._fetched_at = None
+		if self._fetched_at is not None and now - self._fetched_at < self._ttl:
+			return
+		positions = broker.get_open_stock_positions()
+		account_profile = broker.load_account_profile()
+		self._positions = dict()
+		for position in positions:
+			instrument_id = position["instrument_id"]
+			symbol = self._instrument_index.symbol(instrument_id, position["instrument"])
+			self._positions[symbol] = Position(
+				symbol=symbol,
+				instrument_id=instrument_id,
+				instrument=position["instrument"],
+				quantity=float(position["quantity"]),
+				average_buy_price=float(position["average_buy_price"]),
+			)
+		self._buying_power = float(account_profile["buying_power"])
+		self._portfolio_cash = float(account_profile["portfolio_cash"])
+		self._fetched_at = now
+		self._fetched_from = broker
+
+	def positions(self) -> List[Position]:
+		with self._lock:
+			self._refresh()
+			return list(self._positions.values())
+
+	def quantity(self, symbol: str) -> float:
+		with self._lock:
+			self._refresh()
+			position = self._positions.get(symbol)
+			return position.quantity if position is not None else 0
+
+	def average_buy_price(self, symbol: str) -> float:
+		with self._lock:
+			self._refresh()
+			position = self._positions.get(symbol)
+			return position.average_buy_price if position is not None else 0
+
+	def buying_power(self) -> float:
+		with self._lock:
+			self._refresh()
+			return self._buying_power
+
+	def portfolio_cash(self) -> float:
+		with self._lock:
+			self._refresh()
+			return self._portfolio_cash
+
+
+_account_state: Optional[AccountState] = None
+
+_account_state_lock = Lock()
+
+
+def get_account_state() -> AccountState:
+	"""
+	Account state shared by the TradeExecutors and the TradingAgent.
+	"""
+	global _account_state
+	with _account_state_lock:
+		if _account_state is None:
+			_account_state = AccountState()
+		return _account_state
@@ -0,0 +1,327 @@
+import numpy as np
+import pandas as pd
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+from trading.bar_archive import BarArchive
+from trading.bar_ids import format_bar_id, make_bar_ids
+from trading.bar_store import BarSnapshot
+from trading.indicator_engine import (
+	bollinger_spec, compute_bollinger, compute_hjk, compute_rsi, hjk_spec, indicator_specs, rsi_spec
+)
+from trading.strategies.alpha_strategy import AlphaStrategy, AlphaSignalHistory, AlphaParameters, DEFAULT_PARAMETERS
+from trading.order_tracker import OrderTracker
+from trading.trade_executor import MIN_CASH_VALUE
+from trading.trading_agent import OrderMetadata, TradeSnapshot, TradingAgent, DEFAULT_PORTION_SIZE
+from util.util import get_datetime, is_trading_hour, log_info
+
+LOOK_AHEAD_SAMPLES = 8
+
+SIMULATED_CASH_POSITION = 50000
+
+# Bars loaded ahead of a backtested session, so the indicators are warmed up when the session starts.
+BACKTEST_LOOKBACK = timedelta(days=5)
+
+# Indicator columns kept by a BacktestCollector, one entry holds a single indicator of every symbol.
+INDICATOR_CACHE_SIZE = 32
+
+
+def session_times(start: datetime) -> List[datetime]:
+	"""
+	Evaluation times of run_test_cycles: every 5 minutes from start while it is trading hour.
+	"""
+	times = []
+	time = start
+	while is_trading_hour(time):
+		times.append(time)
+		time += timedelta(minutes=5)
+	return times
+
+
+def opening_snapshot(symbols: List[str], cash_position: float, time: datetime) -> TradeSnapshot:
+	"""
+	TradeSnapshot of a test account holding only cash, valued like TradingAgent.test_snapshot.
+	"""
+	net_value = MIN_CASH_VALUE + cash_position
+	return TradeSnapshot(
+		time=time,
+		daily_start_net_value=net_value,
+		current_net_value=net_value,
+		daily_pnl=0,
+		daily_pnl_percentage=0,
+		remain_portion=int(cash_position) // DEFAULT_PORTION_SIZE,
+		positions={symbol: 0 for symbol in symbols},
+		cash_position=cash_position,
+		active_orders={symbol: [] for symbol in symbols},
+		active_pnl={symbol: 0 for symbol in symbols},
+		active_pnl_percentage={symbol: 0 for symbol in symbols}
+	)
+
+
+def load_bars(
+	archive: BarArchive,
+	symbols: List[str],
+	start: datetime,
+	end: datetime
+) -> Dict[str, Dict[str, object]]:
+	"""
+	Archived bars with start <= begins_at < end and their bar ids, symbols without bars are left out.
+	"""
+	bars = dict()
+	for symbol in symbols:
+		columns = archive.load(symbol, start, end)
+		if columns is not None:
+			columns['bar_id'] = make_bar_ids(symbol, columns['begins_at'])
+			bars[symbol] = columns
+	return bars
+
+
+def check_no_look_ahead(
+	columns: Dict[str, np.ndarray],
+	history: AlphaSignalHistory,
+	bar_counts: List[int],
+	parameters: AlphaParameters = DEFAULT_PARAMETERS
+):
+	"""
+	Recompute the signals over only the first bar_count bars and compare the last bar with the history computed
+	over all bars. A difference means the signal of a bar depends on later bars.
+	"""
+	for bar_count in bar_counts:
+		prefix = AlphaStrategy.signal_history(
+			{name: values[:, :bar_count] for name, values in columns.items()}, parameters)
+		for field in ['golden_pit', 'golden_cross', 'main_force_entry', 'has_resistance_signal']:
+			expected = getattr(prefix, field)[:, -1]
+			actual = getattr(history, field)[:, bar_count - 1]
+			if not np.array_equal(expected, actual):
+				raise Exception(f"Look-ahead in {field} at bar {bar_count - 1}: {expected} != {actual}.")
+
+
+class BacktestCollector(object):
+	"""
+	BacktestCollector
+	Serves snapshots of fixed bars with the requested indicators, in place of StockHistoricalCollector. Indicator
+	columns are cached by their parameters, so strategies sharing an HJK line, Bollinger band or RSI reuse the
+	columns computed for an earlier one.
+	@params:
+	bars: columns of every symbol in the layout of load_bars
+	"""
+
+	def __init__(self, bars: Dict[str, Dict[str, object]]):
+		self._snapshots: Dict[str, BarSnapshot] = {
+			symbol: BarSnapshot.from_columns(columns) for symbol, columns in bars.items()
+		}
+		self._indicators: OrderedDict = OrderedDict()
+
+	def symbols(self) -> List[str]:
+		return list(self._snapshots)
+
+	def _indicator(self, spec: Tuple, symbol: str, compute) -> Dict[str, np.ndarray]:
+		if spec not in self._indicators:
+			self._indicators[spec] = dict()
+			if len(self._indicators) > INDICATOR_CACHE_SIZE:
+				self._indicators.popitem(last=False)
+		self._indicators.move_to_end(spec)
+		by_symbol = self._indicators[spec]
+		if symbol not in by_symbol:
+			by_symbol[symbol] = compute(self._snapshots[symbol].columns)
+		return by_symbol[symbol]
+
+	def get_snapshot(
+		self,
+		symbol: str,
+		metadata_list: List,
+		bollinger=None,
+		rsi_metadata=None
+	) -> Optional[BarSnapshot]:
+		if symbol not in self._snapshots:
+			return None
+		columns = dict()
+		for metadata in metadata_list:
+			columns.update(self._indicator(hjk_spec(metadata), symbol, lambda bars: compute_hjk(
+				bars['close_price'], bars['low_price'], bars['high_price'], metadata)))
+		if bollinger is not None:
+			columns.update(self._indicator(
+				bollinger_spec(bollinger), symbol, lambda bars: compute_bollinger(bars['close_price'], bollinger)))
+		if rsi_metadata is not None:
+			columns.update(self._indicator(rsi_spec(rsi_metadata), symbol, lambda bars: {
+				'rsi': compute_rsi(bars['close_price'], rsi_metadata.window_size)[0]}))
+		return self._snapshots[symbol].with_columns(columns, indicator_specs(metadata_list, bollinger, rsi_metadata))
+
+
+class SimulatedTradingAgent(TradingAgent):
+	"""
+	SimulatedTradingAgent
+	TradingAgent in test mode without a broker: only the test_* order methods are used. It starts from cash only,
+	or continues from the positions and active orders of a TradeSnapshot.
+	@params:
+	symbols: symbols traded
+	cash_position: starting cash without a trade snapshot
+	trade_snapshot: snapshot to continue from, e.g. the end of the previous backtested session
+	"""
+
+	def __init__(
+		self,
+		symbols: List[str],
+		cash_position: float = SIMULATED_CASH_POSITION,
+		trade_snapshot: Optional[TradeSnapshot] = None,
+		time: Optional[datetime] = None
+	):
+		if trade_snapshot is None:
+			trade_snapshot = opening_snapshot(symbols, cash_position, time if time is not None else get_datetime())
+		# The tracker is never started: the test orders complete when submitted, so it stays idle.
+		self._init_state(
+			symbols,
+			{symbol: trade_snapshot.positions.get(symbol, 0) for symbol in symbols},
+			trade_snapshot.cash_position,
+			trade_snapshot.remain_portion,
+			{symbol: list(trade_snapshot.active_orders.get(symbol, [])) for symbol in symbols},
+			trade_snapshot,
+			OrderTracker()
+		)
+
+	def net_value(self, prices: Dict[str, float]) -> float:
+		"""
+		Cash plus the positions valued at the given prices, symbols without a price hold no position yet.
+		"""
+		return self._cash_position + sum([self._cur_position[symbol] * price for symbol, price in prices.items()])
+
+
+@dataclass
+class SessionSignals:
+	"""
+	What the fills of a backtested session need that does not depend on the positions held: the snapshots, the
+	number of bars before each evaluation time and the signals of every bar. It can be computed ahead of the fills,
+	also in another process.
+	"""
+	times: List[datetime]
+	snapshots: Dict[str, BarSnapshot]
+	bar_counts: Dict[str, np.ndarray]
+	histories: Dict[str, AlphaSignalHistory]
+	rows: Dict[str, int]
+
+
+class Backtester(object):
+	"""
+	Backtester
+	Replays AlphaStrategy the way run_test_cycles steps through a session, without recomputing the indicators at
+	every step: the signals of every bar are computed once over the collected bars, checked for look-ahead on a
+	sample of the evaluated bars, and the decisions of each step are looked up by the number of bars before the
+	step. Orders are filled through TradingAgent.test_buy and test_clean_all_position.
+	@params:
+	strategy: the strategy reading the collected bars
+	trading_agent: agent in test mode holding the simulated positions
+	look_ahead_samples: number of evaluated bars checked for look-ahead
+	"""
+
+	def __init__(
+		self,
+		strategy: AlphaStrategy,
+		trading_agent: TradingAgent,
+		look_ahead_samples: int = LOOK_AHEAD_SAMPLES
+	):
+		self._strategy = strategy
+		self._trading_agent = trading_agent
+		self._look_ahead_samples = look_ahead_samples
+
+	def run(
+		self,
+		symbols: List[str],
+		times: List[datetime],
+		on_step: Optional[Callable[[datetime, Dict[str, float]], None]] = None
+	) -> List[OrderMetadata]:
+		"""
+		Evaluate the symbols at each of the times with the bars that began at least 5 minutes before, and return the
+		filled orders. on_step is called after each time with the latest prices.
+		"""
+		return self.fill(self.signals(symbols, times), on_step)
+
+	def signals(self, symbols: List[str], times: List[datetime]) -> SessionSignals:
+		"""
+		Compute the signals for evaluating the symbols at each of the times.
+		"""
+		snapshots = {symbol: self._strategy.get_snapshot(symbol) for symbol in symbols}
+		snapshots = {
+			symbol: snapshot for symbol, snapshot in snapshots.items() if snapshot is not None and len(snapshot) > 0
+		}
+		cutoffs = pd.to_datetime([time - timedelta(minutes=5) for time in times], utc=True)
+		bar_counts = {
+			symbol: snapshot.values('begins_at').searchsorted(cutoffs).astype(int)
+			for symbol, snapshot in snapshots.items()
+		}
+
+		# Symbols with the same number of bars share one matrix, like in AlphaStrategy.action_batch.
+		histories: Dict[str, AlphaSignalHistory] = dict()
+		rows: Dict[str, int] = dict()
+		groups: Dict[int, List[str]] = dict()
+		for symbol, snapshot in snapshots.items():
+			groups.setdefault(len(snapshot), []).append(symbol)
+		parameters = self._strategy.parameters
+		for group in groups.values():
+			columns = {
+				name: np.stack([snapshots[symbol].values(name) for symbol in group])
+				for name in parameters.signal_columns()
+			}
+			history = AlphaStrategy.signal_history(columns, parameters)
+			evaluated = np.unique(np.concatenate([bar_counts[symbol] for symbol in group]))
+			evaluated = evaluated[evaluated > 0]
+			samples = np.linspace(0, len(evaluated) - 1, min(self._look_ahead_samples, len(evaluated))).astype(int)
+			check_no_look_ahead(columns, history, evaluated[samples].tolist(), parameters)
+			for row, symbol in enumerate(group):
+				histories[symbol] = history
+				rows[symbol] = row
+		return SessionSignals(times=times, snapshots=snapshots, bar_counts=bar_counts, histories=histories, rows=rows)
+
+	def fill(
+		self,
+		signals: SessionSignals,
+		on_step: Optional[Callable[[datetime, Dict[str, float]], None]] = None
+	) -> List[OrderMetadata]:
+		"""
+		Step through the times of the session and fill the orders of each step.
+		"""
+		orders: List[OrderMetadata] = []
+		prices: Dict[str, float] = dict()
+		for step, time in enumerate(signals.times):
+			for symbol, snapshot in signals.snapshots.items():
+				bar_count = signals.bar_counts[symbol][step]
+				if bar_count == 0:
+					continue
+				order = self._step(symbol, snapshot, signals.histories[symbol], signals.rows[symbol], bar_count, time)
+				prices[symbol] = float(snapshot.values('close_price')[bar_count - 1])
+				if order is not None:
+					orders.append(order)
+			if on_step is not None:
+				on_step(time, prices)
+		log_info(f"[Backtester] Filled {len(orders)} orders for {len(signals.snapshots)} stocks over "
+				 f"{len(signals.times)} steps")
+		return orders
+
+	def _step(
+		self,
+		symbol: str,
+		snapshot: BarSnapshot,
+		history: AlphaSignalHistory,
+		row: int,
+		bar_count: int,
+		time: datetime
+	) -> Optional[OrderMetadata]:
+		bar_row = bar_count - 1
+		price = float(snapshot.values('close_price')[bar_row])
+		uuid = format_bar_id(int(snapshot.values('bar_id')[bar_row]))
+		active_orders = self._trading_agent.get_active_orders(symbol)
+		sell_margin = self._strategy.parameters.sell_margin
+
+		if self._strategy.should_buy(symbol, snapshot) \
+			and not AlphaStrategy.recently_bought(snapshot, bar_count, active_orders) \
+			and history.golden_pit[row, bar_row] \
+			and (history.golden_cross[row, bar_row] or history.main_force_entry[row, bar_row]):
+			return self._trading_agent.test_buy(symbol=symbol, uuid=uuid, price=price, time=time)
+
+		if self._strategy.should_sell(symbol, snapshot) \
+			and history.has_resistance_signal[row, bar_row] \
+			and snapshot.values('upper_band')[bar_row] >= max([order.price for order in active_orders]) * sell_margin:
+			return self._trading_agent.test_clean_all_position(symbol=symbol, uuid=uuid, price=price, time=time)
+		return None
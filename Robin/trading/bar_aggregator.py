@@ -0,0 +1,124 @@
+import numpy as np
+import pandas as pd
+
+from types import MappingProxyType
+from typing import Dict, Mapping, Optional
+
+from trading.bar_ids import make_bar_ids
+from trading.bar_store import BarStore, DEFAULT_RETENTION
+
+BASE_RESOLUTION = '5minute'
+
+BASE_LENGTH = pd.Timedelta(minutes=5)
+
+# Length of a bar per aggregated resolution, None for bars closed by the first bar of the next bucket only.
+RESOLUTION_LENGTHS = {
+	'15minute': pd.Timedelta(minutes=15),
+	'hour': pd.Timedelta(hours=1),
+	'day': None,
+}
+
+SESSION_TIMEZONE = 'US/Eastern'
+
+
+class BarAggregator(object):
+	"""
+	BarAggregator
+	Derives the bars of a coarser resolution from the 5-minute bars of a symbol as they are appended. Completed bars
+	are appended to their own BarStore, the bar still being built is kept aside as the partial bar. Every update
+	only touches the new 5-minute bars and the partial bar.
+
+	Intraday bars are aligned to the clock and complete once their last 5-minute bar arrived, day bars follow the
+	US/Eastern date and complete with the first bar of the next day. A leading bucket that may miss earlier bars is
+	left out, so aggregated bars never cover only part of their bucket at the start of the data.
+	@params:
+	symbol: symbol of the bars
+	resolution: one of RESOLUTION_LENGTHS
+	retention: number of most recent aggregated bars kept in the store
+	"""
+
+	def __init__(self, symbol: str, resolution: str, retention: int = DEFAULT_RETENTION):
+		if resolution not in RESOLUTION_LENGTHS:
+			raise ValueError(f"Unsupported resolution {resolution}.")
+		self._symbol = symbol
+		self._resolution = resolution
+		self._length = RESOLUTION_LENGTHS[resolution]
+		self._store = BarStore(retention=retention)
+		self._partial: Optional[Mapping[str, object]] = None
+		self._started = False
+		self._dropped_bucket: Optional[pd.Timestamp] = None
+
+	@property
+	def resolution(self) -> str:
+		return self._resolution
+
+	@property
+	def store(self) -> BarStore:
+		return self._store
+
+	@property
+	def partial_bar(self) -> Optional[Mapping[str, object]]:
+		"""
+		The bar of the current bucket built from the 5-minute bars so far, None if the last bucket is complete.
+		"""
+		return self._partial
+
+	def _bucket_starts(self, begins_at: pd.DatetimeIndex) -> pd.DatetimeIndex:
+		if self._length is None:
+			return begins_at.tz_convert(SESSION_TIMEZONE).floor('D').tz_convert('UTC')
+		return begins_at.floor(self._length)
+
+	def update(self, columns: Dict[str, object]) -> int:
+		"""
+		Aggregate 5-minute bars following the previously aggregated ones. Return the number of completed bars appended.
+		"""
+		begins_at = pd.DatetimeIndex(columns['begins_at'])
+		if len(begins_at) == 0:
+			return 0
+		bucket_starts = self._bucket_starts(begins_at)
+		keys = bucket_starts.asi8
+		starts = np.flatnonzero(np.concatenate([[True], keys[1:] != keys[:-1]]))
+		ends = np.concatenate([starts[1:], [len(keys)]])
+
+		bars = {
+			'begins_at': bucket_starts[starts],
+			'open_price': np.asarray(columns['open_price'])[starts],
+			'close_price': np.asarray(columns['close_price'])[ends - 1],
+			'high_price': np.maximum.reduceat(np.asarray(columns['high_price']), starts),
+			'low_price': np.minimum.reduceat(np.asarray(columns['low_price']), starts),
+			'volume': np.add.reduceat(np.asarray(columns['volume']), starts),
+		}
+
+		if self._partial is not None:
+			partial = self._partial
+			if partial['begins_at'] == bars['begins_at'][0]:
+				bars['open_price'][0] = partial['open_price']
+				bars['high_price'][0] = max(bars['high_price'][0], partial['high_price'])
+				bars['low_price'][0] = min(bars['low_price'][0], partial['low_price'])
+				bars['volume'][0] += partial['volume']
+			else:
+				bars = {
+					name: column.insert(0, partial[name]) if isinstance(column, pd.Index)
+					else np.concatenate([[partial[name]], column]) for name, column in bars.items()
+				}
+		else:
+			if not self._started and (self._length is None or begins_at[0] != bucket_starts[0]):
+				self._dropped_bucket = bars['begins_at'][0]
+			if bars['begins_at'][0] == self._dropped_bucket:
+				bars = {name: column[1:] for name, column in bars.items()}
+		self._started = True
+
+		count = len(bars['begins_at'])
+		if count == 0:
+			self._partial = None
+			return 0
+		last_complete = self._length is not None and begins_at[-1] + BASE_LENGTH >= bars['begins_at'][-1] + self._length
+		completed = count if last_complete else count - 1
+		self._partial = None if last_complete else MappingProxyType(
+			{name: column[-1] for name, column in bars.items()})
+
+		if completed > 0:
+			bars = {name: column[:completed] for name, column in bars.items()}
+			bars['bar_id'] = make_bar_ids(self._symbol, bars['begins_at'])
+			self._store.append(bars)
+		return completed
@@ -0,0 +1,131 @@
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+
+from datetime import datetime
+from threading import Lock
+from typing import Dict, List, Optional
+
+from util.util import PACKAGE_ROOT, mkdir
+
+ARCHIVE_ROOT = f"{PACKAGE_ROOT}/Data/Bars"
+
+ARCHIVE_TIMEZONE = 'US/Eastern'
+
+BAR_DTYPE = np.dtype([
+	('begins_at', '<i8'),
+	('open_price', '<f8'),
+	('close_price', '<f8'),
+	('high_price', '<f8'),
+	('low_price', '<f8'),
+	('volume', '<i8'),
+])
+
+# regular: whether the bar is of the regular session, the bars a regular bounds request returns.
+ARCHIVE_DTYPE = np.dtype(BAR_DTYPE.descr + [('regular', '?')])
+
+
+def _archive_day(value: datetime) -> str:
+	return pd.Timestamp(value).tz_convert(ARCHIVE_TIMEZONE).strftime('%Y%m%d')
+
+
+class BarArchive(object):
+	"""
+	BarArchive
+	On-disk archive of 5-minute bars, one file per symbol and trading day (US/Eastern) at
+	{root}/{symbol}/{symbol}.{yyyymmdd}.bars. A file is a flat array of fixed-size little-endian records
+	(ARCHIVE_DTYPE, begins_at in nanoseconds since the epoch), so bars are appended without rewriting the file and
+	read back as memory-mapped numpy arrays.
+	@params:
+	root: directory holding the archive
+	"""
+
+	def __init__(self, root: str = ARCHIVE_ROOT):
+		self._root = root
+		self._last_begins_at: Dict[str, int] = dict()
+		self._lock = Lock()
+
+	def _path(self, symbol: str, yyyymmdd: str) -> str:
+		return f"{self._root}/{symbol}/{symbol}.{yyyymmdd}.bars"
+
+	def symbols(self) -> List[str]:
+		return sorted(os.path.basename(path) for path in glob.glob(f"{self._root}/*") if os.path.isdir(path))
+
+	def days(self, symbol: str) -> List[str]:
+		return sorted(os.path.basename(path).split('.')[1] for path in glob.glob(self._path(symbol, '*')))
+
+	def read_day(self, symbol: str, yyyymmdd: str) -> np.ndarray:
+		"""
+		Memory-mapped records of one day, a partially written trailing record is ignored.
+		"""
+		path = self._path(symbol, yyyymmdd)
+		count = os.path.getsize(path) // ARCHIVE_DTYPE.itemsize if os.path.exists(path) else 0
+		if count == 0:
+			return np.empty(0, dtype=ARCHIVE_DTYPE)
+		return np.memmap(path, dtype=ARCHIVE_DTYPE, mode='r', shape=(count,))
+
+	def append(self, symbol: str, columns: Dict[str, object]) -> int:
+		"""
+		Append bars given as columns (begins_at as a UTC DatetimeIndex), skipping the bars already archived.
+		"""
+		with self._lock:
+			begins_at = np.asarray(columns['begins_at'].asi8)
+			new_rows = begins_at > self._get_last_begins_at(symbol)
+			if not new_rows.any():
+				return 0
+			records = np.empty(int(new_rows.sum()), dtype=ARCHIVE_DTYPE)
+			for name in ARCHIVE_DTYPE.names:
+				records[name] = begins_at[new_rows] if name == 'begins_at' else np.asarray(columns[name])[new_rows]
+
+			mkdir(f"{self._root}/{symbol}")
+			days = pd.to_datetime(records['begins_at'], utc=True).tz_convert(ARCHIVE_TIMEZONE).strftime('%Y%m%d')
+			for yyyymmdd in days.unique():
+				with open(self._path(symbol, yyyymmdd), 'ab') as f:
+					f.write(records[np.asarray(days == yyyymmdd)].tobytes())
+			self._last_begins_at[symbol] = int(records['begins_at'][-1])
+			return len(records)
+
+	def _get_last_begins_at(self, symbol: str) -> int:
+		if symbol not in self._last_begins_at:
+			days = self.days(symbol)
+			records = self.read_day(symbol, days[-1]) if days else []
+			self._last_begins_at[symbol] = int(records['begins_at'][-1]) if len(records) > 0 else -1
+		return self._last_begins_at[symbol]
+
+	def load(
+		self,
+		symbol: str,
+		start: Optional[datetime] = None,
+		end: Optional[datetime] = None
+	) -> Optional[Dict[str, object]]:
+		"""
+		Bars with start <= begins_at < end as columns in the layout of parse_historicals, None if there are none.
+		"""
+		first_day = _archive_day(start) if start is not None else ''
+		last_day = _archive_day(end) if end is not None else '99999999'
+		days = [yyyymmdd for yyyymmdd in self.days(symbol) if first_day <= yyyymmdd <= last_day]
+		if not days:
+			return None
+		records = np.concatenate([self.read_day(symbol, yyyymmdd) for yyyymmdd in days])
+		rows = np.ones(len(records), dtype=bool)
+		if start is not None:
+			rows &= records['begins_at'] >= pd.Timestamp(start).value
+		if end is not None:
+			rows &= records['begins_at'] < pd.Timestamp(end).value
+		records = records[rows]
+		if len(records) == 0:
+			return None
+		columns = {name: np.array(records[name]) for name in ARCHIVE_DTYPE.names}
+		columns['begins_at'] = pd.to_datetime(columns['begins_at'], utc=True)
+		return columns
+
+	def read_frame(self, symbol: str, start: Optional[datetime] = None, end: Optional[datetime] = None) -> pd.DataFrame:
+		"""
+		Archived bars as a DataFrame with the columns of the collector, for backtests and the model scripts.
+		"""
+		columns = self.load(symbol, start, end)
+		if columns is None:
+			return pd.DataFrame(columns=list(ARCHIVE_DTYPE.names))
+		return pd.DataFrame(columns)
@@ -0,0 +1,40 @@
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from typing import Optional
+
+NANOSECONDS_PER_MINUTE = 60 * 1000 * 1000 * 1000
+
+
+def symbol_hash(symbol: str) -> int:
+	return zlib.crc32(symbol.encode()) & 0x7FFFFFFF
+
+
+def make_bar_ids(symbol: str, begins_at: pd.DatetimeIndex) -> np.ndarray:
+	"""
+	Bar ids are int64 values derived from the symbol and the bar start: the upper 32 bits hold a hash of the symbol,
+	the lower 32 bits the minutes since the epoch. The same bar always gets the same id, also after a restart.
+	"""
+	minutes = begins_at.asi8 // NANOSECONDS_PER_MINUTE
+	return (np.int64(symbol_hash(symbol)) << 32) | minutes.astype(np.int64)
+
+
+def format_bar_id(bar_id: Optional[int]) -> str:
+	"""
+	Bar ids are kept as strings in ActionMetadata and OrderMetadata.
+	"""
+	if bar_id is None:
+		return ""
+	return str(bar_id)
+
+
+def parse_bar_id(uuid: Optional[str]) -> Optional[int]:
+	"""
+	Return the bar id stored in an order uuid, or None for ids generated before bar ids were introduced.
+	"""
+	try:
+		return int(uuid)
+	except (TypeError, ValueError):
+		return None
@@ -0,0 +1,239 @@
+import numpy as np
+import pandas as pd
+
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Dict, FrozenSet, List, Mapping, Optional, Tuple
+
+DEFAULT_RETENTION = 2000
+
+DEFAULT_CAPACITY = 256
+
+BAR_SCHEMA = {
+	'begins_at': 'datetime64[ns, UTC]',
+	'open_price': np.float64,
+	'close_price': np.float64,
+	'high_price': np.float64,
+	'low_price': np.float64,
+	'volume': np.int64,
+	'bar_id': np.int64,
+}
+
+
+def _allocate(dtype, capacity: int):
+	if dtype == 'datetime64[ns, UTC]':
+		return pd.array(np.full(capacity, np.datetime64('NaT', 'ns')), dtype=dtype)
+	if np.issubdtype(dtype, np.floating):
+		return np.full(capacity, np.nan, dtype=dtype)
+	return np.zeros(capacity, dtype=dtype)
+
+
+def _restore_snapshot(version, start_seq, columns, indicator_specs, index) -> 'BarSnapshot':
+	return BarSnapshot(
+		version=version,
+		start_seq=start_seq,
+		columns=MappingProxyType(columns),
+		indicator_specs=indicator_specs,
+		_index=index
+	)
+
+
+@dataclass(frozen=True)
+class BarSnapshot:
+	"""
+	Immutable, versioned view over the bars of a symbol published by a BarStore. The writer only appends beyond the
+	published rows or writes into newly allocated arrays, so a snapshot never changes after it was published and
+	can be shared by any number of reader threads without locks or copies.
+	"""
+	version: int
+	start_seq: int
+	columns: Mapping[str, object]
+	indicator_specs: FrozenSet[Tuple] = frozenset()
+	_index: Mapping[int, int] = field(default_factory=dict, repr=False)
+
+	@staticmethod
+	def from_columns(columns: Dict[str, object]) -> 'BarSnapshot':
+		"""
+		Snapshot sharing the memory of fixed bar columns, e.g. archived bars replayed by a backtest.
+		"""
+		return BarSnapshot(
+			version=0,
+			start_seq=0,
+			columns=MappingProxyType(dict(columns)),
+			_index={bar_id: seq for seq, bar_id in enumerate(np.asarray(columns['bar_id']).tolist())}
+		)
+
+	def __reduce__(self):
+		# MappingProxyType does not pickle, backtests send snapshots between processes.
+		return _restore_snapshot, (
+			self.version, self.start_seq, dict(self.columns), self.indicator_specs, dict(self._index))
+
+	def __len__(self) -> int:
+		return len(self.columns['bar_id'])
+
+	def values(self, name: str):
+		return self.columns[name]
+
+	def last(self, name: str):
+		if len(self) == 0:
+			return None
+		return self.columns[name][len(self) - 1]
+
+	def row_of(self, bar_id: Optional[int]) -> Optional[int]:
+		"""
+		Row of the bar with the given id, None if the bar is not part of this snapshot.
+		"""
+		seq = self._index.get(bar_id)
+		if seq is None:
+			return None
+		row = seq - self.start_seq
+		if 0 <= row < len(self) and self.columns['bar_id'][row] == bar_id:
+			return row
+		return None
+
+	def with_columns(self, columns: Dict[str, object], indicator_specs: List[Tuple]) -> 'BarSnapshot':
+		"""
+		Copy of the snapshot with additional columns of the same length.
+		"""
+		return BarSnapshot(
+			version=self.version,
+			start_seq=self.start_seq,
+			columns=MappingProxyType({**self.columns, **columns}),
+			indicator_specs=self.indicator_specs | frozenset(indicator_specs),
+			_index=self._index
+		)
+
+	def frame(self, columns: Optional[List[str]] = None) -> pd.DataFrame:
+		"""
+		DataFrame sharing memory with the snapshot.
+		"""
+		if columns is None:
+			columns = list(self.columns)
+		return pd.DataFrame({name: self.columns[name] for name in columns}, copy=False)
+
+
+class BarStore(object):
+	"""
+	BarStore
+	Preallocated column arrays holding the bars of a single symbol. Appends write into the spare capacity, the arrays
+	are only reallocated when they are full: they double in size until twice the retention window, afterwards the
+	bars older than the retention window are dropped. Both keep appends amortized O(1) and memory bounded.
+	A hash index from bar_id to the bar's sequence number resolves bar ids to rows in O(1).
+	@params:
+	retention: number of most recent bars kept in the store
+	capacity: number of bars allocated up front
+	"""
+
+	def __init__(self, retention: int = DEFAULT_RETENTION, capacity: int = DEFAULT_CAPACITY):
+		self._retention = retention
+		self._capacity = max(1, min(capacity, 2 * retention))
+		self._size = 0
+		self._start_seq = 0
+		self._index: Dict[int, int] = dict()
+		self._schema: Dict[str, object] = dict(BAR_SCHEMA)
+		self._columns: Dict[str, object] = {
+			name: _allocate(dtype, self._capacity) for name, dtype in self._schema.items()
+		}
+
+	def __len__(self) -> int:
+		return self._size
+
+	@property
+	def start_seq(self) -> int:
+		"""
+		Sequence number of the first retained bar, i.e. the number of bars dropped by the retention window so far.
+		"""
+		return self._start_seq
+
+	@property
+	def end_seq(self) -> int:
+		"""
+		Sequence number following the last bar, i.e. the number of bars appended so far.
+		"""
+		return self._start_seq + self._size
+
+	@property
+	def columns(self) -> List[str]:
+		return list(self._columns)
+
+	def add_column(self, name: str, dtype=np.float64):
+		if name not in self._columns:
+			self._schema[name] = dtype
+			self._columns[name] = _allocate(dtype, self._capacity)
+
+	def reset_column(self, name: str, dtype=np.float64):
+		"""
+		Replace a column by a newly allocated empty array, leaving the array seen by published snapshots untouched.
+		"""
+		self._schema[name] = dtype
+		self._columns[name] = _allocate(dtype, self._capacity)
+
+	def append(self, columns: Dict[str, object]) -> int:
+		"""
+		Append bars given as equally sized arrays keyed by column name. Missing columns are left empty.
+		"""
+		count = len(next(iter(columns.values())))
+		if count == 0:
+			return 0
+		if count > self._retention:
+			columns = {name: array[count - self._retention:] for name, array in columns.items()}
+			self._start_seq += count - self._retention
+			count = self._retention
+		self._reserve(count)
+		for name, array in self._columns.items():
+			if name in columns:
+				array[self._size:self._size + count] = columns[name]
+		if 'bar_id' in columns:
+			self._index.update(zip(columns['bar_id'].tolist(), range(self.end_seq, self.end_seq + count)))
+		self._size += count
+		return count
+
+	def _reserve(self, count: int):
+		if self._size + count <= self._capacity:
+			return
+		drop = min(self._size, max(0, self._size + count - self._retention))
+		keep = self._size - drop
+		capacity = self._capacity
+		while capacity < 2 * (keep + count):
+			capacity *= 2
+		capacity = max(min(capacity, 2 * self._retention), keep + count)
+
+		for bar_id in self._columns['bar_id'][:drop].tolist():
+			self._index.pop(bar_id, None)
+		columns = dict()
+		for name, array in self._columns.items():
+			columns[name] = _allocate(self._schema[name], capacity)
+			columns[name][:keep] = array[drop:self._size]
+		self._columns = columns
+		self._capacity = capacity
+		self._size = keep
+		self._start_seq += drop
+
+	def values(self, name: str):
+		"""
+		Zero-copy view of a column over the stored bars.
+		"""
+		return self._columns[name][:self._size]
+
+	def row_of(self, bar_id: Optional[int]) -> Optional[int]:
+		"""
+		Row of the bar with the given id, None if the bar is unknown or no longer retained.
+		"""
+		seq = self._index.get(bar_id)
+		if seq is None or seq < self._start_seq:
+			return None
+		return seq - self._start_seq
+
+	def last(self, name: str):
+		if self._size == 0:
+			return None
+		return self._columns[name][self._size - 1]
+
+	def snapshot(self, version: int, indicator_specs: FrozenSet[Tuple] = frozenset()) -> BarSnapshot:
+		return BarSnapshot(
+			version=version,
+			start_seq=self._start_seq,
+			columns=MappingProxyType({name: self.values(name) for name in self._columns}),
+			indicator_specs=indicator_specs,
+			_index=self._index
+		)
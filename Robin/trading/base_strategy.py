@@ -1,9 +1,12 @@
-import pandas as pd
 from dataclasses import dataclass
 from enum import Enum
+from typing import Dict, List, Optional
 
+from trading.bar_ids import parse_bar_id
+from trading.bar_store import BarSnapshot
 from trading.stock_historical_collector import StockHistoricalCollector
 from trading.trading_agent import OrderMetadata, TradingAgent
+from util.util import log_error
 
 
 class Action(Enum):
@@ -23,18 +26,37 @@ class BaseStrategy(object):
 	def __init__(self, stock_info_collector: StockHistoricalCollector, trading_agent: TradingAgent):
 		self._stock_info_collector: StockHistoricalCollector = stock_info_collector
 		self._trade_agent: TradingAgent = trading_agent
+		# Symbols held by the last action_batch because evaluating them raised.
+		self._failed_symbols: List[str] = []
+
+	@property
+	def failed_symbols(self) -> List[str]:
+		return self._failed_symbols
+
+	def _hold_failed(self, symbol: str, e: Exception) -> ActionMetadata:
+		log_error(f"Exception when evaluating {symbol}, holding it.", e)
+		self._failed_symbols.append(symbol)
+		return ActionMetadata(action=Action.HOLD, amount=0, uuid="")
 
 	"""
 	Avoid duplicate purchase here
 	"""
-	def should_buy(self, symbol: str) -> bool:
-		stock_historical_data: pd.DataFrame = self._stock_info_collector.get_historical_info_by_symbol(symbol=symbol)
-		active_orders: list[OrderMetadata] = self._trade_agent.get_active_orders(symbol)
-		if len(stock_historical_data) == 0:
+	def should_buy(
+		self,
+		symbol: str,
+		snapshot: Optional[BarSnapshot] = None,
+		active_orders: Optional[List[OrderMetadata]] = None
+	) -> bool:
+		if snapshot is None:
+			snapshot = self._stock_info_collector.get_snapshot(symbol)
+		last_bar_id = snapshot.last('bar_id') if snapshot is not None else None
+		if active_orders is None:
+			active_orders = self._trade_agent.get_active_orders(symbol)
+		if last_bar_id is None:
 			return False
 
 		for active_order in active_orders:
-			if active_order.uuid == list(stock_historical_data['uuid'])[-1]:
+			if parse_bar_id(active_order.uuid) == last_bar_id:
 				return False
 
 		return True
@@ -42,13 +64,34 @@ class BaseStrategy(object):
 	"""
 	Avoid selling without active order
 	"""
-	def should_sell(self, symbol: str) -> bool:
-		stock_historical_data: pd.DataFrame = self._stock_info_collector.get_historical_info_by_symbol(symbol=symbol)
-		active_orders: list[OrderMetadata] = self._trade_agent.get_active_orders(symbol)
+	def should_sell(
+		self,
+		symbol: str,
+		snapshot: Optional[BarSnapshot] = None,
+		active_orders: Optional[List[OrderMetadata]] = None
+	) -> bool:
+		if snapshot is None:
+			snapshot = self._stock_info_collector.get_snapshot(symbol)
+		last_bar_id = snapshot.last('bar_id') if snapshot is not None else None
+		if active_orders is None:
+			active_orders = self._trade_agent.get_active_orders(symbol)
 		for active_order in active_orders:
-			if active_order.uuid == list(stock_historical_data['uuid'])[-1]:
+			if parse_bar_id(active_order.uuid) == last_bar_id:
 				return False
-		return len(stock_historical_data) > 0 and len(active_orders) > 0
+		return last_bar_id is not None and len(active_orders) > 0
 
 	def action(self, stock, time):
 		raise Exception("Not Implemented")
+
+	def action_batch(self, stocks: List[str], time=None) -> Dict[str, ActionMetadata]:
+		"""
+		Action of every stock, a stock whose evaluation raises is held and listed in failed_symbols.
+		"""
+		self._failed_symbols = []
+		actions: Dict[str, ActionMetadata] = dict()
+		for stock in stocks:
+			try:
+				actions[stock] = self.action(stock, time)
+			except Exception as e:
+				actions[stock] = self._hold_failed(stock, e)
+		return actions
@@ -0,0 +1,143 @@
+from typing import List, Optional
+
+import robin_stocks.robinhood as robin
+
+from util.util import login
+
+
+class Broker(object):
+	"""
+	Broker
+	Market data and brokerage calls made by the collectors, TradeExecutor and TradingAgent. Requests and responses
+	keep the format of robin_stocks.robinhood, so an implementation can be swapped in with set_broker without
+	touching the callers.
+	"""
+
+	def login(self):
+		raise Exception("Not Implemented")
+
+	def get_stock_historicals(self, symbols: List[str], interval: str, span: str, bounds: str) -> List[dict]:
+		raise Exception("Not Implemented")
+
+	def get_latest_price(self, symbols, include_extended_hours: bool = True) -> List[Optional[str]]:
+		raise Exception("Not Implemented")
+
+	def get_quotes(self, symbols) -> List[dict]:
+		raise Exception("Not Implemented")
+
+	def order_buy_fractional_by_price(self, symbol: str, amount: float) -> dict:
+		raise Exception("Not Implemented")
+
+	def order_sell_fractional_by_quantity(self, symbol: str, quantity: float) -> dict:
+		raise Exception("Not Implemented")
+
+	def order(
+		self,
+		symbol: str,
+		quantity: float,
+		side: str,
+		limit_price: float,
+		extended_hours: bool,
+		market_hours: str
+	) -> dict:
+		raise Exception("Not Implemented")
+
+	def cancel_stock_order(self, order_id: str) -> dict:
+		raise Exception("Not Implemented")
+
+	def get_stock_order_info(self, order_id: str) -> dict:
+		raise Exception("Not Implemented")
+
+	def get_open_stock_positions(self) -> List[dict]:
+		raise Exception("Not Implemented")
+
+	def load_account_profile(self) -> dict:
+		raise Exception("Not Implemented")
+
+	def load_portfolio_profile(self) -> dict:
+		raise Exception("Not Implemented")
+
+	def get_symbol_by_url(self, url: str) -> str:
+		raise Exception("Not Implemented")
+
+	def get_instruments_by_symbols(self, symbols: List[str]) -> List[dict]:
+		raise Exception("Not Implemented")
+
+
+class RobinhoodBroker(Broker):
+	"""
+	RobinhoodBroker
+	The Robinhood account the trader runs against, through robin_stocks.
+	"""
+
+	def login(self):
+		login()
+
+	def get_stock_historicals(self, symbols: List[str], interval: str, span: str, bounds: str) -> List[dict]:
+		return robin.stocks.get_stock_historicals(symbols, interval=interval, span=span, bounds=bounds)
+
+	def get_latest_price(self, symbols, include_extended_hours: bool = True) -> List[Optional[str]]:
+		return robin.stocks.get_latest_price(symbols, includeExtendedHours=include_extended_hours)
+
+	def get_quotes(self, symbols) -> List[dict]:
+		return robin.stocks.get_quotes(symbols)
+
+	def order_buy_fractional_by_price(self, symbol: str, amount: float) -> dict:
+		return robin.orders.order_buy_fractional_by_price(symbol, amount)
+
+	def order_sell_fractional_by_quantity(self, symbol: str, quantity: float) -> dict:
+		return robin.orders.order_sell_fractional_by_quantity(symbol, quantity)
+
+	def order(
+		self,
+		symbol: str,
+		quantity: float,
+		side: str,
+		limit_price: float,
+		extended_hours: bool,
+		market_hours: str
+	) -> dict:
+		return robin.orders.order(
+			symbol=symbol,
+			quantity=quantity,
+			side=side,
+			limitPrice=limit_price,
+			extendedHours=extended_hours,
+			market_hours=market_hours
+		)
+
+	def cancel_stock_order(self, order_id: str) -> dict:
+		return robin.orders.cancel_stock_order(order_id)
+
+	def get_stock_order_info(self, order_id: str) -> dict:
+		return robin.orders.get_stock_order_info(order_id)
+
+	def get_open_stock_positions(self) -> List[dict]:
+		return robin.account.get_open_stock_positions()
+
+	def load_account_profile(self) -> dict:
+		return robin.profiles.load_account_profile()
+
+	def load_portfolio_profile(self) -> dict:
+		return robin.profiles.load_portfolio_profile()
+
+	def get_symbol_by_url(self, url: str) -> str:
+		return robin.stocks.get_symbol_by_url(url)
+
+	def get_instruments_by_symbols(self, symbols: List[str]) -> List[dict]:
+		return robin.stocks.get_instruments_by_symbols(symbols)
+
+
+_broker: Broker = RobinhoodBroker()
+
+
+def get_broker() -> Broker:
+	"""
+	Broker used by the collectors, TradeExecutor and TradingAgent, Robinhood unless replaced by set_broker.
+	"""
+	return _broker
+
+
+def set_broker(broker: Broker):
+	global _broker
+	_broker = broker
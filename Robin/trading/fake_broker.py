@@ -0,0 +1,371 @@
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from collections import Counter
+from datetime import datetime, timedelta
+from threading import Lock
+from typing import Dict, List, Optional
+
+from trading.broker import Broker
+from trading.historicals_parser import BEGINS_AT_FORMAT
+from util.util import get_datetime, log_info
+
+INSTRUMENT_URL = "https://api.robinhood.com/instruments/{}/"
+
+BAR_LENGTH = pd.Timedelta(minutes=5).value
+
+SPAN_LENGTHS = {
+	'week': timedelta(days=7),
+	'month': timedelta(days=30),
+	'3month': timedelta(days=90),
+	'year': timedelta(days=365),
+	'5year': timedelta(days=5 * 365),
+}
+
+# Arguments robin_stocks accepts for historicals, anything else returns [None].
+HISTORICALS_INTERVALS = ['5minute', '10minute', 'hour', 'day', 'week']
+
+HISTORICALS_SPANS = ['day', 'week', 'month', '3month', 'year', '5year']
+
+HISTORICALS_BOUNDS = ['extended', 'regular', 'trading']
+
+SESSION_TIMEZONE = 'US/Eastern'
+
+SHARE_TOLERANCE = 0.005
+
+
+class FakeBroker(Broker):
+	"""
+	FakeBroker
+	In-process broker serving recorded 5-minute bars as of the current time of the clock (get_datetime): the
+	historicals hold the bars completed by then and a quote is the close of the last completed bar. Orders fill
+	against the quotes, market orders at the quote and limit orders once the quote reaches the limit, fill_delay
+	clock seconds after they were placed. Every call takes a random latency and fails with probability error_rate,
+	like a flaky network. Historicals requests robin_stocks rejects, e.g. extended bounds with a span other than
+	'day', return [None] like robin_stocks, and quotes leave out unknown tickers.
+	@params:
+	bars: recorded bars of every symbol in the layout of backtester.load_bars
+	cash_position: cash of the account when created
+	latency: mean real seconds a call takes
+	error_rate: probability that a call raises ConnectionError
+	fill_delay: clock seconds between placing an order and its fill
+	seed: seed of the latency and error draws
+	"""
+
+	def __init__(
+		self,
+		bars: Dict[str, Dict[str, object]],
+		cash_position: float = 50000,
+		latency: float = 0,
+		error_rate: float = 0,
+		fill_delay: float = 0,
+		seed: int = 0
+	):
+		self._begins_at: Dict[str, np.ndarray] = {symbol: columns['begins_at'].asi8 for symbol, columns in bars.items()}
+		self._bars = bars
+		self._cash = cash_position
+		self._latency = latency
+		self._error_rate = error_rate
+		self._fill_delay = timedelta(seconds=fill_delay)
+		self._rng = np.random.default_rng(seed)
+		self._instrument_ids: Dict[str, str] = {symbol: str(uuid.uuid5(uuid.NAMESPACE_URL, symbol)) for symbol in bars}
+		self._symbols: Dict[str, str] = {instrument_id: symbol for symbol, instrument_id in self._instrument_ids.items()}
+		# Symbol to (quantity, average buy price).
+		self._positions: Dict[str, List[float]] = dict()
+		self._orders: Dict[str, dict] = dict()
+		self._calls: Counter = Counter()
+		self._formatted: Dict[str, List[dict]] = dict()
+		self._lock = Lock()
+
+	def _call(self, name: str):
+		"""
+		Wait the latency of a call and raise the injected errors.
+		"""
+		with self._lock:
+			self._calls[name] += 1
+			latency = self._rng.exponential(self._latency) if self._latency > 0 else 0
+			failed = self._rng.random() < self._error_rate
+			if failed:
+				self._calls['errors'] += 1
+		if latency > 0:
+			time.sleep(latency)
+		if failed:
+			raise ConnectionError(f"[FakeBroker] Injected error in {name}.")
+
+	def call_counts(self) -> Dict[str, int]:
+		"""
+		Number of calls by method, and the number of injected errors under 'errors'.
+		"""
+		with self._lock:
+			return dict(self._calls)
+
+	def _completed_rows(self, symbol: str, now: datetime) -> int:
+		return int(np.searchsorted(self._begins_at[symbol], pd.Timestamp(now).value - BAR_LENGTH, side='right'))
+
+	def _quote(self, symbol: str, now: datetime) -> Optional[float]:
+		if symbol not in self._bars:
+			return None
+		rows = self._completed_rows(symbol, now)
+		return float(self._bars[symbol]['close_price'][rows - 1]) if rows > 0 else None
+
+	def login(self):
+		self._call('login')
+		log_info("[FakeBroker] Logged in.")
+
+	def get_stock_historicals(self, symbols: List[str], interval: str, span: str, bounds: str) -> List[dict]:
+		self._call('get_stock_historicals')
+		if interval not in HISTORICALS_INTERVALS or span not in HISTORICALS_SPANS or bounds not in HISTORICALS_BOUNDS:
+			log_info(f"[FakeBroker] Invalid historicals request, interval: {interval}, span: {span}, bounds: {bounds}")
+			return [None]
+		if bounds in ['extended', 'trading'] and span != 'day':
+			log_info(f"[FakeBroker] Extended and trading bounds can only be used with a span of day, got {span}")
+			return [None]
+		if interval != '5minute':
+			raise Exception(f"[FakeBroker] Only 5minute bars are recorded, got {interval}.")
+		now = get_datetime()
+		historicals = []
+		for symbol in symbols if isinstance(symbols, list) else [symbols]:
+			if symbol not in self._bars:
+				continue
+			end = self._completed_rows(symbol, now)
+			if end == 0:
+				continue
+			if span == 'day':
+				# The latest session, from midnight of the day of the last completed bar.
+				first_begins_at = self._bars[symbol]['begins_at'][end - 1].tz_convert(SESSION_TIMEZONE).normalize()
+			else:
+				first_begins_at = pd.Timestamp(now) - SPAN_LENGTHS[span]
+			first = int(np.searchsorted(self._begins_at[symbol], first_begins_at.value))
+			records = self._records(symbol)
+			if bounds == 'regular':
+				historicals += [record for record in records[first:end] if record['session'] == 'reg']
+			else:
+				historicals += records[first:end]
+		return historicals
+
+	def _records(self, symbol: str) -> List[dict]:
+		"""
+		Historicals records of every recorded bar of the symbol, formatted once and shared by the responses.
+		"""
+		if symbol not in self._formatted:
+			columns = self._bars[symbol]
+			time_of_day = columns['begins_at'].tz_convert(SESSION_TIMEZONE).strftime('%H%M%S')
+			self._formatted[symbol] = [{
+				'begins_at': begins_at_key,
+				'open_price': f"{open_price:.6f}",
+				'close_price': f"{close_price:.6f}",
+				'high_price': f"{high_price:.6f}",
+				'low_price': f"{low_price:.6f}",
+				'volume': int(volume),
+				'session': 'pre' if hhmmss < '093000' else ('reg' if hhmmss < '160000' else 'post'),
+				'interpolated': False,
+				'symbol': symbol,
+			} for begins_at_key, open_price, close_price, high_price, low_price, volume, hhmmss in zip(
+				columns['begins_at'].strftime(BEGINS_AT_FORMAT), columns['open_price'], columns['close_price'],
+				columns['high_price'], columns['low_price'], columns['volume'], time_of_day)]
+		return self._formatted[symbol]
+
+	def _quotes(self, symbols) -> List[dict]:
+		"""
+		Quotes of the known symbols, unknown tickers are left out like robin_stocks does.
+		"""
+		now = get_datetime()
+		quotes = []
+		for symbol in symbols if isinstance(symbols, list) else [symbols]:
+			if symbol not in self._bars:
+				continue
+			quote = self._quote(symbol, now)
+			quotes.append({
+				'symbol': symbol,
+				'last_trade_price': f"{quote:.6f}" if quote is not None else None,
+				'last_extended_hours_trade_price': None,
+			})
+		return quotes
+
+	def get_latest_price(self, symbols, include_extended_hours: bool = True) -> List[Optional[str]]:
+		self._call('get_latest_price')
+		return [quote['last_trade_price'] for quote in self._quotes(symbols)]
+
+	def get_quotes(self, symbols) -> List[dict]:
+		self._call('get_quotes')
+		return self._quotes(symbols)
+
+	def _place(
+		self,
+		symbol: str,
+		side: str,
+		order_type: str,
+		quantity: Optional[float] = None,
+		amount: Optional[float] = None,
+		limit_price: Optional[float] = None
+	) -> dict:
+		now = get_datetime()
+		quote = self._quote(symbol, now)
+		if quote is None:
+			return {'detail': f"No quote for {symbol}."}
+		with self._lock:
+			self._settle(now)
+			if side == 'buy':
+				cost = amount if amount is not None else quantity * (limit_price if limit_price is not None else quote)
+				if cost > self._buying_power():
+					return {'detail': "Not enough buying power."}
+			else:
+				pending = sum([
+					order['quantity'] for order in self._orders.values()
+					if order['symbol'] == symbol and order['side'] == 'sell' and order['state'] == 'queued'
+				])
+				# TradeExecutor rounds the shares to sell to cents of a share.
+				if quantity + pending > self._positions.get(symbol, [0, 0])[0] + SHARE_TOLERANCE:
+					return {'detail': "Not enough shares to sell."}
+			order = {
+				'id': str(uuid.uuid4()),
+				'symbol': symbol,
+				'instrument_id': self._instrument_ids[symbol],
+				'instrument': INSTRUMENT_URL.format(self._instrument_ids[symbol]),
+				'side': side,
+				'type': order_type,
+				'state': 'queued',
+				'quantity': quantity if quantity is not None else amount / quote,
+				'amount': amount,
+				'limit_price': limit_price,
+				'price': limit_price if limit_price is not None else quote,
+				'created_at': now,
+			}
+			self._orders[order['id']] = order
+			self._settle(now)
+			return self._response(order)
+
+	@staticmethod
+	def _response(order: dict) -> dict:
+		return {
+			'id': order['id'],
+			'symbol': order['symbol'],
+			'instrument_id': order['instrument_id'],
+			'instrument': order['instrument'],
+			'side': order['side'],
+			'type': order['type'],
+			'state': order['state'],
+			'price': f"{order['price']:.6f}",
+			'quantity': f"{order['quantity']:.6f}",
+			'cumulative_quantity': f"{order['quantity'] if order['state'] == 'filled' else 0:.6f}",
+			'average_price': f"{order['price']:.6f}" if order['state'] == 'filled' else None,
+			'created_at': order['created_at'].isoformat(),
+		}
+
+	def _buying_power(self) -> float:
+		pending = sum([
+			order['amount'] if order['amount'] is not None else order['quantity'] * order['price']
+			for order in self._orders.values() if order['side'] == 'buy' and order['state'] == 'queued'
+		])
+		return self._cash - pending
+
+	def _settle(self, now: datetime):
+		"""
+		Fill the queued orders placed at least fill_delay ago whose price is reached by the quote, with the lock held.
+		"""
+		for order in self._orders.values():
+			if order['state'] != 'queued' or now - order['created_at'] < self._fill_delay:
+				continue
+			quote = self._quote(order['symbol'], now)
+			if order['limit_price'] is not None and \
+				(quote > order['limit_price'] if order['side'] == 'buy' else quote < order['limit_price']):
+				continue
+			quantity = order['amount'] / quote if order['amount'] is not None else order['quantity']
+			position = self._positions.setdefault(order['symbol'], [0.0, 0.0])
+			if order['side'] == 'buy':
+				if quantity * quote > self._cash:
+					order['state'] = 'rejected'
+					continue
+				position[1] = (position[0] * position[1] + quantity * quote) / (position[0] + quantity)
+				position[0] += quantity
+				self._cash -= quantity * quote
+			else:
+				quantity = min(quantity, position[0])
+				position[0] -= quantity
+				self._cash += quantity * quote
+				if position[0] <= 0:
+					self._positions.pop(order['symbol'])
+			order['state'] = 'filled'
+			order['quantity'] = quantity
+			order['price'] = quote
+
+	def order_buy_fractional_by_price(self, symbol: str, amount: float) -> dict:
+		self._call('order_buy_fractional_by_price')
+		return self._place(symbol, 'buy', 'market', amount=amount)
+
+	def order_sell_fractional_by_quantity(self, symbol: str, quantity: float) -> dict:
+		self._call('order_sell_fractional_by_quantity')
+		return self._place(symbol, 'sell', 'market', quantity=quantity)
+
+	def order(
+		self,
+		symbol: str,
+		quantity: float,
+		side: str,
+		limit_price: float,
+		extended_hours: bool,
+		market_hours: str
+	) -> dict:
+		self._call('order')
+		return self._place(symbol, side, 'limit', quantity=quantity, limit_price=limit_price)
+
+	def cancel_stock_order(self, order_id: str) -> dict:
+		self._call('cancel_stock_order')
+		with self._lock:
+			self._settle(get_datetime())
+			order = self._orders.get(order_id)
+			if order is None or order['state'] != 'queued':
+				return {'detail': f"Order {order_id} cannot be cancelled."}
+			order['state'] = 'cancelled'
+			return dict()
+
+	def get_stock_order_info(self, order_id: str) -> dict:
+		self._call('get_stock_order_info')
+		with self._lock:
+			self._settle(get_datetime())
+			if order_id not in self._orders:
+				return {'detail': f"Order {order_id} not found."}
+			return self._response(self._orders[order_id])
+
+	def get_open_stock_positions(self) -> List[dict]:
+		self._call('get_open_stock_positions')
+		with self._lock:
+			self._settle(get_datetime())
+			return [{
+				'instrument': INSTRUMENT_URL.format(self._instrument_ids[symbol]),
+				'instrument_id': self._instrument_ids[symbol],
+				'symbol': symbol,
+				'quantity': f"{quantity:.6f}",
+				'average_buy_price': f"{average_buy_price:.4f}",
+			} for symbol, (quantity, average_buy_price) in self._positions.items()]
+
+	def load_account_profile(self) -> dict:
+		self._call('load_account_profile')
+		with self._lock:
+			self._settle(get_datetime())
+			return {'buying_power': f"{self._buying_power():.4f}", 'portfolio_cash': f"{self._cash:.4f}"}
+
+	def load_portfolio_profile(self) -> dict:
+		self._call('load_portfolio_profile')
+		now = get_datetime()
+		with self._lock:
+			self._settle(now)
+			equity = self._cash + sum([
+				quantity * self._quote(symbol, now) for symbol, (quantity, _) in self._positions.items()
+			])
+			return {'equity': f"{equity:.4f}"}
+
+	def get_symbol_by_url(self, url: str) -> str:
+		self._call('get_symbol_by_url')
+		return self._symbols[url.rstrip('/').split('/')[-1]]
+
+	def get_instruments_by_symbols(self, symbols: List[str]) -> List[dict]:
+		self._call('get_instruments_by_symbols')
+		return [{
+			'id': self._instrument_ids[symbol],
+			'url': INSTRUMENT_URL.format(self._instrument_ids[symbol]),
+			'symbol': symbol,
+		} for symbol in (symbols if isinstance(symbols, list) else [symbols]) if symbol in self._instrument_ids]
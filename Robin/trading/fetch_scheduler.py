@@ -0,0 +1,108 @@
+import time
+
+from concurrent.futures import ThreadPoolExecutor, wait
+from threading import Lock
+from typing import Callable, List, Optional, TypeVar
+
+from util.util import log_error
+
+DEFAULT_BATCH_SIZE = 25
+
+DEFAULT_MAX_WORKERS = 4
+
+DEFAULT_CALLS_PER_SECOND = 5
+
+T = TypeVar('T')
+
+
+class TokenBucket(object):
+	"""
+	TokenBucket
+	@params:
+	rate: tokens added per second
+	capacity: maximum number of tokens, i.e. the allowed burst, defaults to one second worth of tokens
+	"""
+
+	def __init__(self, rate: float, capacity: Optional[float] = None):
+		self._rate = rate
+		self._capacity = capacity if capacity is not None else max(1.0, rate)
+		self._tokens = self._capacity
+		self._updated_at = time.monotonic()
+		self._lock = Lock()
+
+	def acquire(self):
+		while True:
+			with self._lock:
+				now = time.monotonic()
+				self._tokens = min(self._capacity, self._tokens + (now - self._updated_at) * self._rate)
+				self._updated_at = now
+				if self._tokens >= 1:
+					self._tokens -= 1
+					return
+				wait_time = (1 - self._tokens) / self._rate
+			time.sleep(wait_time)
+
+
+class FetchScheduler(object):
+	"""
+	FetchScheduler
+	Splits a symbol list into batches and fetches them on a bounded thread pool. Every API call made through
+	`call` takes a token from a shared bucket, which caps the calls per second across all batches and callers.
+	@params:
+	batch_size: maximum number of symbols per request
+	max_workers: number of batches fetched concurrently
+	calls_per_second: API calls allowed per second
+	"""
+
+	def __init__(
+		self,
+		batch_size: int = DEFAULT_BATCH_SIZE,
+		max_workers: int = DEFAULT_MAX_WORKERS,
+		calls_per_second: float = DEFAULT_CALLS_PER_SECOND
+	):
+		self._batch_size = batch_size
+		self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="FetchScheduler")
+		self._token_bucket = TokenBucket(calls_per_second)
+
+	def batches(self, symbols: List[str]) -> List[List[str]]:
+		return [symbols[i:i + self._batch_size] for i in range(0, len(symbols), self._batch_size)]
+
+	def call(self, fn: Callable[..., T], *args, **kwargs) -> T:
+		"""
+		Make a single rate-limited API call.
+		"""
+		self._token_bucket.acquire()
+		return fn(*args, **kwargs)
+
+	def map_batches(self, fetch: Callable[[List[str]], T], symbols: List[str]) -> List[T]:
+		"""
+		Run fetch on every batch of symbols and return the results in batch order. All batches run to completion,
+		the first failure is raised afterwards.
+		"""
+		futures = [self._executor.submit(fetch, batch) for batch in self.batches(symbols)]
+		wait(futures)
+		errors = [future.exception() for future in futures if future.exception() is not None]
+		for error in errors[1:]:
+			log_error(f"[FetchScheduler] Error when fetching a batch.", error)
+		if errors:
+			raise errors[0]
+		return [future.result() for future in futures]
+
+	def shutdown(self):
+		self._executor.shutdown(wait=True)
+
+
+_default_scheduler: Optional[FetchScheduler] = None
+
+_default_scheduler_lock = Lock()
+
+
+def get_default_fetch_scheduler() -> FetchScheduler:
+	"""
+	Scheduler shared by the collectors, so their calls draw from the same rate limit.
+	"""
+	global _default_scheduler
+	with _default_scheduler_lock:
+		if _default_scheduler is None:
+			_default_scheduler = FetchScheduler()
+		return _default_scheduler
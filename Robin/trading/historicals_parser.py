@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+
+from operator import itemgetter
+from typing import Dict, List
+
+BEGINS_AT_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+_FIELDS = itemgetter('symbol', 'begins_at', 'open_price', 'close_price', 'high_price', 'low_price', 'volume', 'session')
+
+
+def parse_historicals(historical_info: List[dict]) -> Dict[str, Dict[str, object]]:
+	"""
+	Convert the raw robin_stocks historicals of any number of symbols into typed column arrays per symbol.
+
+	The records are read in a single pass, every column is then converted once for all symbols and split by symbol,
+	keeping the response order within a symbol. begins_at becomes a UTC DatetimeIndex, prices float64, volume int64
+	and regular, whether the bar is of the regular session, bool, ready for BarStore.append.
+	"""
+	records = [info for info in historical_info if info is not None]
+	if not records:
+		return dict()
+	symbols, begins_at, open_price, close_price, high_price, low_price, volume, session = zip(*map(_FIELDS, records))
+
+	columns = {
+		'begins_at': pd.to_datetime(np.array(begins_at), format=BEGINS_AT_FORMAT, utc=True),
+		'open_price': np.array(open_price, dtype=np.float64),
+		'close_price': np.array(close_price, dtype=np.float64),
+		'high_price': np.array(high_price, dtype=np.float64),
+		'low_price': np.array(low_price, dtype=np.float64),
+		'volume': np.array(volume, dtype=np.int64),
+		'regular': np.array(session) == 'reg',
+	}
+
+	symbol_names, symbol_codes = np.unique(np.array(symbols), return_inverse=True)
+	order = np.argsort(symbol_codes, kind='stable')
+	bounds = np.searchsorted(symbol_codes[order], np.arange(len(symbol_names) + 1))
+	parsed = dict()
+	for i, symbol in enumerate(symbol_names):
+		rows = order[bounds[i]:bounds[i + 1]]
+		parsed[str(symbol)] = {name: column[rows] for name, column in columns.items()}
+	return parsed
+
+
+def select_rows(columns: Dict[str, object], mask: np.ndarray) -> Dict[str, object]:
+	return {name: column[mask] for name, column in columns.items()}
+
+
+def concat_rows(first: Dict[str, object], second: Dict[str, object]) -> Dict[str, object]:
+	return {
+		name: first[name].append(second[name]) if isinstance(first[name], pd.Index)
+		else np.concatenate([first[name], second[name]]) for name in first
+	}
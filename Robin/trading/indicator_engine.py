@@ -0,0 +1,232 @@
+import numpy as np
+import pandas as pd
+
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+from trading.bar_store import BarStore
+
+
+@dataclass
+class _RSIState:
+	window_size: int
+	emaup: float
+	emadn: float
+
+
+def hjk_spec(metadata) -> Tuple:
+	return 'hjk', metadata.interval, tuple(metadata.smooth_parameters), metadata.std_interval, metadata.std_multiplier
+
+
+def bollinger_spec(bollinger) -> Tuple:
+	return 'bollinger', bollinger.window, bollinger.no_of_std
+
+
+def rsi_spec(rsi_metadata) -> Tuple:
+	return 'rsi', rsi_metadata.window_size
+
+
+def indicator_specs(metadata_list: List, bollinger=None, rsi_metadata=None) -> List[Tuple]:
+	specs = [hjk_spec(metadata) for metadata in metadata_list]
+	if bollinger is not None:
+		specs.append(bollinger_spec(bollinger))
+	if rsi_metadata is not None:
+		specs.append(rsi_spec(rsi_metadata))
+	return specs
+
+
+def hjk_lookback(metadata) -> int:
+	"""
+	Bars needed before a row so that the chained rolling windows of the row are fully populated.
+	"""
+	lookback = metadata.interval - 1 + sum(window - 1 for window in metadata.smooth_parameters)
+	if metadata.std_multiplier > 0:
+		lookback = max(lookback, metadata.std_interval - 1)
+	return lookback
+
+
+def compute_hjk(close_prices, low_prices, high_prices, metadata) -> Dict[str, np.ndarray]:
+	interval = metadata.interval
+	close_prices = pd.Series(close_prices)
+	low_min = pd.Series(low_prices).rolling(window=interval).min()
+	rsv = (close_prices - low_min) / (pd.Series(high_prices).rolling(window=interval).max() - low_min) * 100
+	term = rsv
+	for smooth_parameters in metadata.smooth_parameters:
+		term = term.rolling(window=smooth_parameters).mean()
+	if metadata.std_multiplier > 0:
+		term = term + close_prices.rolling(window=metadata.std_interval).std() * metadata.std_multiplier
+	return {f'rsv_{interval}': rsv.values, f'term_line_{interval}': term.values}
+
+
+def compute_bollinger(close_prices, bollinger) -> Dict[str, np.ndarray]:
+	close_prices = pd.Series(close_prices)
+	sma = close_prices.rolling(bollinger.window).mean().values
+	std = close_prices.rolling(bollinger.window).std().values
+	return {
+		'SMA': sma,
+		'STD': std,
+		'upper_band': sma + bollinger.no_of_std * std,
+		'lower_band': sma - bollinger.no_of_std * std,
+	}
+
+
+def compute_rsi(
+	close_prices,
+	window_size: int,
+	first_row: int = 0,
+	state: Optional[_RSIState] = None
+) -> Tuple[np.ndarray, _RSIState]:
+	"""
+	Same definition as ta.momentum.RSIIndicator: Wilder's smoothing of the up and down moves. Without a state,
+	close_prices starts at the first bar. With the state of the bar before first_row, close_prices starts at that
+	bar and only the RSI of the following bars is returned.
+	"""
+	diff = np.diff(close_prices)
+	if state is None:
+		diff = np.concatenate([[0.0], diff])
+	up_direction = np.where(diff > 0, diff, 0.0)
+	down_direction = np.where(diff < 0, -diff, 0.0)
+	if state is not None:
+		up_direction = np.concatenate([[state.emaup], up_direction])
+		down_direction = np.concatenate([[state.emadn], down_direction])
+
+	alpha = 1 / window_size
+	emaup = pd.Series(up_direction).ewm(alpha=alpha, adjust=False).mean().values
+	emadn = pd.Series(down_direction).ewm(alpha=alpha, adjust=False).mean().values
+	if state is not None:
+		emaup, emadn = emaup[1:], emadn[1:]
+
+	with np.errstate(divide='ignore', invalid='ignore'):
+		rsi = np.where(emadn == 0, 100, 100 - (100 / (1 + emaup / emadn)))
+	rsi[np.arange(first_row, first_row + len(rsi)) < window_size - 1] = np.nan
+	return rsi, _RSIState(window_size=window_size, emaup=emaup[-1], emadn=emadn[-1])
+
+
+def compute_indicators(columns, metadata_list: List, bollinger=None, rsi_metadata=None) -> Dict[str, np.ndarray]:
+	"""
+	Compute the indicators over complete price columns, without any carried-over state.
+	"""
+	indicators = dict()
+	for metadata in metadata_list:
+		indicators.update(compute_hjk(columns['close_price'], columns['low_price'], columns['high_price'], metadata))
+	if bollinger is not None:
+		indicators.update(compute_bollinger(columns['close_price'], bollinger))
+	if rsi_metadata is not None:
+		indicators['rsi'] = compute_rsi(columns['close_price'], rsi_metadata.window_size)[0]
+	return indicators
+
+
+class IndicatorEngine(object):
+	"""
+	IndicatorEngine
+	Keeps the indicator columns of a BarStore up to date by only computing the bars appended since the previous
+	update. Rolling indicators are recomputed over the new bars plus the lookback they depend on, EWM indicators
+	(RSI) continue from the carried-over average of the last computed bar.
+
+	Indicators are registered from any thread and computed by the thread writing the store. Computed rows are never
+	overwritten: a column whose parameters change gets a freshly allocated array, so published snapshots of the
+	store stay unchanged.
+	"""
+
+	def __init__(self, store: BarStore):
+		self._store = store
+		self._computed_seq: Dict[str, int] = dict()
+		self._column_specs: Dict[str, Tuple] = dict()
+		self._rsi_state: Optional[_RSIState] = None
+		self._registered: Dict[str, Tuple] = dict()
+
+	def register(self, metadata_list: List, bollinger=None, rsi_metadata=None):
+		"""
+		Request indicators to be maintained, safe to call while another thread refreshes the engine.
+		"""
+		registered = dict(self._registered)
+		for metadata in metadata_list:
+			registered[f'hjk_{metadata.interval}'] = ('hjk', metadata)
+		if bollinger is not None:
+			registered['bollinger'] = ('bollinger', bollinger)
+		if rsi_metadata is not None:
+			registered['rsi'] = ('rsi', rsi_metadata)
+		self._registered = registered
+
+	def refresh(self) -> bool:
+		"""
+		Advance every registered indicator to the last bar of the store. Return whether any column was written.
+		"""
+		updated = False
+		for kind, spec in self._registered.values():
+			if kind == 'hjk':
+				updated = self._update_hjk(spec) or updated
+			elif kind == 'bollinger':
+				updated = self._update_bollinger(spec) or updated
+			elif kind == 'rsi':
+				updated = self._update_rsi(spec) or updated
+		return updated
+
+	def computed_specs(self) -> FrozenSet[Tuple]:
+		"""
+		Parameters of the indicators computed up to the last bar of the store.
+		"""
+		by_spec = dict()
+		for column, spec in self._column_specs.items():
+			by_spec[spec] = by_spec.get(spec, True) and self._computed_seq[column] == self._store.end_seq
+		return frozenset(spec for spec, computed in by_spec.items() if computed)
+
+	def _pending_row(self, columns: List[str], spec: Tuple) -> int:
+		"""
+		Return the first row of the store not yet computed for all of the given columns.
+		"""
+		start_seq = self._store.end_seq
+		for column in columns:
+			if self._column_specs.get(column) != spec:
+				self._store.reset_column(column)
+				self._computed_seq[column] = self._store.start_seq
+				self._column_specs[column] = spec
+			start_seq = min(start_seq, self._computed_seq[column])
+		return max(0, start_seq - self._store.start_seq)
+
+	def _write_tail(self, columns: Dict[str, np.ndarray], start: int, offset: int):
+		for column, values in columns.items():
+			self._store.values(column)[start:] = values[offset:]
+			self._computed_seq[column] = self._store.end_seq
+
+	def _update_hjk(self, metadata) -> bool:
+		interval = metadata.interval
+		start = self._pending_row([f'rsv_{interval}', f'term_line_{interval}'], hjk_spec(metadata))
+		if start >= len(self._store):
+			return False
+
+		window_start = max(0, start - hjk_lookback(metadata))
+		columns = compute_hjk(
+			self._store.values('close_price')[window_start:],
+			self._store.values('low_price')[window_start:],
+			self._store.values('high_price')[window_start:],
+			metadata
+		)
+		self._write_tail(columns, start, start - window_start)
+		return True
+
+	def _update_bollinger(self, bollinger) -> bool:
+		start = self._pending_row(['SMA', 'STD', 'upper_band', 'lower_band'], bollinger_spec(bollinger))
+		if start >= len(self._store):
+			return False
+
+		window_start = max(0, start - bollinger.window + 1)
+		columns = compute_bollinger(self._store.values('close_price')[window_start:], bollinger)
+		self._write_tail(columns, start, start - window_start)
+		return True
+
+	def _update_rsi(self, rsi_metadata) -> bool:
+		window_size = rsi_metadata.window_size
+		start = self._pending_row(['rsi'], rsi_spec(rsi_metadata))
+		if start >= len(self._store):
+			return False
+
+		if start == 0 or self._rsi_state is None or self._rsi_state.window_size != window_size:
+			self._store.reset_column('rsi')
+			start = 0
+			rsi, self._rsi_state = compute_rsi(self._store.values('close_price'), window_size)
+		else:
+			rsi, self._rsi_state = compute_rsi(
+				self._store.values('close_price')[start - 1:], window_size, start, self._rsi_state)
+		self._write_tail({'rsi': rsi}, start, 0)
+		return True
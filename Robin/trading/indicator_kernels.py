@@ -0,0 +1,61 @@
+"""
+Vectorized indicator kernels shared by the strategies and the analysis scripts. Every kernel takes a 1-D array of
+bars or a 2-D array with one row per symbol and time on the last axis, and returns an array of the same shape.
+Rolling windows are NaN until they are fully populated, like pandas rolling().
+"""
+import numpy as np
+import pandas as pd
+
+from typing import Callable
+
+
+def _by_time(values, kernel: Callable) -> np.ndarray:
+	"""
+	Apply a pandas kernel with time along the rows, so 2-D input is computed for all symbols in one call.
+	"""
+	values = np.asarray(values, dtype=np.float64)
+	if values.ndim == 1:
+		return kernel(pd.Series(values)).to_numpy()
+	return kernel(pd.DataFrame(values.T)).to_numpy().T
+
+
+def sma(values, window: int) -> np.ndarray:
+	return _by_time(values, lambda frame: frame.rolling(window).mean())
+
+
+def llv(values, window: int) -> np.ndarray:
+	return _by_time(values, lambda frame: frame.rolling(window).min())
+
+
+def hhv(values, window: int) -> np.ndarray:
+	return _by_time(values, lambda frame: frame.rolling(window).max())
+
+
+def ema(values, window: int) -> np.ndarray:
+	return _by_time(values, lambda frame: frame.ewm(span=window, adjust=False).mean())
+
+
+def wsma(values, window: int, weight: int) -> np.ndarray:
+	"""
+	Weighted moving average y[i] = (weight * x[i] + (window - weight) * y[i - 1]) / window, starting from the mean of
+	the first window values. This is an EWM with alpha = weight / window and the first value replaced by that mean.
+	"""
+	values = np.array(values, dtype=np.float64)
+	if values.shape[-1] == 0:
+		return values
+	values[..., 0] = values[..., :window].mean(axis=-1)
+	return _by_time(values, lambda frame: frame.ewm(alpha=weight / window, adjust=False).mean())
+
+
+def ref(values, period: int) -> np.ndarray:
+	"""
+	Value period bars back. Like np.roll, the first period bars take the last values.
+	"""
+	return np.roll(values, period, axis=-1)
+
+
+def cross(values1, values2) -> np.ndarray:
+	"""
+	Whether values1 crosses above values2 at each bar.
+	"""
+	return (values1 > values2) & (ref(values1, 1) <= ref(values2, 1))
@@ -0,0 +1,93 @@
+import json
+import os
+
+from threading import Lock
+from typing import Dict, List, Optional
+
+from trading.broker import Broker, get_broker
+from util.util import PACKAGE_ROOT, log_info, mkdir
+
+INSTRUMENT_INDEX_PATH = f"{PACKAGE_ROOT}/Data/Instruments/instruments.json"
+
+
+class InstrumentIndex(object):
+	"""
+	InstrumentIndex
+	Symbol of every known instrument id and the other way around, stored on disk across runs. build resolves the
+	traded symbols in one batched call at startup, an instrument seen later is resolved once and added, so position
+	lookups do not wait on the network.
+	@params:
+	path: JSON file the index is stored in
+	broker: broker to resolve instruments with, the one set by set_broker by default
+	"""
+
+	def __init__(self, path: str = INSTRUMENT_INDEX_PATH, broker: Optional[Broker] = None):
+		self._path = path
+		self._broker = broker
+		self._lock = Lock()
+		self._symbols: Dict[str, str] = dict()
+		self._instrument_ids: Dict[str, str] = dict()
+		if os.path.exists(path):
+			with open(path) as f:
+				for instrument_id, symbol in json.load(f).items():
+					self._add(instrument_id, symbol)
+
+	def _add(self, instrument_id: str, symbol: str):
+		self._symbols[instrument_id] = symbol
+		self._instrument_ids[symbol] = instrument_id
+
+	def _persist(self):
+		"""
+		Write the index with the lock held, replacing the previous file at once.
+		"""
+		mkdir(os.path.dirname(self._path))
+		with open(f"{self._path}.tmp", 'w') as f:
+			f.write(json.dumps(self._symbols, indent=4, sort_keys=True))
+		os.replace(f"{self._path}.tmp", self._path)
+
+	def _get_broker(self) -> Broker:
+		return self._broker if self._broker is not None else get_broker()
+
+	def build(self, symbols: List[str]):
+		"""
+		Resolve the symbols not indexed yet in a single call.
+		"""
+		with self._lock:
+			missing_symbols = [symbol for symbol in symbols if symbol not in self._instrument_ids]
+			if not missing_symbols:
+				return
+			for instrument in self._get_broker().get_instruments_by_symbols(missing_symbols):
+				if instrument is not None:
+					self._add(instrument['id'], instrument['symbol'])
+			self._persist()
+		log_info(f"[InstrumentIndex] Indexed {len(missing_symbols)} symbols, {len(self._symbols)} instruments in total.")
+
+	def symbol(self, instrument_id: str, instrument_url: str) -> str:
+		"""
+		Symbol of the instrument, resolved by its URL and added to the index if it is not indexed yet.
+		"""
+		with self._lock:
+			if instrument_id not in self._symbols:
+				self._add(instrument_id, self._get_broker().get_symbol_by_url(instrument_url))
+				self._persist()
+			return self._symbols[instrument_id]
+
+	def instrument_id(self, symbol: str) -> Optional[str]:
+		with self._lock:
+			return self._instrument_ids.get(symbol)
+
+
+_instrument_index: Optional[InstrumentIndex] = None
+
+_instrument_index_lock = Lock()
+
+
+def get_instrument_index() -> InstrumentIndex:
+	"""
+	Index shared by the account state and the trader, loaded from INSTRUMENT_INDEX_PATH.
+	"""
+	global _instrument_index
+	with _instrument_index_lock:
+		if _instrument_index is None:
+			_instrument_index = InstrumentIndex()
+		return _instrument_index
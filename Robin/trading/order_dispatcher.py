@@ -0,0 +1,100 @@
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from trading.base_strategy import Action, ActionMetadata
+from trading.trading_agent import TradingAgent
+from util.util import log_error, log_info
+
+DEFAULT_MAX_WORKERS = 8
+
+# Latencies kept for latency_summary.
+LATENCY_HISTORY = 1000
+
+
+class OrderDispatcher(object):
+	"""
+	OrderDispatcher
+	Submits the orders of one decision round in parallel on a bounded pool, instead of one symbol after the other.
+	TradingAgent reserves the portion of every buy atomically, so concurrent buys never take more portions than the
+	account has. The latency from the signal to the submitted order is recorded for every order.
+	@params:
+	max_workers: orders submitted at once
+	"""
+
+	def __init__(self, max_workers: int = DEFAULT_MAX_WORKERS):
+		self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="OrderDispatcher")
+		self._lock = Lock()
+		# Seconds from the signal to the submitted order, the latest LATENCY_HISTORY orders.
+		self._latencies: List[float] = []
+
+	def _submit(
+		self,
+		trading_agent: TradingAgent,
+		symbol: str,
+		action: ActionMetadata,
+		is_extended_hour: bool,
+		signaled_at: float
+	) -> Optional[float]:
+		try:
+			if action.action == Action.BUY:
+				trading_agent.buy(symbol=symbol, uuid=action.uuid, extended_hour=is_extended_hour)
+			else:
+				trading_agent.clean_positions(symbol=symbol, uuid=action.uuid, extended_hour=is_extended_hour)
+		except Exception as e:
+			log_error(f"Exception when submitting the order for {symbol}.", e)
+			return None
+		latency = time.monotonic() - signaled_at
+		with self._lock:
+			self._latencies.append(latency)
+			del self._latencies[:-LATENCY_HISTORY]
+		return latency
+
+	def dispatch(
+		self,
+		trading_agent: TradingAgent,
+		actions: Dict[str, ActionMetadata],
+		is_extended_hour: bool,
+		signaled_at: Optional[float] = None
+	) -> Dict[str, Optional[float]]:
+		"""
+		Submit the orders of the BUY and SELL actions and wait until all are submitted, not filled. signaled_at is the
+		time.monotonic() of the decision, now by default. Return the signal to order latency in seconds of every
+		submitted order, None for the orders that failed.
+		"""
+		if signaled_at is None:
+			signaled_at = time.monotonic()
+		futures = {
+			symbol: self._executor.submit(
+				self._submit, trading_agent, symbol, action, is_extended_hour, signaled_at)
+			for symbol, action in actions.items() if action.action in (Action.BUY, Action.SELL)
+		}
+		latencies = {symbol: future.result() for symbol, future in futures.items()}
+		submitted = [latency for latency in latencies.values() if latency is not None]
+		if submitted:
+			log_info(f"[OrderDispatcher] Submitted {len(submitted)} of {len(latencies)} orders, the last one "
+					 f"{max(submitted) * 1000:.0f} ms after the signal")
+		return latencies
+
+	def latency_summary(self) -> Dict[str, float]:
+		"""
+		Signal to order latency of the latest orders in milliseconds.
+		"""
+		with self._lock:
+			latencies = np.array(self._latencies) * 1000
+		if len(latencies) == 0:
+			return {'count': 0}
+		return {
+			'count': len(latencies),
+			'mean_ms': float(latencies.mean()),
+			'p50_ms': float(np.percentile(latencies, 50)),
+			'p95_ms': float(np.percentile(latencies, 95)),
+			'max_ms': float(latencies.max()),
+		}
+
+	def shutdown(self):
+		self._executor.shutdown(wait=True)
@@ -0,0 +1,248 @@
+import dataclasses
+import glob
+import json
+import os
+import time
+
+from threading import Event, Lock, Thread
+from typing import BinaryIO, Dict, List, Optional, Tuple
+
+import dateutil.parser
+
+from trading.trading_agent import OrderMetadata
+from util.util import PACKAGE_ROOT, get_yyyymmdd_date, json_serial, log_error, log_info, mkdir
+
+ORDER_JOURNAL_PATH = f"{PACKAGE_ROOT}/Data/OrderJournal"
+
+# One indented JSON file per symbol and date, written before the journal.
+ORDERS_PATH = f"{PACKAGE_ROOT}/Data/Orders"
+
+# Seconds between two writes of the buffered orders.
+FLUSH_INTERVAL = 1
+
+# Seconds between two fsyncs of the journal, the index is written with them.
+FSYNC_INTERVAL = 10
+
+
+def journal_file(directory: str, date: str) -> str:
+	return f"{directory}/orders.{date}.jsonl"
+
+
+def index_file(directory: str, date: str) -> str:
+	return f"{directory}/orders.{date}.index.json"
+
+
+def journal_dates(directory: str = ORDER_JOURNAL_PATH) -> List[str]:
+	return sorted([os.path.basename(path).split('.')[1] for path in glob.glob(journal_file(directory, '*'))])
+
+
+def load_index(directory: str, date: str) -> dict:
+	"""
+	Byte offset of every order of the date by symbol, and the size of the journal covered. Orders appended after the
+	index was written are read from the journal, a last line without its newline is left out.
+	"""
+	index = {'size': 0, 'symbols': dict()}
+	if os.path.exists(index_file(directory, date)):
+		with open(index_file(directory, date)) as f:
+			index = json.load(f)
+	path = journal_file(directory, date)
+	if not os.path.exists(path):
+		return index
+	if os.path.getsize(path) < index['size']:
+		# The index is from another journal.
+		index = {'size': 0, 'symbols': dict()}
+	with open(path, 'rb') as f:
+		f.seek(index['size'])
+		for line in f:
+			if not line.endswith(b'\n'):
+				break
+			index['symbols'].setdefault(json.loads(line)['stock'], []).append(index['size'])
+			index['size'] += len(line)
+	return index
+
+
+def write_index(directory: str, date: str, index: dict):
+	with open(f"{index_file(directory, date)}.tmp", 'w') as f:
+		f.write(json.dumps(index))
+	os.replace(f"{index_file(directory, date)}.tmp", index_file(directory, date))
+
+
+def parse_order(record: dict) -> OrderMetadata:
+	order = OrderMetadata(**record)
+	order.time = dateutil.parser.parse(order.time)
+	return order
+
+
+def read_orders(
+	directory: str = ORDER_JOURNAL_PATH,
+	dates: Optional[List[str]] = None,
+	symbols: Optional[List[str]] = None
+) -> List[OrderMetadata]:
+	"""
+	Orders of the dates, all journaled dates by default, in the order they were journaled. With symbols, only the
+	orders of the symbols are read, found by the index.
+	"""
+	orders = []
+	for date in dates if dates is not None else journal_dates(directory):
+		if not os.path.exists(journal_file(directory, date)):
+			continue
+		index = load_index(directory, date)
+		with open(journal_file(directory, date), 'rb') as f:
+			if symbols is None:
+				lines = f.read(index['size']).splitlines()
+			else:
+				lines = []
+				for offset in sorted([offset for symbol in symbols for offset in index['symbols'].get(symbol, [])]):
+					f.seek(offset)
+					lines.append(f.readline())
+		orders.extend([parse_order(json.loads(line)) for line in lines])
+	return orders
+
+
+class OrderJournal(Thread):
+	"""
+	OrderJournal
+	Append-only journal of the completed orders, one JSON line per order in a file per date. append only buffers the
+	order, the buffered orders are written every flush_interval seconds in the background and fsynced every
+	fsync_interval seconds together with the index of the orders by symbol. Used as a context manager, the journal is
+	started on entering and closed on leaving.
+	@params:
+	directory: directory of the journal files
+	flush_interval: seconds between two writes
+	fsync_interval: seconds between two fsyncs
+	"""
+
+	def __init__(
+		self,
+		directory: str = ORDER_JOURNAL_PATH,
+		flush_interval: float = FLUSH_INTERVAL,
+		fsync_interval: float = FSYNC_INTERVAL
+	):
+		super().__init__(daemon=True)
+		self._directory = directory
+		self._flush_interval = flush_interval
+		self._fsync_interval = fsync_interval
+		self._lock = Lock()
+		# Serializes the writes of the journal thread and close.
+		self._flush_lock = Lock()
+		self._pending: List[Tuple[str, str, bytes]] = []
+		self._files: Dict[str, BinaryIO] = dict()
+		self._indexes: Dict[str, dict] = dict()
+		self._synced_at = time.monotonic()
+		self._wake = Event()
+		self._running = True
+
+	def __enter__(self) -> 'OrderJournal':
+		self.start()
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
+
+	def append(self, order: Optional[OrderMetadata]):
+		if order is None:
+			return
+		line = json.dumps(dataclasses.asdict(order), default=json_serial).encode() + b'\n'
+		with self._lock:
+			self._pending.append((get_yyyymmdd_date(), order.stock, line))
+
+	def _open(self, date: str) -> BinaryIO:
+		if date not in self._files:
+			mkdir(self._directory)
+			index = load_index(self._directory, date)
+			f = open(journal_file(self._directory, date), 'ab')
+			# Drop a last line left without its newline.
+			f.truncate(index['size'])
+			self._files[date] = f
+			self._indexes[date] = index
+		return self._files[date]
+
+	def flush(self, fsync: bool = False):
+		"""
+		Write the buffered orders, and fsync the journal and write the index if fsync is set or it is time to.
+		"""
+		with self._flush_lock:
+			with self._lock:
+				pending, self._pending = self._pending, []
+			for date, symbol, line in pending:
+				f = self._open(date)
+				index = self._indexes[date]
+				index['symbols'].setdefault(symbol, []).append(index['size'])
+				f.write(line)
+				index['size'] += len(line)
+			for f in self._files.values():
+				f.flush()
+			if pending:
+				log_info(f"[OrderJournal] Wrote {len(pending)} orders.")
+			if fsync or time.monotonic() - self._synced_at >= self._fsync_interval:
+				self._sync()
+
+	def _sync(self):
+		"""
+		fsync the journal before writing the index, so the index never covers orders lost in a crash.
+		"""
+		today = get_yyyymmdd_date()
+		for date in list(self._files):
+			os.fsync(self._files[date].fileno())
+			write_index(self._directory, date, self._indexes[date])
+			if date != today:
+				self._files.pop(date).close()
+				self._indexes.pop(date)
+		self._synced_at = time.monotonic()
+
+	def run(self):
+		while self._running:
+			self._wake.wait(self._flush_interval)
+			try:
+				self.flush()
+			except Exception as e:
+				log_error(f"[OrderJournal] Error when writing the orders.", e)
+
+	def close(self):
+		"""
+		Stop the journal thread, then write and fsync the buffered orders.
+		"""
+		self._running = False
+		self._wake.set()
+		if self.is_alive():
+			self.join()
+		self.flush(fsync=True)
+		with self._flush_lock:
+			for f in self._files.values():
+				f.close()
+			self._files = dict()
+			self._indexes = dict()
+
+
+def convert_order_files(orders_path: str = ORDERS_PATH, directory: str = ORDER_JOURNAL_PATH) -> int:
+	"""
+	Journal the orders of the {symbol}.{date}.json files, the orders of a date sorted by time. Dates already in the
+	journal are skipped, the JSON files are left in place. Return the number of orders journaled.
+	"""
+	records_by_date: Dict[str, List[dict]] = dict()
+	for path in glob.glob(f"{orders_path}/*.json"):
+		date = os.path.basename(path).rsplit('.', 2)[1]
+		with open(path) as f:
+			records_by_date.setdefault(date, []).extend(json.load(f))
+
+	mkdir(directory)
+	converted = 0
+	for date in sorted(records_by_date):
+		if os.path.exists(journal_file(directory, date)):
+			log_info(f"[OrderJournal] Orders of {date} already journaled, skip converting.")
+			continue
+		records = sorted(records_by_date[date], key=lambda record: dateutil.parser.parse(record['time']))
+		index = {'size': 0, 'symbols': dict()}
+		with open(f"{journal_file(directory, date)}.tmp", 'wb') as f:
+			for record in records:
+				line = json.dumps(record).encode() + b'\n'
+				index['symbols'].setdefault(record['stock'], []).append(index['size'])
+				f.write(line)
+				index['size'] += len(line)
+			f.flush()
+			os.fsync(f.fileno())
+		os.replace(f"{journal_file(directory, date)}.tmp", journal_file(directory, date))
+		write_index(directory, date, index)
+		converted += len(records)
+	log_info(f"[OrderJournal] Journaled {converted} orders from {orders_path}.")
+	return converted
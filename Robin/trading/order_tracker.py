@@ -0,0 +1,173 @@
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from threading import Condition, Lock, Thread
+from typing import Callable, Dict, Optional
+
+from trading.account_state import get_account_state
+from trading.broker import Broker, get_broker
+from util.util import get_datetime, log_error, log_info, real_seconds, sleep
+
+POLL_INTERVAL = 0.5
+
+CANCELLED_STATES = {'cancelled', 'rejected', 'failed'}
+
+# Clock seconds an order is left open before it is cancelled, unless tracked with a cancel_after of its own.
+DEFAULT_CANCEL_AFTER = 300
+
+# Clock seconds a cancelled order may stay open before it is given up on and reported by on_cancel.
+CANCEL_GRACE = 60
+
+# Clock seconds between two logs of an order still open.
+OPEN_ORDER_LOG_INTERVAL = 60
+
+
+@dataclass
+class OrderFill:
+	order_id: str
+	symbol: str
+	side: str
+	state: str
+	# Filled so far.
+	quantity: float
+	average_price: float
+
+
+@dataclass
+class TrackedOrder:
+	order_id: str
+	symbol: str
+	side: str
+	submitted_at: datetime
+	cancel_after: timedelta
+	on_fill: Callable[[OrderFill], None]
+	on_cancel: Callable[[OrderFill], None]
+	on_partial_fill: Optional[Callable[[OrderFill], None]]
+	filled_quantity: float = 0
+	cancel_requested_at: Optional[datetime] = None
+	logged_at: Optional[datetime] = None
+
+
+class OrderTracker(Thread):
+	"""
+	OrderTracker
+	Follows the submitted orders by their id in the background and calls back when an order fills, partially fills or
+	is cancelled, rejected or failed, so the trading loop never waits on a fill. Every order not filled within its
+	cancel_after is cancelled, a partial fill is then reported by on_cancel with the filled quantity. An order still
+	open CANCEL_GRACE seconds after its cancel is no longer followed and reported by on_cancel as it stands.
+	@params:
+	poll_interval: clock seconds between two polls of the tracked orders
+	broker: broker to poll, the one set by set_broker by default
+	"""
+
+	def __init__(self, poll_interval: float = POLL_INTERVAL, broker: Optional[Broker] = None):
+		super().__init__(daemon=True)
+		self._poll_interval = poll_interval
+		self._broker = broker
+		self._orders: Dict[str, TrackedOrder] = dict()
+		self._lock = Lock()
+		self._idle = Condition(self._lock)
+		self._running = True
+
+	def _get_broker(self) -> Broker:
+		return self._broker if self._broker is not None else get_broker()
+
+	def track(
+		self,
+		order_id: str,
+		symbol: str,
+		side: str,
+		on_fill: Callable[[OrderFill], None],
+		on_cancel: Callable[[OrderFill], None],
+		on_partial_fill: Optional[Callable[[OrderFill], None]] = None,
+		cancel_after: float = DEFAULT_CANCEL_AFTER
+	):
+		"""
+		Follow an order, cancel_after in clock seconds. The callbacks run on the tracker thread.
+		"""
+		with self._lock:
+			self._orders[order_id] = TrackedOrder(
+				order_id=order_id,
+				symbol=symbol,
+				side=side,
+				submitted_at=get_datetime(),
+				cancel_after=timedelta(seconds=cancel_after),
+				on_fill=on_fill,
+				on_cancel=on_cancel,
+				on_partial_fill=on_partial_fill
+			)
+
+	def pending(self) -> int:
+		with self._lock:
+			return len(self._orders)
+
+	def wait_until_idle(self, timeout: Optional[float] = None) -> bool:
+		"""
+		Block until every tracked order is resolved or timeout clock seconds passed, return whether all are resolved.
+		"""
+		with self._idle:
+			return self._idle.wait_for(
+				lambda: len(self._orders) == 0, real_seconds(timeout) if timeout is not None else None)
+
+	def run(self):
+		while self._running:
+			with self._lock:
+				orders = list(self._orders.values())
+			for order in orders:
+				try:
+					self._poll(order)
+				except Exception as e:
+					log_error(f"[OrderTracker] Error when polling order {order.order_id} of {order.symbol}.", e)
+			sleep(self._poll_interval)
+
+	def _poll(self, order: TrackedOrder):
+		info = self._get_broker().get_stock_order_info(order.order_id)
+		state = info.get('state')
+		quantity = float(info.get('cumulative_quantity') or 0)
+		average_price = float(info.get('average_price') or 0)
+		fill = OrderFill(
+			order_id=order.order_id,
+			symbol=order.symbol,
+			side=order.side,
+			state=state,
+			quantity=quantity,
+			average_price=average_price
+		)
+		if quantity > order.filled_quantity or state == 'filled' or state in CANCELLED_STATES:
+			get_account_state().invalidate()
+
+		if state == 'filled':
+			self._resolve(order, order.on_fill, fill)
+		elif state in CANCELLED_STATES:
+			log_info(f"[OrderTracker] Order {order.order_id} of {order.symbol} {state}, {quantity} shares filled")
+			self._resolve(order, order.on_cancel, fill)
+		else:
+			if quantity > order.filled_quantity:
+				order.filled_quantity = quantity
+				if order.on_partial_fill is not None:
+					order.on_partial_fill(fill)
+			now = get_datetime()
+			if now - (order.logged_at or order.submitted_at) >= timedelta(seconds=OPEN_ORDER_LOG_INTERVAL):
+				log_info(f"[OrderTracker] Order {order.order_id} of {order.symbol} still {state} after "
+						 f"{(now - order.submitted_at).total_seconds():.0f} seconds, {quantity} shares filled")
+				order.logged_at = now
+			if order.cancel_requested_at is not None:
+				if now - order.cancel_requested_at >= timedelta(seconds=CANCEL_GRACE):
+					log_info(f"[OrderTracker] Order {order.order_id} of {order.symbol} still {state} {CANCEL_GRACE} "
+							 f"seconds after its cancel, stop following it")
+					get_account_state().invalidate()
+					self._resolve(order, order.on_cancel, fill)
+			elif now - order.submitted_at >= order.cancel_after:
+				log_info(f"[OrderTracker] Order {order.order_id} of {order.symbol} not filled in time, cancel the order")
+				order.cancel_requested_at = now
+				self._get_broker().cancel_stock_order(order.order_id)
+
+	def _resolve(self, order: TrackedOrder, callback: Callable[[OrderFill], None], fill: OrderFill):
+		try:
+			callback(fill)
+		finally:
+			with self._idle:
+				self._orders.pop(order.order_id, None)
+				self._idle.notify_all()
+
+	def stop(self):
+		self._running = False
@@ -0,0 +1,222 @@
+import dataclasses
+import itertools
+import json
+import math
+import os
+
+import numpy as np
+import pandas as pd
+
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, List, Optional, Tuple
+
+from trading.backtester import BacktestCollector, Backtester, SimulatedTradingAgent
+from trading.bar_archive import BAR_DTYPE
+from trading.indicator_engine import indicator_specs
+from trading.strategies.alpha_strategy import AlphaParameters, AlphaStrategy, DEFAULT_PARAMETERS
+from util.util import PACKAGE_ROOT, get_yyyymmdd_hhmmss_time, json_serial, log_info, mkdir
+
+SWEEP_ROOT = f"{PACKAGE_ROOT}/Data/Sweeps"
+
+SWEEP_DTYPE = np.dtype(BAR_DTYPE.descr + [('bar_id', '<i8')])
+
+# Grid points are split into about this many tasks per worker, so a slow task does not leave the other cores idle.
+TASKS_PER_WORKER = 4
+
+# The look-ahead check recomputes the signals, one sample per grid point keeps the sweep close to the fill cost.
+SWEEP_LOOK_AHEAD_SAMPLES = 1
+
+
+@dataclass
+class SweepResult:
+	parameters: AlphaParameters
+	pnl: float
+	pnl_percentage: float
+	max_drawdown: float
+	max_drawdown_percentage: float
+	orders: int
+
+
+def parameter_grid(base: AlphaParameters = DEFAULT_PARAMETERS, **choices: List) -> List[AlphaParameters]:
+	"""
+	Every combination of the given AlphaParameters field values, the other fields taken from base.
+	"""
+	names = list(choices)
+	return [
+		dataclasses.replace(base, **dict(zip(names, values))) for values in itertools.product(*choices.values())
+	]
+
+
+class SharedBars(object):
+	"""
+	SharedBars
+	Bars of all symbols in a single shared memory block, as SWEEP_DTYPE records of one symbol after another, so
+	worker processes read them in place instead of receiving pickled copies. The process creating the block owns
+	it and unlinks it once the workers are done.
+	@params:
+	name: name of the shared memory block
+	ranges: first and last record (exclusive) of every symbol
+	"""
+
+	def __init__(self, name: str, ranges: Dict[str, Tuple[int, int]], _shared_memory: Optional[SharedMemory] = None):
+		self._shared_memory = _shared_memory if _shared_memory is not None else SharedMemory(name=name)
+		self._ranges = ranges
+		length = max([end for _, end in ranges.values()], default=0)
+		self._records = np.ndarray((length,), dtype=SWEEP_DTYPE, buffer=self._shared_memory.buf)
+
+	@staticmethod
+	def create(bars: Dict[str, Dict[str, object]]) -> 'SharedBars':
+		ranges = dict()
+		length = 0
+		for symbol, columns in bars.items():
+			ranges[symbol] = (length, length + len(columns['bar_id']))
+			length += len(columns['bar_id'])
+		shared_memory = SharedMemory(create=True, size=max(1, length * SWEEP_DTYPE.itemsize))
+		shared_bars = SharedBars(shared_memory.name, ranges, shared_memory)
+		for symbol, columns in bars.items():
+			records = shared_bars.records(symbol)
+			for name in SWEEP_DTYPE.names:
+				records[name] = columns['begins_at'].asi8 if name == 'begins_at' else np.asarray(columns[name])
+		return shared_bars
+
+	@property
+	def name(self) -> str:
+		return self._shared_memory.name
+
+	@property
+	def ranges(self) -> Dict[str, Tuple[int, int]]:
+		return self._ranges
+
+	def symbols(self) -> List[str]:
+		return list(self._ranges)
+
+	def records(self, symbol: str) -> np.ndarray:
+		start, end = self._ranges[symbol]
+		return self._records[start:end]
+
+	def close(self):
+		self._records = None
+		self._shared_memory.close()
+
+	def unlink(self):
+		self._shared_memory.unlink()
+
+
+class SweepWorker(object):
+	"""
+	SweepWorker
+	Backtests grid points over SharedBars in a worker process. The bars are served by a BacktestCollector reading
+	the shared records in place, its indicator cache is shared by all grid points the worker runs.
+	@params:
+	bars: bars of the symbols to trade
+	times: evaluation times of the backtest
+	"""
+
+	def __init__(self, bars: SharedBars, times: List[datetime]):
+		self._bars = bars
+		self._times = times
+		columns = dict()
+		for symbol in bars.symbols():
+			records = bars.records(symbol)
+			columns[symbol] = {name: records[name] for name in SWEEP_DTYPE.names}
+			columns[symbol]['begins_at'] = pd.to_datetime(records['begins_at'], utc=True).array
+		self._collector = BacktestCollector(columns)
+
+	def run(self, parameters: AlphaParameters) -> SweepResult:
+		symbols = self._bars.symbols()
+		agent = SimulatedTradingAgent(symbols)
+		strategy = AlphaStrategy(self._collector, agent, parameters)
+		start_value = agent.get_cash_position()
+		net_value = start_value
+		max_drawdown = 0.0
+		max_drawdown_percentage = 0.0
+		peak = start_value
+
+		def on_step(_: datetime, prices: Dict[str, float]):
+			nonlocal net_value, max_drawdown, max_drawdown_percentage, peak
+			net_value = agent.net_value(prices)
+			peak = max(peak, net_value)
+			max_drawdown = max(max_drawdown, peak - net_value)
+			max_drawdown_percentage = max(max_drawdown_percentage, (peak - net_value) / peak * 100)
+
+		orders = Backtester(strategy, agent, SWEEP_LOOK_AHEAD_SAMPLES).run(symbols, self._times, on_step)
+		return SweepResult(
+			parameters=parameters,
+			pnl=round(net_value - start_value, 2),
+			pnl_percentage=round((net_value - start_value) / start_value * 100, 4),
+			max_drawdown=round(max_drawdown, 2),
+			max_drawdown_percentage=round(max_drawdown_percentage, 4),
+			orders=len(orders)
+		)
+
+
+# The SweepWorker of a worker process, created by the pool initializer.
+_worker: Optional[SweepWorker] = None
+
+
+def _init_worker(name: str, ranges: Dict[str, Tuple[int, int]], times: List[datetime]):
+	global _worker
+	_worker = SweepWorker(SharedBars(name, ranges), times)
+
+
+def _run_points(points: List[AlphaParameters]) -> List[SweepResult]:
+	return [_worker.run(parameters) for parameters in points]
+
+
+class ParameterSweep(object):
+	"""
+	ParameterSweep
+	Backtests AlphaStrategy for every point of a parameter grid on a process pool. The bars are placed in shared
+	memory once and read in place by the workers. Grid points with the same indicator parameters are sent to a
+	worker together so its indicator cache is reused, and the results are ranked by PnL, then by drawdown.
+	@params:
+	bars: columns of every symbol in the layout of backtester.load_bars
+	max_workers: number of worker processes, all cores by default
+	"""
+
+	def __init__(self, bars: Dict[str, Dict[str, object]], max_workers: Optional[int] = None):
+		self._bars = bars
+		self._max_workers = max_workers if max_workers is not None else os.cpu_count() or 1
+
+	def _tasks(self, grid: List[AlphaParameters]) -> List[List[AlphaParameters]]:
+		by_indicators: Dict[Tuple, List[AlphaParameters]] = defaultdict(list)
+		for parameters in grid:
+			by_indicators[tuple(indicator_specs(
+				parameters.hjk_metadata_list, parameters.bollinger, parameters.rsi_metadata))].append(parameters)
+		task_size = max(1, math.ceil(len(grid) / (self._max_workers * TASKS_PER_WORKER)))
+		return [
+			points[i:i + task_size] for points in by_indicators.values() for i in range(0, len(points), task_size)
+		]
+
+	def run(self, grid: List[AlphaParameters], times: List[datetime]) -> List[SweepResult]:
+		log_info(f"[ParameterSweep] Backtesting {len(grid)} grid points over {len(self._bars)} stocks and "
+				 f"{len(times)} steps on {self._max_workers} processes")
+		shared_bars = SharedBars.create(self._bars)
+		try:
+			with ProcessPoolExecutor(
+				max_workers=self._max_workers,
+				initializer=_init_worker,
+				initargs=(shared_bars.name, shared_bars.ranges, times)
+			) as executor:
+				results = [result for results in executor.map(_run_points, self._tasks(grid)) for result in results]
+		finally:
+			shared_bars.close()
+			shared_bars.unlink()
+		return sorted(results, key=lambda result: (-result.pnl, result.max_drawdown))
+
+
+def write_report(results: List[SweepResult], time: Optional[datetime] = None) -> str:
+	"""
+	Write the ranked results to {SWEEP_ROOT}/sweep.{yyyymmdd-hhmmss}.json and return the file name.
+	"""
+	mkdir(SWEEP_ROOT)
+	output_file = f"{SWEEP_ROOT}/sweep.{get_yyyymmdd_hhmmss_time(time)}.json"
+	report = [{'rank': rank + 1, **dataclasses.asdict(result)} for rank, result in enumerate(results)]
+	log_info(f"Writing parameter sweep report to: {output_file}...")
+	with open(output_file, 'w') as outfile:
+		outfile.write(json.dumps(report, default=json_serial, indent=4))
+	return output_file
@@ -0,0 +1,108 @@
+from datetime import datetime, timedelta
+from threading import Lock
+from typing import Dict, List, Optional
+
+from trading.broker import Broker, get_broker
+from trading.fetch_scheduler import FetchScheduler, get_default_fetch_scheduler
+from util.util import get_datetime
+
+DEFAULT_MAX_STALENESS = 2
+
+
+class QuoteCache(object):
+	"""
+	QuoteCache
+	Latest prices of the watched symbols, all refreshed together in batched calls and shared by the TradeExecutors,
+	the TradingAgent and its snapshots. Quotes are served until they are max_staleness seconds old, a symbol read
+	before it is watched is added to the watched symbols.
+	@params:
+	max_staleness: clock seconds quotes are served
+	broker: broker serving the quotes, the one set by set_broker by default
+	fetch_scheduler: scheduler batching the quote requests, the shared one by default
+	"""
+
+	def __init__(
+		self,
+		max_staleness: float = DEFAULT_MAX_STALENESS,
+		broker: Optional[Broker] = None,
+		fetch_scheduler: Optional[FetchScheduler] = None
+	):
+		self._max_staleness = timedelta(seconds=max_staleness)
+		self._broker = broker
+		self._fetch_scheduler = fetch_scheduler if fetch_scheduler is not None else get_default_fetch_scheduler()
+		self._lock = Lock()
+		self._symbols: List[str] = []
+		self._fetched_at: Optional[datetime] = None
+		self._fetched_from: Optional[Broker] = None
+		self._prices: Dict[str, Optional[float]] = dict()
+
+	def watch(self, symbols: List[str]):
+		"""
+		Refresh the symbols with the others from now on.
+		"""
+		with self._lock:
+			for symbol in symbols:
+				if symbol not in self._prices and symbol not in self._symbols:
+					self._symbols.append(symbol)
+					self._fetched_at = None
+
+	def invalidate(self):
+		with self._lock:
+			self._fetched_at = None
+
+	def _refresh(self, symbols: List[str]):
+		"""
+		Fetch the quotes of every watched symbol if they are too old or some of the symbols are missing, with the
+		lock held.
+		"""
+		now = get_datetime()
+		broker = self._broker if self._broker is not None else get_broker()
+		for symbol in symbols:
+			if symbol not in self._symbols:
+				self._symbols.append(symbol)
+				self._fetched_at = None
+		if broker is not self._fetched_from:
+			# Another account since set_broker.
+			self._fetched_at = None
+		if self._fetched_at is not None and now - self._fetched_at <= self._max_staleness:
+			return
+		results = self._fetch_scheduler.map_batches(
+			lambda batch: self._fetch_scheduler.call(broker.get_quotes, batch),
+			self._symbols
+		)
+		if any([batch_quotes is None for batch_quotes in results]):
+			raise Exception("[QuoteCache] Failed to fetch the quotes.")
+		# Quotes of unknown or failed tickers are left out, a symbol without a quote has no price.
+		prices: Dict[str, Optional[float]] = {symbol: None for symbol in self._symbols}
+		for quote in [quote for batch_quotes in results for quote in batch_quotes if quote is not None]:
+			price = quote['last_extended_hours_trade_price'] or quote['last_trade_price']
+			prices[quote['symbol']] = float(price) if price is not None else None
+		self._prices = prices
+		self._fetched_at = now
+		self._fetched_from = broker
+
+	def price(self, symbol: str) -> Optional[float]:
+		with self._lock:
+			self._refresh([symbol])
+			return self._prices.get(symbol)
+
+	def prices(self, symbols: List[str]) -> Dict[str, Optional[float]]:
+		with self._lock:
+			self._refresh(symbols)
+			return {symbol: self._prices.get(symbol) for symbol in symbols}
+
+
+_quote_cache: Optional[QuoteCache] = None
+
+_quote_cache_lock = Lock()
+
+
+def get_quote_cache() -> QuoteCache:
+	"""
+	Quote cache shared by the TradeExecutors, the TradingAgent and the trader.
+	"""
+	global _quote_cache
+	with _quote_cache_lock:
+		if _quote_cache is None:
+			_quote_cache = QuoteCache()
+		return _quote_cache
@@ -1,16 +1,41 @@
 import datetime
-import time
-import uuid
 import pandas as pd
-import ta
 
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Mapping, Set
 from dataclasses import dataclass
-from collections import defaultdict
-from threading import Thread
-from robin_stocks.robinhood import stocks as robin_stocks
+from threading import Condition, Thread
 
-from util.util import log_info, log_error, login
+from trading.bar_aggregator import BASE_RESOLUTION, RESOLUTION_LENGTHS, BarAggregator
+from trading.bar_archive import ARCHIVE_TIMEZONE, BarArchive
+from trading.bar_ids import make_bar_ids
+from trading.bar_store import BarSnapshot, BarStore, DEFAULT_RETENTION
+from trading.broker import Broker, get_broker
+from trading.fetch_scheduler import FetchScheduler, get_default_fetch_scheduler
+from trading.historicals_parser import parse_historicals, select_rows, concat_rows
+from trading.indicator_engine import IndicatorEngine, compute_indicators, indicator_specs
+from util.util import get_datetime, log_info, log_error, real_seconds, sleep
+
+# Days of regular session bars loaded before the current day, fetched by a cold start and read from the archive by a
+# warm start.
+LOOKBACK = datetime.timedelta(days=3)
+
+BAR_LENGTH = datetime.timedelta(minutes=5)
+
+# Clock seconds after a 5-minute bar closes before it is fetched, the time Robinhood takes to publish it.
+BAR_SETTLE_DELAY = 2
+
+# While the bar of the last close is missing, it is fetched again every BAR_RETRY_INTERVAL clock seconds, until
+# BAR_RETRY_WINDOW seconds after the close. A bar published later comes with the next close.
+BAR_RETRY_INTERVAL = 5
+
+BAR_RETRY_WINDOW = 30
+
+DELTA_SPANS = [
+	('week', datetime.timedelta(days=7)),
+	('month', datetime.timedelta(days=30)),
+	('3month', datetime.timedelta(days=90)),
+	('year', datetime.timedelta(days=365)),
+]
 
 
 @dataclass
@@ -33,14 +58,40 @@ class RSIMetadata:
 
 
 class StockHistoricalCollector(Thread):
-	def __init__(self, symbols):
+	def __init__(
+		self,
+		symbols,
+		retention: int = DEFAULT_RETENTION,
+		fetch_scheduler: Optional[FetchScheduler] = None,
+		archive: Optional[BarArchive] = None,
+		resolutions: Optional[List[str]] = None,
+		broker: Optional[Broker] = None
+	):
 		super().__init__()
 		log_info(f"[StockHistoricalCollector] Collecting stock historical information for: {', '.join(symbols)}.")
 		self._symbols = symbols
 		self._interval = '5minute'
 		self._period = 'day'
-		self._sleep_interval = 60
-		self._stock_info: Dict[str, pd.DataFrame] = dict()
+		self._retention = retention
+		self._fetch_scheduler = fetch_scheduler if fetch_scheduler is not None else get_default_fetch_scheduler()
+		self._broker = broker if broker is not None else get_broker()
+		self._archive = archive if archive is not None else BarArchive()
+		self._resolutions = [BASE_RESOLUTION] + list(resolutions if resolutions is not None else RESOLUTION_LENGTHS)
+		self._stock_info: Dict[str, BarStore] = dict()
+		# Bars of the coarser resolutions, derived from the 5-minute bars without any extra request.
+		self._aggregators: Dict[str, Dict[str, BarAggregator]] = dict()
+		# Keyed by resolution, then symbol.
+		self._indicator_engines: Dict[str, Dict[str, IndicatorEngine]] = {
+			resolution: dict() for resolution in self._resolutions
+		}
+		# Written by the collector thread only, readers take the current snapshot with a single dict lookup.
+		self._snapshots: Dict[str, Dict[str, BarSnapshot]] = {resolution: dict() for resolution in self._resolutions}
+		self._derived_snapshots: Dict[str, Dict[str, BarSnapshot]] = {
+			resolution: dict() for resolution in self._resolutions
+		}
+		# Symbols with new 5-minute bars not yet taken by wait_for_new_bars.
+		self._new_bars = Condition()
+		self._new_bar_symbols: Set[str] = set()
 		self._collect_stock_info(self._period)
 		self._running = True
 
@@ -49,62 +100,184 @@ class StockHistoricalCollector(Thread):
 	Span: 'day', 'week', 'month', '3month', 'year', or '5year'. 
 	"""
 
-	def _collect_stock_info(self, span: str) -> Dict[str, pd.DataFrame]:
-		additional_historical_info = robin_stocks.get_stock_historicals(
-			self._symbols,
-			interval=self._interval,
-			span="week",
-			bounds="regular"
-		)
+	def _collect_stock_info(self, span: str):
+		"""
+		Fetch the full lookback for symbols without stored or archived bars, and only the bars after the last stored
+		begins_at for the others.
+		"""
+		missing_symbols = [symbol for symbol in self._symbols if symbol not in self._stock_info]
+		if missing_symbols:
+			self._load_archive(missing_symbols)
+		collected_symbols = [symbol for symbol in self._symbols if symbol in self._stock_info]
+		missing_symbols = [symbol for symbol in self._symbols if symbol not in self._stock_info]
+		if missing_symbols:
+			self._collect_lookback(missing_symbols, span)
+		if collected_symbols:
+			self._collect_latest(collected_symbols)
+		new_bar_symbols = [symbol for symbol in self._stock_info if self._publish(symbol)]
+		if new_bar_symbols:
+			with self._new_bars:
+				self._new_bar_symbols.update(new_bar_symbols)
+				self._new_bars.notify_all()
+
+	def _publish(self, symbol: str) -> bool:
+		"""
+		Bring the registered indicators of every resolution up to date and publish a new snapshot if anything changed.
+		Return whether the symbol got a new 5-minute bar.
+		"""
+		base_snapshot = self._snapshots[BASE_RESOLUTION].get(symbol)
+		new_bar = base_snapshot is None or base_snapshot.last('bar_id') != self._stock_info[symbol].last('bar_id')
+		for resolution in self._resolutions:
+			store = self._get_store(symbol, resolution)
+			indicator_engine = self._indicator_engines[resolution][symbol]
+			updated = indicator_engine.refresh()
+			snapshot = self._snapshots[resolution].get(symbol)
+			if snapshot is None or updated or snapshot.start_seq != store.start_seq or len(snapshot) != len(store):
+				version = snapshot.version + 1 if snapshot is not None else 1
+				self._snapshots[resolution][symbol] = store.snapshot(version, indicator_engine.computed_specs())
+		return new_bar
 
-		historical_info = robin_stocks.get_stock_historicals(
-			self._symbols,
+	def _get_store(self, symbol: str, resolution: str) -> BarStore:
+		if resolution == BASE_RESOLUTION:
+			return self._stock_info[symbol]
+		return self._aggregators[symbol][resolution].store
+
+	def _load_archive(self, symbols: List[str]):
+		"""
+		Warm start from the archived bars a cold start fetches: every bar of the current day and the regular session
+		bars of the LOOKBACK before it, without the pre and after hours bars archived on the previous days.
+		"""
+		today = pd.Timestamp(get_datetime()).tz_convert(ARCHIVE_TIMEZONE).normalize()
+		for symbol in symbols:
+			columns = self._archive.load(symbol, today - LOOKBACK)
+			if columns is not None:
+				columns = select_rows(columns, columns['regular'] | (columns['begins_at'] >= today))
+			if columns is not None and len(columns['begins_at']) > 0:
+				log_info(
+					f"[StockHistoricalCollector] Loaded {len(columns['begins_at'])} archived bars for stock {symbol} "
+					f"up to {columns['begins_at'][-1]}..."
+				)
+				self._append_bars(symbol, columns, archive=False)
+
+	def _collect_lookback(self, symbols: List[str], span: str):
+		results = self._fetch_scheduler.map_batches(lambda batch: self._fetch_lookback(batch, span), symbols)
+		for stock_info in results:
+			for symbol in stock_info:
+				self._append_bars(symbol, stock_info[symbol])
+
+	def _get_historicals(self, symbols: List[str], span: str, bounds: str) -> List[Optional[dict]]:
+		"""
+		Make a rate-limited historicals request, robin_stocks answers [None] to a request it rejects.
+		"""
+		historical_info = self._fetch_scheduler.call(
+			self._broker.get_stock_historicals,
+			symbols,
 			interval=self._interval,
 			span=span,
-			bounds="extended"
+			bounds=bounds
 		)
+		if historical_info is None or historical_info == [None]:
+			raise Exception(
+				f"[StockHistoricalCollector] Historicals request rejected, interval: {self._interval}, span: {span}, "
+				f"bounds: {bounds}, symbols: {', '.join(symbols)}"
+			)
+		return historical_info
+
+	def _fetch_lookback(self, symbols: List[str], span: str) -> Dict[str, Dict[str, object]]:
+		additional_historical_info = self._get_historicals(symbols, span="week", bounds="regular")
+		historical_info = self._get_historicals(symbols, span=span, bounds="extended")
+
+		stock_info = parse_historicals(historical_info)
+		additional_stock_info = parse_historicals(additional_historical_info)
+		for symbol in stock_info:
+			if symbol not in additional_stock_info:
+				continue
+			latest_begins_at = stock_info[symbol]['begins_at'][0]
+			additional_info = additional_stock_info[symbol]
+			lookback_rows = (additional_info['begins_at'] < latest_begins_at) & (
+				additional_info['begins_at'] > latest_begins_at - LOOKBACK)
+			stock_info[symbol] = concat_rows(select_rows(additional_info, lookback_rows), stock_info[symbol])
+		return stock_info
+
+	def _collect_latest(self, symbols: List[str]):
+		last_begins_at = {symbol: self._stock_info[symbol].last('begins_at') for symbol in symbols}
+		span = self._delta_span(min(last_begins_at.values()))
+		# begins_at is an ISO-8601 UTC string, comparing the strings drops the known bars before parsing them.
+		last_keys = {symbol: last_begins_at[symbol].strftime('%Y-%m-%dT%H:%M:%SZ') for symbol in symbols}
+		results = self._fetch_scheduler.map_batches(lambda batch: self._fetch_latest(batch, span, last_keys), symbols)
+		for stock_info in results:
+			for symbol in stock_info:
+				log_info(
+					f"[StockHistoricalCollector] "
+					f"Appending {len(stock_info[symbol]['begins_at'])} bars for stock {symbol} "
+					f"up to {stock_info[symbol]['begins_at'][-1]}..."
+				)
+				self._append_bars(symbol, stock_info[symbol])
+
+	def _fetch_latest(
+		self,
+		symbols: List[str],
+		span: str,
+		last_keys: Dict[str, str]
+	) -> Dict[str, Dict[str, object]]:
+		"""
+		Bars after the last stored ones. Extended bounds only come with the 'day' span, so when the last stored bar is
+		from an earlier day the bars before the latest session are filled from a regular bounds request, like the
+		lookback: the pre and after hours bars of the gap are skipped.
+		"""
+		historical_info = self._get_historicals(symbols, span='day', bounds="extended")
+		if span != 'day':
+			first_keys = dict()
+			for info in historical_info:
+				if info is not None:
+					first_keys.setdefault(info['symbol'], info['begins_at'])
+			earlier_info = self._get_historicals(symbols, span=span, bounds="regular")
+			historical_info = [
+				info for info in earlier_info
+				if info is not None
+				and (info['symbol'] not in first_keys or info['begins_at'] < first_keys[info['symbol']])
+			] + historical_info
+
+		return parse_historicals([
+			info for info in historical_info
+			if info is not None and info['symbol'] in last_keys and info['begins_at'] > last_keys[info['symbol']]
+		])
 
-		stock_info_dict = defaultdict(list)
-		for info in historical_info:
-			stock_info_dict[info['symbol']].append(info)
-
-		stock_info_dataframes = {symbol: pd.DataFrame(stock_info_dict[symbol]) for symbol in stock_info_dict}
-
-		stock_info_dict = defaultdict(list)
-		for info in additional_historical_info:
-			stock_info_dict[info['symbol']].append(info)
-
-		additional_historical_info_df = {symbol: pd.DataFrame(stock_info_dict[symbol]) for symbol in stock_info_dict}
-
-		for symbol in stock_info_dataframes:
-			latest_df = stock_info_dataframes[symbol]
-			latest_df['begins_at'] = pd.to_datetime(latest_df['begins_at'])
-			df = additional_historical_info_df[symbol]
-			df['begins_at'] = pd.to_datetime(df['begins_at'])
-			df_2 = df.loc[df.begins_at < latest_df.begins_at[0]]
-			df_3 = df_2.loc[df_2.begins_at > (latest_df.begins_at[0] - datetime.timedelta(days=3))]
-			stock_info_dataframes[symbol] = pd.concat([df_3, latest_df], ignore_index=True)
-
-		for symbol in stock_info_dataframes:
-			updated_df = stock_info_dataframes[symbol]
-			updated_df['begins_at'] = pd.to_datetime(updated_df['begins_at'])
-			updated_df['open_price'] = updated_df['open_price'].astype(float)
-			updated_df['close_price'] = updated_df['close_price'].astype(float)
-			updated_df['low_price'] = updated_df['low_price'].astype(float)
-			updated_df['high_price'] = updated_df['high_price'].astype(float)
-			updated_df['uuid'] = [str(uuid.uuid4()) for _ in range(len(updated_df))]
-			if symbol not in self._stock_info:
-				self._stock_info[symbol] = updated_df
-			else:
-				updated_df = updated_df[updated_df['begins_at'] > list(self._stock_info[symbol]['begins_at'])[-1]]
-				if len(updated_df) > 0:
-					log_info(
-						f"[StockHistoricalCollector] "
-						f"Appending updated historical info for stock {symbol}: {updated_df}..."
-					)
-					self._stock_info[symbol] = pd.concat([self._stock_info[symbol], updated_df], ignore_index=True)
-
-		return stock_info_dataframes
+	@staticmethod
+	def _delta_span(last_begins_at: datetime.datetime) -> str:
+		"""
+		Smallest span whose response still contains every bar after last_begins_at. The 'day' span only covers the
+		latest session, so it is used when the last stored bar is from today.
+		"""
+		now = get_datetime()
+		if last_begins_at.astimezone(now.tzinfo).date() == now.date():
+			return 'day'
+		for span, length in DELTA_SPANS:
+			if now - last_begins_at < length:
+				return span
+		return DELTA_SPANS[-1][0]
+
+	def _append_bars(self, symbol: str, columns: Dict[str, object], archive: bool = True):
+		if symbol not in self._stock_info:
+			self._stock_info[symbol] = BarStore(retention=self._retention)
+			self._aggregators[symbol] = {
+				resolution: BarAggregator(symbol, resolution, retention=self._retention)
+				for resolution in self._resolutions if resolution != BASE_RESOLUTION
+			}
+			for resolution in self._resolutions:
+				self._indicator_engines[resolution][symbol] = IndicatorEngine(self._get_store(symbol, resolution))
+		else:
+			columns = select_rows(columns, columns['begins_at'] > self._stock_info[symbol].last('begins_at'))
+		if len(columns['begins_at']) > 0:
+			columns['bar_id'] = make_bar_ids(symbol, columns['begins_at'])
+			self._stock_info[symbol].append(columns)
+			for aggregator in self._aggregators[symbol].values():
+				aggregator.update(columns)
+			if archive:
+				try:
+					self._archive.append(symbol, columns)
+				except Exception as e:
+					log_error(f"[StockHistoricalCollector] Error when archiving bars for {symbol}.", e)
 
 	def stop(self):
 		self._running = False
@@ -117,46 +290,125 @@ class StockHistoricalCollector(Thread):
 			except Exception as e:
 				log_error(f"[StockHistoricalCollector] Error when updating historical info.", e)
 				try:
-					login()
+					self._broker.login()
 					log_info(f"[StockHistoricalCollector] Re-login to the account.")
 				except Exception as login_error:
 					log_error(f"[StockHistoricalCollector] Error when logging in.", login_error)
-			time.sleep(self._sleep_interval)
+			sleep(self._next_fetch_delay())
+
+	def _next_fetch_delay(self) -> float:
+		"""
+		Clock seconds until the next fetch: BAR_SETTLE_DELAY after the next 5-minute close, or BAR_RETRY_INTERVAL while
+		some symbol misses the bar of the last close and the close is less than BAR_RETRY_WINDOW seconds ago.
+		"""
+		now = get_datetime()
+		last_close = now.replace(minute=now.minute - now.minute % 5, second=0, microsecond=0)
+		since_close = (now - last_close).total_seconds()
+		if since_close < BAR_SETTLE_DELAY:
+			return BAR_SETTLE_DELAY - since_close
+		if since_close < BAR_RETRY_WINDOW and not self._has_bars_until(last_close):
+			return BAR_RETRY_INTERVAL
+		return (last_close + BAR_LENGTH - now).total_seconds() + BAR_SETTLE_DELAY
+
+	def _has_bars_until(self, close: datetime.datetime) -> bool:
+		"""
+		Whether every symbol has the bar closing at close.
+		"""
+		last_begins_at = [
+			self._stock_info[symbol].last('begins_at') if symbol in self._stock_info else None
+			for symbol in self._symbols
+		]
+		return all([begins_at is not None and begins_at >= close - BAR_LENGTH for begins_at in last_begins_at])
+
+	def wait_for_new_bars(self, timeout: Optional[float] = None) -> List[str]:
+		"""
+		Block until new 5-minute bars are published and return the symbols that got new bars since the previous call,
+		or an empty list after timeout seconds. Meant for a single consumer evaluating the symbols with fresh data.
+		"""
+		with self._new_bars:
+			self._new_bars.wait_for(
+				lambda: len(self._new_bar_symbols) > 0, real_seconds(timeout) if timeout is not None else None)
+			symbols = [symbol for symbol in self._symbols if symbol in self._new_bar_symbols]
+			self._new_bar_symbols.clear()
+		return symbols
+
+	def _resolution_snapshots(self, resolution: str) -> Dict[str, BarSnapshot]:
+		if resolution not in self._snapshots:
+			raise ValueError(f"Resolution {resolution} is not collected, collected: {', '.join(self._resolutions)}.")
+		return self._snapshots[resolution]
+
+	def get_snapshot(
+		self,
+		symbol: str,
+		metadata_list: Optional[List[HjkMetadata]] = None,
+		bollinger: Optional[BollingerMetadata] = None,
+		rsi_metadata: Optional[RSIMetadata] = None,
+		resolution: str = BASE_RESOLUTION
+	) -> Optional[BarSnapshot]:
+		"""
+		Latest published snapshot of the symbol's bars of the given resolution including the requested indicators.
+		Indicators requested for the first time are registered with the collector, which maintains them from its next
+		cycle on, until then they are computed for the current snapshot only. Coarser resolutions only contain
+		completed bars, see get_partial_bar for the bar being built.
+		"""
+		snapshot = self._resolution_snapshots(resolution).get(symbol)
+		if snapshot is None:
+			return None
+		if metadata_list is None:
+			metadata_list = []
+		specs = indicator_specs(metadata_list, bollinger, rsi_metadata)
+		if snapshot.indicator_specs.issuperset(specs):
+			return snapshot
+
+		derived_snapshot = self._derived_snapshots[resolution].get(symbol)
+		if derived_snapshot is not None and derived_snapshot.version == snapshot.version \
+			and derived_snapshot.indicator_specs.issuperset(specs):
+			return derived_snapshot
+		self._indicator_engines[resolution][symbol].register(metadata_list, bollinger, rsi_metadata)
+		derived_snapshot = snapshot.with_columns(
+			compute_indicators(snapshot.columns, metadata_list, bollinger, rsi_metadata), specs)
+		self._derived_snapshots[resolution][symbol] = derived_snapshot
+		return derived_snapshot
 
 	def get_historical_info_by_symbol(
 		self,
 		symbol: str,
 		metadata_list: Optional[List[HjkMetadata]] = None,
 		bollinger: Optional[BollingerMetadata] = None,
-		rsi_metadata: Optional[RSIMetadata] = None
+		rsi_metadata: Optional[RSIMetadata] = None,
+		resolution: str = BASE_RESOLUTION
 	) -> Optional[pd.DataFrame]:
-		if symbol in self._stock_info:
-			df = self._stock_info[symbol]
-
-			if metadata_list is None:
-				metadata_list = []
-
-			for metadata in metadata_list:
-				interval = metadata.interval
-				rsv_key = f'rsv_{interval}'
-				term_key = f'term_line_{interval}'
-				df[rsv_key] = (df['close_price'] - df['low_price'].rolling(window=interval).min()) / (
-					df['high_price'].rolling(window=interval).max() - df['low_price'].rolling(window=interval).min()
-				) * 100
-				df[term_key] = df[rsv_key]
-				for smooth_parameters in metadata.smooth_parameters:
-					df[term_key] = df[term_key].rolling(window=smooth_parameters).mean()
-				if metadata.std_multiplier > 0:
-					df[term_key] = df[term_key] + df['close_price'].rolling(
-						window=metadata.std_interval).std() * metadata.std_multiplier
-			if bollinger is not None:
-				df['SMA'] = df['close_price'].rolling(bollinger.window).mean()
-				df['STD'] = df['close_price'].rolling(bollinger.window).std()
-				df['upper_band'] = df['SMA'] + bollinger.no_of_std * df['STD']
-				df['lower_band'] = df['SMA'] - bollinger.no_of_std * df['STD']
-
-			if rsi_metadata is not None:
-				# Calculate RSI
-				df['rsi'] = ta.momentum.RSIIndicator(df['close_price'], window=rsi_metadata.window_size).rsi()
-			return df
+		snapshot = self.get_snapshot(symbol, metadata_list, bollinger, rsi_metadata, resolution)
+		if snapshot is not None:
+			return snapshot.frame()
+		return None
+
+	def get_partial_bar(self, symbol: str, resolution: str) -> Optional[Mapping[str, object]]:
+		"""
+		The not yet completed bar of a coarser resolution, None if there is none.
+		"""
+		self._resolution_snapshots(resolution)
+		if resolution == BASE_RESOLUTION or symbol not in self._aggregators:
+			return None
+		return self._aggregators[symbol][resolution].partial_bar
+
+	def get_bar_count(self, symbol: str, resolution: str = BASE_RESOLUTION) -> int:
+		snapshots = self._resolution_snapshots(resolution)
+		if symbol in snapshots:
+			return len(snapshots[symbol])
+		return 0
+
+	def get_last_bar_id(self, symbol: str, resolution: str = BASE_RESOLUTION) -> Optional[int]:
+		snapshots = self._resolution_snapshots(resolution)
+		if symbol in snapshots:
+			return snapshots[symbol].last('bar_id')
+		return None
+
+	def get_bar_row(self, symbol: str, bar_id: Optional[int], resolution: str = BASE_RESOLUTION) -> Optional[int]:
+		"""
+		Row of the bar in the DataFrame returned by get_historical_info_by_symbol, None if the bar is not stored.
+		"""
+		snapshots = self._resolution_snapshots(resolution)
+		if symbol in snapshots:
+			return snapshots[symbol].row_of(bar_id)
 		return None
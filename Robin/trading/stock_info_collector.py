@@ -1,10 +1,10 @@
-import time
-
 from threading import Thread
 from typing import Optional
 
-import robin_stocks.robinhood.stocks as robin_stocks
-from util.util import log_info, log_error, login
+from trading.broker import Broker, get_broker
+from trading.fetch_scheduler import FetchScheduler, get_default_fetch_scheduler
+from trading.quote_cache import get_quote_cache
+from util.util import get_datetime, log_info, log_error, sleep
 
 
 class StockInfoCollector(Thread):
@@ -13,34 +13,48 @@ class StockInfoCollector(Thread):
 	@params:
 	symbols: Stock symbols
 	interval: price collection time interval
+	fetch_scheduler: scheduler batching the quote requests, shared with the other collectors by default
+	broker: broker serving the quotes, the one set by set_broker by default
 	"""
 
-	def __init__(self, symbols, interval=5):
+	def __init__(
+		self,
+		symbols,
+		interval=5,
+		fetch_scheduler: Optional[FetchScheduler] = None,
+		broker: Optional[Broker] = None
+	):
 		super().__init__()
 		log_info(f"Collecting stock prices for: {', '.join(symbols)}.")
 		self._price_store = [[] for _ in symbols]
 		self._symbols = symbols
 		self._interval = interval
+		self._fetch_scheduler = fetch_scheduler if fetch_scheduler is not None else get_default_fetch_scheduler()
+		self._broker = broker if broker is not None else get_broker()
 		self._running = True
 
 	def _get_prices(self):
-		prices = robin_stocks.get_latest_price(self._symbols, includeExtendedHours=True)
+		results = self._fetch_scheduler.map_batches(
+			lambda batch: self._fetch_scheduler.call(self._broker.get_latest_price, batch, include_extended_hours=True),
+			self._symbols
+		)
+		prices = [price for batch_prices in results for price in batch_prices]
 		for i in range(len(prices)):
 			self._price_store[i].append(float(prices[i]))
 
 	def run(self):
 		while self._running:
-			start_time = time.time()
+			start_time = get_datetime()
 			try:
 				self._get_prices()
 			except Exception as e:
 				log_error(f"Error when updating stock prices.", e)
 				try:
-					login()
+					self._broker.login()
 					log_info(f"Re-login to the account.")
 				except Exception as login_error:
 					log_error(f"Error when logging in.", login_error)
-			time.sleep(max(0, int(self._interval - (time.time() - start_time))))
+			sleep(max(0, int(self._interval - (get_datetime() - start_time).total_seconds())))
 
 	def stop(self):
 		self._running = False
@@ -56,7 +70,4 @@ class StockInfoCollector(Thread):
 
 	@staticmethod
 	def get_current_price_by_symbol(symbol) -> Optional[float]:
-		prices = robin_stocks.get_latest_price(symbol, includeExtendedHours=True)
-		if prices:
-			return float(robin_stocks.get_latest_price(symbol, includeExtendedHours=True)[0])
-		return None
+		return get_quote_cache().price(symbol)
@@ -1,17 +1,70 @@
-from dataclasses import dataclass
+from collections import defaultdict
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta
-from typing import Optional, List
+from typing import Optional, List, Dict, Tuple
 
 import pandas as pd
 import numpy as np
 
+from trading.bar_ids import format_bar_id, parse_bar_id
+from trading.bar_store import BarSnapshot
 from trading.base_strategy import BaseStrategy, ActionMetadata, Action
+from trading.indicator_kernels import sma, wsma, ema, llv, hhv, ref, cross
 from trading.stock_historical_collector import StockHistoricalCollector, HjkMetadata, BollingerMetadata, RSIMetadata
 from trading.trading_agent import OrderMetadata, TradingAgent
 from util.util import log_info
 
 MIN_PURCHASE_GAP = 3
 
+EXCLUDED_FROM_BUYING = ["CELH", "DELL"]
+
+HJK_METADATA_LIST = [
+	HjkMetadata(interval=8, smooth_parameters=[3, 3], std_interval=21, std_multiplier=3),
+	HjkMetadata(interval=21, smooth_parameters=[5], std_interval=37, std_multiplier=2),
+	HjkMetadata(interval=55, smooth_parameters=[5], std_interval=0, std_multiplier=0)
+]
+
+BOLLINGER = BollingerMetadata(window=20, no_of_std=2)
+
+RSI_METADATA = RSIMetadata(window_size=14)
+
+PRICE_COLUMNS = ['open_price', 'close_price', 'high_price', 'low_price']
+
+
+@dataclass
+class AlphaParameters:
+	"""
+	AlphaParameters
+	Indicator parameters and thresholds of AlphaStrategy, the defaults are the ones traded live.
+	@params:
+	hjk_metadata_list: HJK term lines, a golden pit needs all of them below golden_pit_threshold
+	bollinger: Bollinger band, a close at or above the upper band is a resistance signal
+	rsi_metadata: RSI, an RSI above over_buy_threshold is an over-buy
+	golden_pit_threshold: upper bound of the term lines of a golden pit
+	over_buy_threshold: lower bound of the RSI of an over-buy
+	sell_margin: a sell needs the upper band at least this factor above the highest buy price
+	stop_loss: a close at or below this factor of the high since entry takes the loss
+	"""
+	hjk_metadata_list: List[HjkMetadata] = field(default_factory=lambda: list(HJK_METADATA_LIST))
+	bollinger: BollingerMetadata = field(default_factory=lambda: BOLLINGER)
+	rsi_metadata: RSIMetadata = field(default_factory=lambda: RSI_METADATA)
+	golden_pit_threshold: float = 15
+	over_buy_threshold: float = 80
+	sell_margin: float = 1.005
+	stop_loss: float = 0.95
+
+	def term_lines(self) -> List[str]:
+		return [f'term_line_{metadata.interval}' for metadata in self.hjk_metadata_list]
+
+	def signal_columns(self) -> List[str]:
+		"""
+		Columns of the snapshot the signals are evaluated on.
+		"""
+		return PRICE_COLUMNS + self.term_lines() + ['upper_band', 'rsi']
+
+
+DEFAULT_PARAMETERS = AlphaParameters()
+
 
 @dataclass
 class MainForceResult:
@@ -19,22 +72,114 @@ class MainForceResult:
 	main_force_pulling_up: List[bool]
 
 
+@dataclass
+class AlphaSignals:
+	"""
+	Signals of the last bar, one entry per symbol row of the evaluated matrix, and main_force_pulling_up of every bar.
+	"""
+	golden_pit: np.ndarray
+	golden_cross: np.ndarray
+	main_force_entry: np.ndarray
+	main_force_pulling_up: np.ndarray
+
+
+@dataclass
+class AlphaSignalHistory:
+	"""
+	Signals of every bar, one row per symbol of the evaluated matrix. The signal of a bar only depends on the bars
+	up to it, so the history of a whole session is computed once instead of once per bar.
+	"""
+	golden_pit: np.ndarray
+	golden_cross: np.ndarray
+	main_force_entry: np.ndarray
+	has_resistance_signal: np.ndarray
+
+
+@dataclass
+class SellSignalState:
+	"""
+	Sell-side state of a symbol, advanced by the bars evaluated since the previous check so a check costs O(1) per
+	new bar: the high since the position was entered, and whether a resistance signal (close above the upper band)
+	or an over-buy (RSI > 80) occurred in the open run of bars the main force is pulling up. Once the main force
+	stops pulling up, the signals of that run apply to the bar.
+	"""
+	last_bar_id: Optional[int] = None
+	entry_bar_id: Optional[int] = None
+	high_since_entry: float = np.nan
+	run_resistance_signal: bool = False
+	run_over_buy: bool = False
+	has_resistance_signal: bool = False
+	over_buy: bool = False
+
+	def _step(self, pulling_up: bool, resistance_signal: bool, over_buy: bool):
+		self.has_resistance_signal = not pulling_up and self.run_resistance_signal
+		self.over_buy = not pulling_up and self.run_over_buy
+		if pulling_up:
+			self.run_resistance_signal = self.run_resistance_signal or resistance_signal
+			self.run_over_buy = self.run_over_buy or over_buy
+		else:
+			self.run_resistance_signal = False
+			self.run_over_buy = False
+
+	def update(
+		self,
+		snapshot: BarSnapshot,
+		columns: Dict[str, np.ndarray],
+		main_force_pulling_up: np.ndarray,
+		entry_bar_id: Optional[int],
+		over_buy_threshold: float = DEFAULT_PARAMETERS.over_buy_threshold
+	):
+		"""
+		Advance to the last of the given bars, the first rows of the snapshot. Bars already seen are skipped; without
+		a known previous bar the state is rebuilt from the start of the current pulling-up run.
+		"""
+		last_row = len(main_force_pulling_up) - 1
+		previous_row = snapshot.row_of(self.last_bar_id)
+		rebuild = previous_row is None or previous_row > last_row
+		if rebuild:
+			not_pulling_up = np.flatnonzero(~main_force_pulling_up[:last_row])
+			previous_row = not_pulling_up[-1] - 1 if len(not_pulling_up) > 0 else -1
+			self.run_resistance_signal = False
+			self.run_over_buy = False
+
+		for row in range(previous_row + 1, last_row + 1):
+			self._step(
+				bool(main_force_pulling_up[row]),
+				bool(columns['close_price'][row] >= columns['upper_band'][row]),
+				bool(columns['rsi'][row] > over_buy_threshold)
+			)
+			self.high_since_entry = max(self.high_since_entry, columns['high_price'][row])
+
+		if rebuild or entry_bar_id != self.entry_bar_id:
+			entry_row = snapshot.row_of(entry_bar_id)
+			entry_row = min(entry_row, last_row) if entry_row is not None else 0
+			self.high_since_entry = columns['high_price'][entry_row:last_row + 1].max()
+			self.entry_bar_id = entry_bar_id
+		self.last_bar_id = int(snapshot.values('bar_id')[last_row])
+
+
 class AlphaStrategy(BaseStrategy):
-	def __init__(self, stock_info_collector: StockHistoricalCollector, trading_agent: TradingAgent):
+	def __init__(
+		self,
+		stock_info_collector: StockHistoricalCollector,
+		trading_agent: TradingAgent,
+		parameters: AlphaParameters = DEFAULT_PARAMETERS
+	):
 		super().__init__(stock_info_collector, trading_agent)
+		self._parameters = parameters
+		self._sell_states: Dict[str, SellSignalState] = dict()
 
-	@staticmethod
-	def gold_cross(df: pd.DataFrame) -> List[bool]:
-		close_prices = df['close_price'].values
-		low_prices = df['low_price'].values
-		high_prices = df['high_price'].values
+	@property
+	def parameters(self) -> AlphaParameters:
+		return self._parameters
 
-		def sma(values: np.array, window):
-			return np.array(pd.Series(values).rolling(window).mean())
-
-		def cross(series1, series2):
-			return (series1 > series2) & (np.roll(series1, 1) <= np.roll(series2, 1))
+	@staticmethod
+	def _golden_pit(columns: Dict[str, np.ndarray], parameters: AlphaParameters) -> np.ndarray:
+		return np.logical_and.reduce(
+			[columns[term_line] < parameters.golden_pit_threshold for term_line in parameters.term_lines()])
 
+	@staticmethod
+	def _gold_cross(close_prices: np.ndarray, low_prices: np.ndarray, high_prices: np.ndarray) -> np.ndarray:
 		AL = (close_prices + low_prices + high_prices) / 3
 		AO = sma(AL, 5) - sma(AL, 13)
 		BBD = (AO - sma(AO, 3)) * 100
@@ -44,40 +189,19 @@ class AlphaStrategy(BaseStrategy):
 		rsv1 = BBD
 		rsv2 = BBD_support
 
-		return list(cross(rsv1, rsv2))
+		return cross(rsv1, rsv2)
 
 	@staticmethod
-	def main_force_data(df: pd.DataFrame) -> MainForceResult:
-		close_prices = df['close_price'].values
-		open_prices = df['open_price'].values
-		low_prices = df['low_price'].values
-		high_prices = df['high_price'].values
-
-		# Define calculation functions
-		def sma(values: np.array, window):
-			return np.array(pd.Series(values).rolling(window).mean())
-
-		def wsma(values: np.array, window, weight):
-			wsma = np.full_like(values, np.nan)
-			for i in range(len(values)):
-				if i == 0:
-					wsma[i] = np.mean(values[:window])
-				else:
-					wsma[i] = (values[i] * weight + wsma[i-1] * (window - weight)) / window
-			return wsma
-
-		def ema(values, window):
-			return np.array(pd.Series(values).ewm(span=window, adjust=False).mean())
-
-		def llv(values, window):
-			return np.array(pd.Series(values).rolling(window).min())
-
-		def hhv(values, window):
-			return np.array(pd.Series(values).rolling(window).max())
-
-		def ref(values, period):
-			return np.roll(values, period)
+	def gold_cross(df: pd.DataFrame) -> List[bool]:
+		return list(AlphaStrategy._gold_cross(df['close_price'].values, df['low_price'].values, df['high_price'].values))
 
+	@staticmethod
+	def _main_force(
+		open_prices: np.ndarray,
+		close_prices: np.ndarray,
+		low_prices: np.ndarray,
+		high_prices: np.ndarray
+	) -> Tuple[np.ndarray, np.ndarray]:
 		# Perform calculations
 		var1 = ref((low_prices + open_prices + close_prices + high_prices) / 4, 1)
 		with np.errstate(divide='ignore', invalid='ignore'):
@@ -93,39 +217,161 @@ class AlphaStrategy(BaseStrategy):
 		var41 = hhv(high_prices, 33)
 		var51 = ema(np.where(high_prices >= var41, var31, 0), 3)
 
-		main_force_entry = list(var5 > ref(var5, 1))
+		main_force_entry = var5 > ref(var5, 1)
 
-		main_force_pulling_up = list(var51 < ref(var51, 1))
-		return MainForceResult(main_force_entry=main_force_entry, main_force_pulling_up=main_force_pulling_up)
+		main_force_pulling_up = var51 < ref(var51, 1)
+		return main_force_entry, main_force_pulling_up
 
-	def action(self, symbol: str, test_datetime: Optional[datetime] = None) -> ActionMetadata:
-		should_buy = super().should_buy(symbol)
-		if symbol in ["CELH", "DELL"]:
-			should_buy = False
-		should_sell = super().should_sell(symbol)
-		action: Action = Action.HOLD
-		if not should_buy and not should_sell:
-			return ActionMetadata(action=action, amount=0, uuid="")
+	@staticmethod
+	def main_force_data(df: pd.DataFrame) -> MainForceResult:
+		main_force_entry, main_force_pulling_up = AlphaStrategy._main_force(
+			df['open_price'].values, df['close_price'].values, df['low_price'].values, df['high_price'].values)
+		return MainForceResult(main_force_entry=list(main_force_entry), main_force_pulling_up=list(main_force_pulling_up))
+
+	@staticmethod
+	def signals(columns: Dict[str, np.ndarray], parameters: AlphaParameters = DEFAULT_PARAMETERS) -> AlphaSignals:
+		"""
+		Evaluate the signals of the last bar for (symbols x bars) matrices of the signal columns in one pass.
+		"""
+		golden_pit = AlphaStrategy._golden_pit(columns, parameters)
+		golden_cross = AlphaStrategy._gold_cross(columns['close_price'], columns['low_price'], columns['high_price'])
+		main_force_entry, main_force_pulling_up = AlphaStrategy._main_force(
+			columns['open_price'], columns['close_price'], columns['low_price'], columns['high_price'])
 
-		df: pd.DataFrame = self._stock_info_collector.get_historical_info_by_symbol(
+		return AlphaSignals(
+			golden_pit=golden_pit[:, -1],
+			golden_cross=golden_cross[:, -1],
+			main_force_entry=main_force_entry[:, -1],
+			main_force_pulling_up=main_force_pulling_up
+		)
+
+	@staticmethod
+	def signal_history(
+		columns: Dict[str, np.ndarray],
+		parameters: AlphaParameters = DEFAULT_PARAMETERS
+	) -> AlphaSignalHistory:
+		"""
+		Evaluate the signals of every bar for (symbols x bars) matrices of the signal columns.
+		"""
+		golden_pit = AlphaStrategy._golden_pit(columns, parameters)
+		golden_cross = AlphaStrategy._gold_cross(columns['close_price'], columns['low_price'], columns['high_price'])
+		main_force_entry, main_force_pulling_up = AlphaStrategy._main_force(
+			columns['open_price'], columns['close_price'], columns['low_price'], columns['high_price'])
+
+		# Count the resistance signals of the pulling-up run up to each bar: the run starts after the last bar the
+		# main force was not pulling up. A bar that ends a run gets the signals of the run before it.
+		bars = np.arange(main_force_pulling_up.shape[-1])
+		run_start = np.maximum.accumulate(np.where(main_force_pulling_up, -1, bars), axis=-1)
+		resistance_count = np.cumsum(
+			main_force_pulling_up & (columns['close_price'] >= columns['upper_band']), axis=-1)
+		run_resistance_signal = resistance_count > np.where(
+			run_start >= 0, np.take_along_axis(resistance_count, np.maximum(run_start, 0), axis=-1), 0)
+		has_resistance_signal = np.zeros_like(main_force_pulling_up)
+		has_resistance_signal[:, 1:] = ~main_force_pulling_up[:, 1:] & run_resistance_signal[:, :-1]
+
+		return AlphaSignalHistory(
+			golden_pit=golden_pit,
+			golden_cross=golden_cross,
+			main_force_entry=main_force_entry,
+			has_resistance_signal=has_resistance_signal
+		)
+
+	@staticmethod
+	def recently_bought(snapshot: BarSnapshot, bar_count: int, active_orders: List[OrderMetadata]) -> bool:
+		"""
+		Whether an active order was placed within the last MIN_PURCHASE_GAP of the first bar_count bars.
+		"""
+		for active_order in active_orders:
+			order_row = snapshot.row_of(parse_bar_id(active_order.uuid))
+			if order_row is not None and bar_count - MIN_PURCHASE_GAP <= order_row < bar_count:
+				return True
+		return False
+
+	def should_buy(
+		self,
+		symbol: str,
+		snapshot: Optional[BarSnapshot] = None,
+		active_orders: Optional[List[OrderMetadata]] = None
+	) -> bool:
+		return symbol not in EXCLUDED_FROM_BUYING and super().should_buy(symbol, snapshot, active_orders)
+
+	def get_snapshot(self, symbol: str) -> Optional[BarSnapshot]:
+		return self._stock_info_collector.get_snapshot(
 			symbol=symbol,
-			metadata_list=[
-				HjkMetadata(interval=8, smooth_parameters=[3, 3], std_interval=21, std_multiplier=3),
-				HjkMetadata(interval=21, smooth_parameters=[5], std_interval=37, std_multiplier=2),
-				HjkMetadata(interval=55, smooth_parameters=[5], std_interval=0, std_multiplier=0)
-			],
-			bollinger=BollingerMetadata(window=20, no_of_std=2),
-			rsi_metadata=RSIMetadata(window_size=14)
+			metadata_list=self._parameters.hjk_metadata_list,
+			bollinger=self._parameters.bollinger,
+			rsi_metadata=self._parameters.rsi_metadata
 		)
 
-		if test_datetime:
-			df = df.loc[df["begins_at"] < test_datetime - timedelta(minutes=5)]
+	def action(self, symbol: str, test_datetime: Optional[datetime] = None) -> ActionMetadata:
+		return self.action_batch([symbol], test_datetime)[symbol]
+
+	def action_batch(self, symbols: List[str], test_datetime: Optional[datetime] = None) -> Dict[str, ActionMetadata]:
+		"""
+		Decide the action of every symbol. The bars of the symbols to evaluate are stacked into (symbols x bars)
+		matrices and their signals computed in one vectorized pass. Symbols are grouped by their number of bars, so
+		each row holds exactly the bars the symbol is evaluated on; all symbols share one group in practice. A symbol
+		whose evaluation raises is held and listed in failed_symbols, the others are decided as usual.
+		"""
+		self._failed_symbols = []
+		actions: Dict[str, ActionMetadata] = dict()
+		groups: Dict[int, List[Tuple[str, BarSnapshot, List[OrderMetadata], bool, bool]]] = defaultdict(list)
+		for symbol in symbols:
+			try:
+				snapshot = self.get_snapshot(symbol)
+				# Read once, the OrderTracker thread replaces the list when a sell fills.
+				active_orders = self._trade_agent.get_active_orders(symbol)
+				should_buy = self.should_buy(symbol, snapshot, active_orders)
+				should_sell = self.should_sell(symbol, snapshot, active_orders)
+				if not should_buy and not should_sell:
+					actions[symbol] = ActionMetadata(action=Action.HOLD, amount=0, uuid="")
+					continue
 
-		active_orders: list[OrderMetadata] = self._trade_agent.get_active_orders(symbol)
-		main_force_data: MainForceResult = AlphaStrategy.main_force_data(df)
-		golden_cross: list[bool] = AlphaStrategy.gold_cross(df)
-		uuids = list(df['uuid'])
-		uuid = uuids[-1]
+				bar_count = len(snapshot)
+				if test_datetime:
+					bar_count = int(snapshot.values('begins_at').searchsorted(
+						pd.Timestamp(test_datetime - timedelta(minutes=5))))
+				if bar_count == 0:
+					actions[symbol] = ActionMetadata(action=Action.HOLD, amount=0, uuid="")
+					continue
+				groups[bar_count].append((symbol, snapshot, active_orders, should_buy, should_sell))
+			except Exception as e:
+				actions[symbol] = self._hold_failed(symbol, e)
+
+		for bar_count, group in groups.items():
+			try:
+				columns = {
+					name: np.stack([snapshot.values(name)[:bar_count] for _, snapshot, _, _, _ in group])
+					for name in self._parameters.signal_columns()
+				}
+				signals = AlphaStrategy.signals(columns, self._parameters)
+			except Exception as e:
+				for symbol, _, _, _, _ in group:
+					actions[symbol] = self._hold_failed(symbol, e)
+				continue
+			for row, (symbol, snapshot, active_orders, should_buy, should_sell) in enumerate(group):
+				try:
+					actions[symbol] = self._decide(
+						symbol, snapshot, active_orders, bar_count, columns, signals, row, should_buy, should_sell)
+				except Exception as e:
+					actions[symbol] = self._hold_failed(symbol, e)
+		return {symbol: actions[symbol] for symbol in symbols}
+
+	def _decide(
+		self,
+		symbol: str,
+		snapshot: BarSnapshot,
+		active_orders: List[OrderMetadata],
+		bar_count: int,
+		columns: Dict[str, np.ndarray],
+		signals: AlphaSignals,
+		row: int,
+		should_buy: bool,
+		should_sell: bool
+	) -> ActionMetadata:
+		action: Action = Action.HOLD
+		bar_row = bar_count - 1
+		uuid = format_bar_id(int(snapshot.values('bar_id')[bar_row]))
 
 		if should_buy:
 			"""
@@ -134,21 +380,18 @@ class AlphaStrategy(BaseStrategy):
 			2. golden_pit is meet
 			3. RSI < 30
 			"""
-			for active_order in active_orders:
-				if active_order.uuid in uuids[-3:]:
-					should_buy = False
-					break
-			golden_pit = list((df['term_line_8'] < 15) & (df['term_line_21'] < 15) & (df['term_line_55'] < 15))[-1]
-			# over_sold = list(df['rsi'] < 30)[-1]
-			if should_buy and golden_pit and (golden_cross[-1] or main_force_data.main_force_entry[-1]):
+			if AlphaStrategy.recently_bought(snapshot, bar_count, active_orders):
+				should_buy = False
+			golden_pit = signals.golden_pit[row]
+			# over_sold = columns['rsi'][row, -1] < 30
+			if should_buy and golden_pit and (signals.golden_cross[row] or signals.main_force_entry[row]):
 				log_info(
 					f"Buying stock {symbol} with --- "
-					f"term_line_8: {list(df['term_line_8'])[-1]}, "
-					f"term_line_21: {list(df['term_line_21'])[-1]}, "
-					f"term_line_55: {list(df['term_line_55'])[-1]}, "
-					f"main_force_entry: {main_force_data.main_force_entry[-1]}, "
-					f"golden_cross: {golden_cross[-1]}, "
-					f"rsi: {list(df['rsi'])[-1]}"
+					+ "".join(
+						f"{term_line}: {columns[term_line][row, -1]}, " for term_line in self._parameters.term_lines())
+					+ f"main_force_entry: {signals.main_force_entry[row]}, "
+					f"golden_cross: {signals.golden_cross[row]}, "
+					f"rsi: {columns['rsi'][row, -1]}"
 				)
 				action = Action.BUY
 				return ActionMetadata(action=action, amount=1, uuid=uuid)
@@ -161,22 +404,19 @@ class AlphaStrategy(BaseStrategy):
 			3. Earn 25% original price
 			4. Loss from the high_price exceeds 5%
 			"""
-			over_buys = list(df['rsi'] > 80)
 			max_buy_price = max([active_order.price for active_order in active_orders])
-			resistance_signals = [df['close_price'][i] >= df['upper_band'][i] for i in range(len(df))]
-			main_force_pulling_up = main_force_data.main_force_pulling_up
-			has_resistance_signal = False
-			over_buy = False
-			if not main_force_pulling_up[-1]:
-				i = 2
-				while main_force_pulling_up[-i] and i <= len(main_force_pulling_up):
-					if resistance_signals[-i]:
-						has_resistance_signal = True
-					if over_buys[-i]:
-						over_buy = True
-					i += 1
-			sell_price_valid = list(df['upper_band'])[-1] >= max_buy_price * 1.005
-			take_loss = list(df['close_price'])[-1] <= 0.95 * max(list(df['high_price'])[list(df['uuid']).index(uuid):])
+			sell_state = self._sell_states.setdefault(symbol, SellSignalState())
+			sell_state.update(
+				snapshot,
+				{name: values[row] for name, values in columns.items()},
+				signals.main_force_pulling_up[row],
+				parse_bar_id(active_orders[0].uuid),
+				self._parameters.over_buy_threshold
+			)
+			has_resistance_signal = sell_state.has_resistance_signal
+			over_buy = sell_state.over_buy
+			sell_price_valid = columns['upper_band'][row, -1] >= max_buy_price * self._parameters.sell_margin
+			take_loss = columns['close_price'][row, -1] <= self._parameters.stop_loss * sell_state.high_since_entry
 			if has_resistance_signal and sell_price_valid:
 				log_info(
 					f"Selling stock {symbol} with --- "
@@ -1,15 +1,15 @@
 import typing
 
 from dataclasses import dataclass
-from time import sleep
 
-import robin_stocks.robinhood as robin
-
-from trading.stock_info_collector import StockInfoCollector
+from trading.account_state import Position, get_account_state
+from trading.broker import get_broker
+from trading.quote_cache import get_quote_cache
 from util.util import log_info
 
 MIN_CASH_VALUE: float = 0
 
+# Seconds a limit order is left open before it is cancelled.
 TIME_OUT = 30
 
 
@@ -23,12 +23,24 @@ class OrderDetails:
 
 
 class TradeExecutor(object):
+    """
+    TradeExecutor
+    Submits the orders of a symbol without waiting for their fills, OrderTracker follows them by their order id.
+    @params:
+    symbol: symbol traded
+    """
+
     def __init__(self, symbol: str):
-        self.instrument_id = None
         self.symbol = symbol
 
+    def _check_accepted(self, result: dict):
+        if "id" not in result:
+            raise Exception(f"Order for {self.symbol} was not accepted: {result}")
+
     def buy_stock(self, amount: float) -> OrderDetails:
-        buy_result: dict = robin.orders.order_buy_fractional_by_price(self.symbol, amount)
+        buy_result: dict = get_broker().order_buy_fractional_by_price(self.symbol, amount)
+        get_account_state().invalidate()
+        self._check_accepted(buy_result)
         order_detail = OrderDetails(order_id=buy_result["id"],
                                     symbol=self.symbol,
                                     instrument_id=buy_result["instrument_id"],
@@ -38,28 +50,27 @@ class TradeExecutor(object):
         return order_detail
 
     def limit_buy_stock(self, amount: float) -> OrderDetails:
-        market_price = StockInfoCollector.get_current_price_by_symbol(self.symbol)
+        market_price = get_quote_cache().price(self.symbol)
         price = market_price + min(0.05, market_price * 0.001)
         quantity = max(1, int(amount / price))
         log_info(f"limit buy stock: {self.symbol} with market price: {market_price} "
                  f"with limit price: {price}, quantity: {quantity}")
-        buy_result: dict = robin.orders.order(
+        buy_result: dict = get_broker().order(
             symbol=self.symbol,
             quantity=quantity,
             side="buy",
-            limitPrice=price,
-            extendedHours=True,
+            limit_price=price,
+            extended_hours=True,
             market_hours="extended_hours"
         )
-        order_id = "unknown_id"
-        if "id" in buy_result:
-            order_id = buy_result["id"]
+        get_account_state().invalidate()
+        self._check_accepted(buy_result)
 
         instrument_id = "unknown_id"
         if "instrument_id" in buy_result:
             instrument_id = buy_result["instrument_id"]
 
-        order_detail = OrderDetails(order_id=order_id,
+        order_detail = OrderDetails(order_id=buy_result["id"],
                                     symbol=self.symbol,
                                     instrument_id=instrument_id,
                                     price=price,
@@ -68,42 +79,29 @@ class TradeExecutor(object):
         return order_detail
 
     def limit_sell_stock(self, quantity: float) -> OrderDetails:
-        pre_positions = self.get_stock_positions()
-        market_price = StockInfoCollector.get_current_price_by_symbol(self.symbol)
+        market_price = get_quote_cache().price(self.symbol)
         price = market_price - min(0.05, market_price * 0.001)
         quantity = int(quantity)
-        current_cash = TradeExecutor.get_total_cash_position()
         log_info(f"limit sell stock: {self.symbol} with market price: {market_price} "
                  f"with limit price: {price}, quantity: {quantity}")
-        sell_result: dict = robin.orders.order(
+        sell_result: dict = get_broker().order(
             symbol=self.symbol,
             quantity=quantity,
             side="sell",
-            limitPrice=price,
-            extendedHours=True,
+            limit_price=price,
+            extended_hours=True,
             market_hours="extended_hours")
+        get_account_state().invalidate()
+        self._check_accepted(sell_result)
 
-        time_out = 0
-        while TradeExecutor.get_total_cash_position() - current_cash <= price * quantity * 0.95 and time_out < TIME_OUT:
-            time_out += 1
-            sleep(1)
-        share = pre_positions - self.get_stock_positions()
-        if share < quantity:
-            log_info(f"Out of {quantity} shares of stocks to be sold, only {share} shares were sold. Cancel the order.")
-            robin.orders.cancel_stock_order(sell_result["id"])
-
-        order_id = "unknown_id"
         instrument_id = "unknown_instrument_id"
-        if "id" in sell_result:
-            order_id = sell_result["id"]
-
         if "instrument_id" in sell_result:
             instrument_id = sell_result["instrument_id"]
-        order_detail = OrderDetails(order_id=order_id,
+        order_detail = OrderDetails(order_id=sell_result["id"],
                                     symbol=self.symbol,
                                     instrument_id=instrument_id,
                                     price=price,
-                                    share=share)
+                                    share=-quantity)
         log_info(f"limit_sell_stock: {order_detail}")
         return order_detail
 
@@ -111,15 +109,11 @@ class TradeExecutor(object):
         shares = round(shares, 2)
         if shares == 0:
             raise Exception("Attempting to sell 0 share of stocks...")
-        current_cash = TradeExecutor.get_total_cash_position()
-        price = StockInfoCollector.get_current_price_by_symbol(self.symbol)
-        sell_result: dict = robin.orders.order_sell_fractional_by_quantity(self.symbol, shares)
+        price = get_quote_cache().price(self.symbol)
+        sell_result: dict = get_broker().order_sell_fractional_by_quantity(self.symbol, shares)
         log_info(f"sell_result: {sell_result}")
-        time_out = 0
-        while TradeExecutor.get_total_cash_position() - current_cash <= price * shares * 0.8 and time_out < TIME_OUT:
-            time_out += 1
-            sleep(0.2)
-        price = (TradeExecutor.get_total_cash_position() - current_cash) / shares
+        get_account_state().invalidate()
+        self._check_accepted(sell_result)
         order_detail = OrderDetails(order_id=sell_result["id"],
                                     symbol=self.symbol,
                                     instrument_id=sell_result["instrument_id"],
@@ -129,51 +123,27 @@ class TradeExecutor(object):
         return order_detail
 
     def get_stock_positions(self) -> float:
-        positions: typing.List[dict] = robin.account.get_open_stock_positions()
-        for position in positions:
-            instrument_id = position["instrument_id"]
-            if self.instrument_id is None:
-                cur_symbol = robin.stocks.get_symbol_by_url(position["instrument"])
-                if cur_symbol == self.symbol:
-                    self.instrument_id = instrument_id
-            if instrument_id == self.instrument_id:
-                return float(position["quantity"])
-        return 0
+        return get_account_state().quantity(self.symbol)
 
     def get_avg_buy_price(self) -> float:
-        positions: typing.List[dict] = robin.account.get_open_stock_positions()
-        for position in positions:
-            instrument_id = position["instrument_id"]
-            if self.instrument_id is None:
-                cur_symbol = robin.stocks.get_symbol_by_url(position["instrument"])
-                if cur_symbol == self.symbol:
-                    self.instrument_id = instrument_id
-            if instrument_id == self.instrument_id:
-                return float(position["average_buy_price"])
-        return 0
+        return get_account_state().average_buy_price(self.symbol)
 
     @staticmethod
     def get_cash_position() -> float:
-        account_profile = robin.profiles.load_account_profile()
-        # cash_val = float(account_profile["portfolio_cash"])
-        cash_val = float(account_profile['buying_power'])
+        # cash_val = get_account_state().portfolio_cash()
+        cash_val = get_account_state().buying_power()
         return max(cash_val - MIN_CASH_VALUE, 0)
 
     @staticmethod
     def get_total_cash_position() -> float:
-        account_profile = robin.profiles.load_account_profile()
-        cash_val = float(account_profile["portfolio_cash"])
+        cash_val = get_account_state().portfolio_cash()
         return max(cash_val - MIN_CASH_VALUE, 0)
 
     @staticmethod
     def get_net_worth() -> float:
-        net_worth = float(robin.profiles.load_portfolio_profile()["equity"])
+        net_worth = float(get_broker().load_portfolio_profile()["equity"])
         return net_worth
 
     @staticmethod
-    def get_all_stock_positions() -> typing.List[dict]:
-        return robin.account.get_open_stock_positions()
-
-    @staticmethod
-    def get_symbol(instrument_id: str) -> str:
-        return robin.stocks.get_symbol_by_url(instrument_id)
\ No newline at end of file
+    def get_all_stock_positions() -> typing.List[Position]:
+        return get_account_state().positions()
\ No newline at end of file
@@ -1,13 +1,13 @@
 import typing
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 from datetime import datetime, timedelta
-from time import sleep
+from threading import RLock
 
-from trading.trade_executor import TradeExecutor, OrderDetails, MIN_CASH_VALUE
-from trading.stock_info_collector import StockInfoCollector
-from util.util import get_datetime, log_info
-
-TIMEOUT = 25
+from trading.account_state import Position
+from trading.order_tracker import DEFAULT_CANCEL_AFTER, OrderFill, OrderTracker
+from trading.quote_cache import get_quote_cache
+from trading.trade_executor import TradeExecutor, OrderDetails, MIN_CASH_VALUE, TIME_OUT
+from util.util import get_datetime, log_error, log_info
 
 DEFAULT_PORTION_SIZE = 1000
 
@@ -37,34 +37,82 @@ class TradeSnapshot:
 	active_pnl_percentage: typing.Dict[str, float]
 
 
+@dataclass
+class PositionPnl:
+	"""
+	PositionPnl
+	Running totals of the active orders of a symbol, updated with every order instead of summed over the orders at
+	every read. Sells realize the PnL against the average cost of the shares held.
+	"""
+	shares: float = 0
+	cost_basis: float = 0
+	# Since the agent was created.
+	realized_pnl: float = 0
+
+	@staticmethod
+	def of_orders(orders: typing.List[OrderMetadata]) -> 'PositionPnl':
+		pnl = PositionPnl()
+		pnl.reset(orders)
+		return pnl
+
+	def reset(self, orders: typing.List[OrderMetadata]):
+		"""
+		Start over from the active orders, e.g. when a sell replaces them, the realized PnL is kept.
+		"""
+		self.shares = sum([order.share for order in orders])
+		self.cost_basis = sum([order.share * order.price for order in orders])
+
+	def buy(self, share: float, price: float):
+		self.shares += share
+		self.cost_basis += share * price
+
+	def sell(self, share: float, price: float):
+		if self.shares <= 0:
+			return
+		share = min(share, self.shares)
+		average_cost = self.cost_basis / self.shares
+		self.realized_pnl += share * (price - average_cost)
+		if share == self.shares:
+			self.shares, self.cost_basis = 0, 0
+		else:
+			self.shares -= share
+			self.cost_basis -= share * average_cost
+
+	def unrealized_pnl(self, cur_price: float) -> float:
+		return self.shares * cur_price - self.cost_basis
+
+	def unrealized_pnl_percentage(self, cur_price: float) -> float:
+		if self.cost_basis > 0:
+			return self.unrealized_pnl(cur_price) / self.cost_basis * 100
+		return 0
+
+
 class TradingAgent(object):
 	def __init__(
 		self,
 		symbols: typing.List[str],
 		trade_snapshot: typing.Optional[TradeSnapshot],
-		test_mode: bool = False
+		test_mode: bool = False,
+		order_tracker: typing.Optional[OrderTracker] = None
 	):
-		self._symbols: typing.List[str] = symbols
+		get_quote_cache().watch(symbols)
 		self._executor: typing.Dict[str, TradeExecutor] = {symbol: TradeExecutor(symbol) for symbol in symbols}
-		self._cur_position: typing.Dict[str, float] = {
-			symbol: self._executor[symbol].get_stock_positions() for symbol in symbols
-		}
-		self._cash_position: float = TradeExecutor.get_cash_position()
-		self._remain_portion: int = int(self._cash_position) // DEFAULT_PORTION_SIZE
+		cur_position = {symbol: self._executor[symbol].get_stock_positions() for symbol in symbols}
+		cash_position = TradeExecutor.get_cash_position()
+		remain_portion = int(cash_position) // DEFAULT_PORTION_SIZE
 
 		if trade_snapshot is None or get_datetime() - timedelta(hours=6, minutes=30) > trade_snapshot.time:
 			net_value = TradeExecutor.get_net_worth()
-			positions: typing.List[dict] = TradeExecutor.get_all_stock_positions()
+			positions: typing.List[Position] = TradeExecutor.get_all_stock_positions()
 			active_orders = {symbol: [] for symbol in symbols}
 			for position in positions:
-				symbol = TradeExecutor.get_symbol(position["instrument"])
-				active_orders[symbol].append(
+				active_orders[position.symbol].append(
 					OrderMetadata(
 						uuid="00000000-0000-0000-0000-0000000000",
-						stock=symbol,
+						stock=position.symbol,
 						time=get_datetime(),
-						price=float(position["average_buy_price"]),
-						share=float(position["quantity"]),
+						price=position.average_buy_price,
+						share=position.quantity,
 						remain_portion=-1,
 					))
 			trade_snapshot = TradeSnapshot(
@@ -73,69 +121,200 @@ class TradingAgent(object):
 				current_net_value=net_value,
 				daily_pnl=0,
 				daily_pnl_percentage=0,
-				remain_portion=self._remain_portion,
-				positions=self._cur_position,
-				cash_position=self._cash_position,
+				remain_portion=remain_portion,
+				positions=cur_position,
+				cash_position=cash_position,
 				active_orders=active_orders,
 				active_pnl={symbol: 0 for symbol in symbols},
 				active_pnl_percentage={symbol: 0 for symbol in symbols}
 			)
 
 		if test_mode:
-			self._cur_position = {symbol: 0 for symbol in symbols}
-			self._cash_position = trade_snapshot.cash_position
+			cur_position = {symbol: 0 for symbol in symbols}
+			cash_position = trade_snapshot.cash_position
 			for symbol in symbols:
 				for active_order in trade_snapshot.active_orders[symbol]:
-					self._cur_position[symbol] += active_order.share
+					cur_position[symbol] += active_order.share
 
+		if order_tracker is None:
+			order_tracker = OrderTracker()
+			order_tracker.start()
+		self._init_state(
+			symbols, cur_position, cash_position, remain_portion, trade_snapshot.active_orders, trade_snapshot,
+			order_tracker)
+
+	def _init_state(
+		self,
+		symbols: typing.List[str],
+		cur_position: typing.Dict[str, float],
+		cash_position: float,
+		remain_portion: int,
+		active_orders: typing.Dict[str, typing.List[OrderMetadata]],
+		trade_snapshot: TradeSnapshot,
+		order_tracker: OrderTracker
+	):
+		"""
+		Set up the account and order state, shared with the agents built without a broker.
+		"""
+		self._symbols: typing.List[str] = symbols
+		self._cur_position: typing.Dict[str, float] = cur_position
+		self._cash_position: float = cash_position
+		self._remain_portion: int = remain_portion
 		self._portion_size: float = DEFAULT_PORTION_SIZE
-		self._active_orders: typing.Dict[str, typing.List[OrderMetadata]] = trade_snapshot.active_orders
+		self._active_orders: typing.Dict[str, typing.List[OrderMetadata]] = active_orders
 		for symbol in symbols:
 			if symbol not in self._active_orders:
 				self._active_orders[symbol] = []
+		self._pnl: typing.Dict[str, PositionPnl] = {
+			symbol: PositionPnl.of_orders(self._active_orders[symbol]) for symbol in symbols
+		}
 
 		self._start_trade_snapshot = trade_snapshot
+		# Guards the positions, cash and active orders, which the order tracker updates from its thread.
+		self._lock = RLock()
+		# Symbols with a submitted order not resolved yet, at most one order per symbol is in flight.
+		self._pending_symbols: typing.Set[str] = set()
+		# Portions taken by buy orders being submitted, not yet reflected in the buying power of the account.
+		self._reserved_portion: int = 0
+		# Buy orders submitted so far, tells _reserve_portion whether its cash read may have missed one.
+		self._submitted_orders: int = 0
+		self._order_listeners: typing.List[typing.Callable[[OrderMetadata], None]] = []
+		self._order_tracker = order_tracker
+
+	def add_order_listener(self, listener: typing.Callable[[OrderMetadata], None]):
+		"""
+		Call the listener with every completed order, from the order tracker thread.
+		"""
+		self._order_listeners.append(listener)
+
+	def _notify(self, order: OrderMetadata):
+		log_info(f"Completed order: {order}")
+		for listener in self._order_listeners:
+			try:
+				listener(order)
+			except Exception as e:
+				log_error(f"Exception when handling completed order of {order.stock}.", e)
+
+	def wait_for_orders(self, timeout: typing.Optional[float] = None) -> bool:
+		"""
+		Block until the submitted orders are resolved or timeout seconds passed, return whether all are resolved.
+		"""
+		return self._order_tracker.wait_until_idle(timeout)
+
+	def stop(self):
+		self._order_tracker.stop()
+
+	def _read_account(self, symbol: str) -> typing.Tuple[float, float, float]:
+		"""
+		Position and average buy price of the symbol and cash of the account, read without the lock since reading
+		them may wait on the broker.
+		"""
+		executor = self._executor[symbol]
+		return executor.get_stock_positions(), executor.get_avg_buy_price(), TradeExecutor.get_cash_position()
+
+	def _apply_account(self, symbol: str, position: float, cash_position: float):
+		"""
+		Take the values of _read_account, with the lock held.
+		"""
+		self._cur_position[symbol] = position
+		self._cash_position = cash_position
+		self._remain_portion = int(self._cash_position) // DEFAULT_PORTION_SIZE - self._reserved_portion
+
+	def _reserve_portion(self, symbol: str):
+		"""
+		Take a portion for a buy of the symbol until its order is submitted, from then on the buying power of the
+		account accounts for it. The cash is read without the lock and read again if an order was submitted meanwhile,
+		which the read might have missed.
+		"""
+		while True:
+			with self._lock:
+				submitted_orders = self._submitted_orders
+			cash_position = TradeExecutor.get_cash_position()
+			with self._lock:
+				if submitted_orders != self._submitted_orders:
+					continue
+				self._cash_position = cash_position
+				self._remain_portion = int(self._cash_position) // DEFAULT_PORTION_SIZE - self._reserved_portion
+				if self._remain_portion <= 0:
+					raise Exception(f"Insufficient fund buying: {symbol}")
+				self._reserved_portion += 1
+				self._remain_portion -= 1
+				return
 
 	def clean_positions(self, symbol, uuid: str, extended_hour: bool = False):
-		position: float = self._executor[symbol].get_stock_positions()
-		position = min(position, max(
-			position / 2, 2 * DEFAULT_PORTION_SIZE / StockInfoCollector.get_current_price_by_symbol(symbol=symbol)))
-		if extended_hour and position >= 1:
-			order: OrderDetails = self._executor[symbol].limit_sell_stock(position)
-		elif not extended_hour and position > 0:
-			order: OrderDetails = self._executor[symbol].sell_stock(position)
-		else:
-			log_info(f"Skip cleaning all position for {symbol}, extended_hour: {extended_hour}, position: {position}.")
-			return None
-		self._cur_position[symbol] = self._executor[symbol].get_stock_positions()
-		self._cash_position = TradeExecutor.get_cash_position()
-		self._remain_portion = int(self._cash_position) // DEFAULT_PORTION_SIZE
-		self._active_orders[symbol] = []
-		if self._cur_position[symbol] > 0:
-			self._active_orders[symbol].append(OrderMetadata(
+		"""
+		Submit the sell order of the position of the symbol, the sold order is reported to the order listeners.
+		"""
+		with self._lock:
+			if symbol in self._pending_symbols:
+				log_info(f"Skip cleaning position for {symbol}, an order is pending.")
+				return
+			self._pending_symbols.add(symbol)
+		# Submitted without the lock, so orders of other symbols are submitted concurrently.
+		try:
+			position: float = self._executor[symbol].get_stock_positions()
+			position = min(position, max(
+				position / 2, 2 * DEFAULT_PORTION_SIZE / get_quote_cache().price(symbol)))
+			if extended_hour and position >= 1:
+				order: OrderDetails = self._executor[symbol].limit_sell_stock(position)
+			elif not extended_hour and position > 0:
+				order: OrderDetails = self._executor[symbol].sell_stock(position)
+			else:
+				log_info(f"Skip cleaning all position for {symbol}, extended_hour: {extended_hour}, position: {position}.")
+				with self._lock:
+					self._pending_symbols.discard(symbol)
+				return
+		except Exception:
+			with self._lock:
+				self._pending_symbols.discard(symbol)
+			raise
+		self._order_tracker.track(
+			order_id=order.order_id,
+			symbol=symbol,
+			side="sell",
+			on_fill=lambda fill: self._on_sell_resolved(uuid, fill),
+			on_cancel=lambda fill: self._on_sell_resolved(uuid, fill),
+			cancel_after=TIME_OUT if extended_hour else DEFAULT_CANCEL_AFTER
+		)
+
+	def _on_sell_resolved(self, uuid: str, fill: OrderFill):
+		symbol = fill.symbol
+		position, average_buy_price, cash_position = self._read_account(symbol)
+		with self._lock:
+			self._pending_symbols.discard(symbol)
+			self._apply_account(symbol, position, cash_position)
+			if fill.quantity <= 0:
+				log_info(f"Sell order with {symbol} did not go through: {fill}!!")
+				return
+			self._pnl[symbol].sell(fill.quantity, fill.average_price)
+			self._active_orders[symbol] = []
+			if self._cur_position[symbol] > 0:
+				self._active_orders[symbol].append(OrderMetadata(
+					uuid=uuid,
+					stock=symbol,
+					time=get_datetime(),
+					price=average_buy_price,
+					share=self._cur_position[symbol],
+					remain_portion=-1,
+				))
+			# The account holds what is left at its own average price.
+			self._pnl[symbol].reset(self._active_orders[symbol])
+			sell_order = OrderMetadata(
 				uuid=uuid,
 				stock=symbol,
 				time=get_datetime(),
-				price=self._executor[symbol].get_avg_buy_price(),
-				share=self._cur_position[symbol],
-				remain_portion=-1,
-			))
-		sell_order = OrderMetadata(
-			uuid=uuid,
-			stock=symbol,
-			time=get_datetime(),
-			price=order.price,
-			share=order.share,
-			remain_portion=self._remain_portion
-		)
-		log_info(f"Completed order: {sell_order}")
-		return sell_order
+				price=fill.average_price,
+				share=-fill.quantity,
+				remain_portion=self._remain_portion
+			)
+		self._notify(sell_order)
 
 	def test_clean_all_position(self, symbol: str, uuid: str, price: float, time: datetime) -> OrderMetadata:
 		self._remain_portion += len(self._active_orders[symbol])
 		shares = self._cur_position[symbol]
 		self._cur_position[symbol] = 0
 		self._cash_position += price * shares
+		self._pnl[symbol].sell(self._pnl[symbol].shares, price)
 		self._active_orders[symbol] = []
 		sell_order = OrderMetadata(
 			uuid=uuid,
@@ -148,39 +327,66 @@ class TradingAgent(object):
 		log_info(f"Completed order: {sell_order}")
 		return sell_order
 
-	def buy(self, symbol: str, uuid: str, extended_hour: bool = False) -> OrderMetadata:
-		self._cash_position: float = TradeExecutor.get_cash_position()
-		self._remain_portion: int = int(self._cash_position) // DEFAULT_PORTION_SIZE
-		if self._remain_portion <= 0:
-			raise Exception(f"Insufficient fund buying: {symbol}")
+	def buy(self, symbol: str, uuid: str, extended_hour: bool = False):
+		"""
+		Submit a buy order of one portion, the filled order is reported to the order listeners.
+		"""
+		with self._lock:
+			if symbol in self._pending_symbols:
+				log_info(f"Skip buying {symbol}, an order is pending.")
+				return
+			self._pending_symbols.add(symbol)
+		try:
+			self._reserve_portion(symbol)
+		except Exception:
+			with self._lock:
+				self._pending_symbols.discard(symbol)
+			raise
 
-		if extended_hour:
-			order = self._executor[symbol].limit_buy_stock(self._portion_size)
-		else:
-			order: OrderDetails = self._executor[symbol].buy_stock(self._portion_size)
-		cur_position = self._cur_position[symbol]
-		time_out = 0
-		while self._executor[symbol].get_stock_positions() <= cur_position and time_out < TIMEOUT:
-			sleep(0.2)
-			time_out += 1
-		self._cur_position[symbol] = self._executor[symbol].get_stock_positions()
-		self._cash_position = TradeExecutor.get_cash_position()
-		self._remain_portion: int = int(self._cash_position) // DEFAULT_PORTION_SIZE
-
-		order_metadata = OrderMetadata(
-			uuid=uuid,
-			stock=symbol,
-			time=get_datetime(),
-			price=order.price,
-			share=self._executor[symbol].get_stock_positions() - cur_position,
-			remain_portion=self._remain_portion
+		# Submitted without the lock, so orders of other symbols are submitted concurrently.
+		try:
+			if extended_hour:
+				order = self._executor[symbol].limit_buy_stock(self._portion_size)
+			else:
+				order: OrderDetails = self._executor[symbol].buy_stock(self._portion_size)
+		except Exception:
+			with self._lock:
+				self._pending_symbols.discard(symbol)
+				self._reserved_portion -= 1
+				self._remain_portion += 1
+			raise
+		with self._lock:
+			self._reserved_portion -= 1
+			self._submitted_orders += 1
+		self._order_tracker.track(
+			order_id=order.order_id,
+			symbol=symbol,
+			side="buy",
+			on_fill=lambda fill: self._on_buy_resolved(uuid, fill),
+			on_cancel=lambda fill: self._on_buy_resolved(uuid, fill),
+			cancel_after=TIME_OUT if extended_hour else DEFAULT_CANCEL_AFTER
 		)
-		if self._cur_position[symbol] <= cur_position and not extended_hour:
-			log_info(f"Order with {symbol} did not go through: {order}!!")
-		else:
+
+	def _on_buy_resolved(self, uuid: str, fill: OrderFill):
+		symbol = fill.symbol
+		position, _, cash_position = self._read_account(symbol)
+		with self._lock:
+			self._pending_symbols.discard(symbol)
+			self._apply_account(symbol, position, cash_position)
+			if fill.quantity <= 0:
+				log_info(f"Order with {symbol} did not go through: {fill}!!")
+				return
+			order_metadata = OrderMetadata(
+				uuid=uuid,
+				stock=symbol,
+				time=get_datetime(),
+				price=fill.average_price,
+				share=fill.quantity,
+				remain_portion=self._remain_portion
+			)
 			self._active_orders[symbol].append(order_metadata)
-			log_info(f"Completed order: {order_metadata}")
-		return order_metadata
+			self._pnl[symbol].buy(order_metadata.share, order_metadata.price)
+		self._notify(order_metadata)
 
 	def test_buy(self, symbol: str, uuid: str, price: float, time: datetime) -> OrderMetadata:
 		self._remain_portion -= 1
@@ -196,33 +402,30 @@ class TradingAgent(object):
 			remain_portion=self._remain_portion
 		)
 		self._active_orders[symbol].append(order_metadata)
+		self._pnl[symbol].buy(order_metadata.share, order_metadata.price)
 		log_info(f"Completed order: {order_metadata}")
 		return order_metadata
 
 	def _get_pnl(self, symbol, cur_price: typing.Optional[float] = None):
 		if cur_price is None:
-			cur_price = StockInfoCollector.get_current_price_by_symbol(symbol=symbol)
+			cur_price = get_quote_cache().price(symbol)
 		if cur_price is None:
 			raise Exception(f"Current price for {symbol} not available.")
-		pnl = 0
-		for order in self._active_orders[symbol]:
-			pnl += order.share * (cur_price - order.price)
-		return pnl
+		return self._pnl[symbol].unrealized_pnl(cur_price)
 
 	def _get_pnl_percentage(self, symbol, cur_price: typing.Optional[float] = None):
 		if cur_price is None:
-			cur_price = StockInfoCollector.get_current_price_by_symbol(symbol=symbol)
+			cur_price = get_quote_cache().price(symbol)
 		if cur_price is None:
 			raise Exception(f"Current price for {symbol} not available.")
-		pnl = 0
-		starting_price = 0
-		for order in self._active_orders[symbol]:
-			pnl += order.share * (cur_price - order.price)
-			starting_price += order.share * order.price
-		if starting_price > 0:
-			return pnl / starting_price * 100
-		else:
-			return 0
+		return self._pnl[symbol].unrealized_pnl_percentage(cur_price)
+
+	def get_position_pnl(self, symbol) -> PositionPnl:
+		"""
+		Shares, cost basis and realized PnL of the active orders of the symbol, a copy of the running totals.
+		"""
+		with self._lock:
+			return replace(self._pnl[symbol])
 
 	def get_active_orders(self, symbol):
 		return self._active_orders[symbol]
@@ -230,43 +433,61 @@ class TradingAgent(object):
 	def get_position(self, symbol):
 		return self._cur_position[symbol]
 
+	def get_cash_position(self):
+		return self._cash_position
+
 	def snapshot(self) -> TradeSnapshot:
-		start_net_value = self._start_trade_snapshot.current_net_value
-		if get_datetime() - timedelta(hours=6, minutes=30) < self._start_trade_snapshot.time:
-			start_net_value = self._start_trade_snapshot.daily_start_net_value
+		# Read from the broker without the lock, which the order tracker needs to record the fills.
 		net_value = TradeExecutor.get_net_worth()
-		return TradeSnapshot(
-			time=get_datetime(),
-			daily_start_net_value=start_net_value,
-			current_net_value=net_value,
-			daily_pnl=net_value - start_net_value,
-			daily_pnl_percentage=round((net_value - start_net_value) / (start_net_value - MIN_CASH_VALUE) * 100, 2),
-			remain_portion=self._remain_portion,
-			positions=self._cur_position,
-			cash_position=self._cash_position,
-			active_orders=self._active_orders,
-			active_pnl={symbol: round(self._get_pnl(symbol), 2) for symbol in self._symbols},
-			active_pnl_percentage={symbol: round(self._get_pnl_percentage(symbol), 2) for symbol in self._symbols}
-		)
+		prices = get_quote_cache().prices(self._symbols)
+		missing_symbols = [symbol for symbol in self._symbols if prices[symbol] is None]
+		if missing_symbols:
+			raise Exception(f"Current price for {', '.join(missing_symbols)} not available.")
+		with self._lock:
+			start_net_value = self._start_trade_snapshot.current_net_value
+			if get_datetime() - timedelta(hours=6, minutes=30) < self._start_trade_snapshot.time:
+				start_net_value = self._start_trade_snapshot.daily_start_net_value
+			return TradeSnapshot(
+				time=get_datetime(),
+				daily_start_net_value=start_net_value,
+				current_net_value=net_value,
+				daily_pnl=net_value - start_net_value,
+				daily_pnl_percentage=round((net_value - start_net_value) / (start_net_value - MIN_CASH_VALUE) * 100, 2),
+				remain_portion=self._remain_portion,
+				positions=dict(self._cur_position),
+				cash_position=self._cash_position,
+				active_orders=self._copy_active_orders(),
+				active_pnl={symbol: round(self._get_pnl(symbol, prices[symbol]), 2) for symbol in self._symbols},
+				active_pnl_percentage={
+					symbol: round(self._get_pnl_percentage(symbol, prices[symbol]), 2) for symbol in self._symbols
+				}
+			)
+
+	def _copy_active_orders(self) -> typing.Dict[str, typing.List[OrderMetadata]]:
+		"""
+		Copy of the active orders with the lock held, snapshots are serialized while the order tracker fills orders.
+		"""
+		return {symbol: list(orders) for symbol, orders in self._active_orders.items()}
 
 	def test_snapshot(self, prices: typing.Dict[str, float], time: datetime) -> TradeSnapshot:
-		start_net_value = self._start_trade_snapshot.current_net_value
-		if time - timedelta(hours=6, minutes=30) < self._start_trade_snapshot.time:
-			start_net_value = self._start_trade_snapshot.daily_start_net_value
-		net_value = MIN_CASH_VALUE + self._cash_position + sum([
-			self._cur_position[symbol] * prices[symbol] for symbol in self._cur_position])
-		return TradeSnapshot(
-			time=time,
-			daily_start_net_value=start_net_value,
-			current_net_value=net_value,
-			daily_pnl=net_value - start_net_value,
-			daily_pnl_percentage=round((net_value - start_net_value) / (start_net_value - MIN_CASH_VALUE) * 100, 2),
-			remain_portion=self._remain_portion,
-			positions=self._cur_position,
-			cash_position=self._cash_position,
-			active_orders=self._active_orders,
-			active_pnl={symbol: round(self._get_pnl(symbol, prices[symbol]), 2) for symbol in self._symbols},
-			active_pnl_percentage={
-				symbol: round(self._get_pnl_percentage(symbol, prices[symbol]), 2) for symbol in self._symbols
-			}
-		)
+		with self._lock:
+			start_net_value = self._start_trade_snapshot.current_net_value
+			if time - timedelta(hours=6, minutes=30) < self._start_trade_snapshot.time:
+				start_net_value = self._start_trade_snapshot.daily_start_net_value
+			net_value = MIN_CASH_VALUE + self._cash_position + sum([
+				self._cur_position[symbol] * prices[symbol] for symbol in self._cur_position])
+			return TradeSnapshot(
+				time=time,
+				daily_start_net_value=start_net_value,
+				current_net_value=net_value,
+				daily_pnl=net_value - start_net_value,
+				daily_pnl_percentage=round((net_value - start_net_value) / (start_net_value - MIN_CASH_VALUE) * 100, 2),
+				remain_portion=self._remain_portion,
+				positions=dict(self._cur_position),
+				cash_position=self._cash_position,
+				active_orders=self._copy_active_orders(),
+				active_pnl={symbol: round(self._get_pnl(symbol, prices[symbol]), 2) for symbol in self._symbols},
+				active_pnl_percentage={
+					symbol: round(self._get_pnl_percentage(symbol, prices[symbol]), 2) for symbol in self._symbols
+				}
+			)
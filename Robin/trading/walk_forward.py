@@ -0,0 +1,142 @@
+import os
+
+import pandas as pd
+import pandas_market_calendars as m_cal
+import pytz
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterator, List, Optional
+
+from trading.backtester import (
+	BACKTEST_LOOKBACK, SIMULATED_CASH_POSITION, BacktestCollector, Backtester, SessionSignals,
+	SimulatedTradingAgent, load_bars, opening_snapshot, session_times
+)
+from trading.bar_archive import ARCHIVE_ROOT, BarArchive
+from trading.strategies.alpha_strategy import AlphaParameters, AlphaStrategy, DEFAULT_PARAMETERS
+from trading.trading_agent import OrderMetadata, TradeSnapshot
+from util.util import log_info
+
+# Sessions computed ahead of the fills per worker, bounds the signals held in memory on long ranges.
+PENDING_SESSIONS_PER_WORKER = 2
+
+
+@dataclass
+class WalkForwardResult:
+	"""
+	Net value (cash plus positions) after every step of every session, the filled orders and the trading snapshot
+	at the end of each session.
+	"""
+	equity_curve: pd.Series
+	orders: List[OrderMetadata]
+	trade_snapshots: List[TradeSnapshot]
+
+
+def trading_sessions(start: date, end: date) -> List[datetime]:
+	"""
+	Opening time (09:30 US/Eastern) of every NYSE trading day from start to end.
+	"""
+	timezone = pytz.timezone('US/Eastern')
+	return [
+		timezone.localize(datetime(day.year, day.month, day.day, 9, 30, 0))
+		for day in m_cal.get_calendar("NYSE").valid_days(start_date=start, end_date=end)
+	]
+
+
+def _session_signals(
+	archive_root: str,
+	symbols: List[str],
+	parameters: AlphaParameters,
+	session_start: datetime
+) -> SessionSignals:
+	"""
+	Load the bars of a session and its lookback from the archive and compute the signals, in a worker process.
+	"""
+	times = session_times(session_start)
+	bars = load_bars(BarArchive(archive_root), symbols, session_start - BACKTEST_LOOKBACK, times[-1])
+	strategy = AlphaStrategy(BacktestCollector(bars), SimulatedTradingAgent(symbols), parameters)
+	return Backtester(strategy, SimulatedTradingAgent(symbols)).signals(symbols, times)
+
+
+class WalkForward(object):
+	"""
+	WalkForward
+	Replays AlphaStrategy over a range of trading days from the bar archive, without any request to Robinhood.
+	Each session is loaded and its signals computed in a worker process, ahead of the fills. The fills run session
+	after session in this process, each session continuing from the TradeSnapshot the previous one ended with, and
+	the net values of all sessions form one equity curve.
+	@params:
+	symbols: symbols traded
+	parameters: parameters of the strategy
+	archive_root: directory of the bar archive
+	cash_position: cash of the account before the first session
+	max_workers: number of worker processes, all cores by default
+	"""
+
+	def __init__(
+		self,
+		symbols: List[str],
+		parameters: AlphaParameters = DEFAULT_PARAMETERS,
+		archive_root: str = ARCHIVE_ROOT,
+		cash_position: float = SIMULATED_CASH_POSITION,
+		max_workers: Optional[int] = None
+	):
+		self._symbols = symbols
+		self._parameters = parameters
+		self._archive_root = archive_root
+		self._cash_position = cash_position
+		self._max_workers = max_workers if max_workers is not None else os.cpu_count() or 1
+
+	def _signals(self, executor: ProcessPoolExecutor, sessions: List[datetime]) -> Iterator[SessionSignals]:
+		"""
+		Signals of the sessions in order, with at most PENDING_SESSIONS_PER_WORKER sessions per worker in flight.
+		"""
+		pending = deque()
+		for session_start in sessions:
+			pending.append(executor.submit(
+				_session_signals, self._archive_root, self._symbols, self._parameters, session_start))
+			if len(pending) >= PENDING_SESSIONS_PER_WORKER * self._max_workers:
+				yield pending.popleft().result()
+		while pending:
+			yield pending.popleft().result()
+
+	def run(self, start: date, end: date, trade_snapshot: Optional[TradeSnapshot] = None) -> WalkForwardResult:
+		"""
+		Replay the trading days from start to end, continuing from trade_snapshot if given.
+		"""
+		sessions = trading_sessions(start, end)
+		log_info(f"[WalkForward] Replaying {len(sessions)} sessions of {len(self._symbols)} stocks from {start} to "
+				 f"{end} on {self._max_workers} processes")
+		if not sessions:
+			return WalkForwardResult(equity_curve=pd.Series(dtype=float), orders=[], trade_snapshots=[])
+		if trade_snapshot is None:
+			trade_snapshot = opening_snapshot(self._symbols, self._cash_position, sessions[0])
+
+		times: List[datetime] = []
+		net_values: List[float] = []
+		orders: List[OrderMetadata] = []
+		trade_snapshots: List[TradeSnapshot] = []
+		prices: Dict[str, float] = dict()
+		with ProcessPoolExecutor(max_workers=self._max_workers) as executor:
+			for signals in self._signals(executor, sessions):
+				agent = SimulatedTradingAgent(self._symbols, trade_snapshot=trade_snapshot)
+
+				def on_step(time: datetime, step_prices: Dict[str, float]):
+					prices.update(step_prices)
+					times.append(time)
+					net_values.append(agent.net_value(prices))
+
+				orders += Backtester(AlphaStrategy(None, agent, self._parameters), agent).fill(signals, on_step)
+				session_end = signals.times[-1] + timedelta(minutes=5)
+				trade_snapshot = agent.test_snapshot(
+					{symbol: prices.get(symbol, 0.0) for symbol in self._symbols}, session_end)
+				trade_snapshots.append(trade_snapshot)
+				log_info(f"[WalkForward] Session ending {session_end}: net value {trade_snapshot.current_net_value}, "
+						 f"daily PnL {trade_snapshot.daily_pnl}")
+		return WalkForwardResult(
+			equity_curve=pd.Series(net_values, index=pd.DatetimeIndex(times), dtype=float),
+			orders=orders,
+			trade_snapshots=trade_snapshots
+		)
@@ -1,13 +1,75 @@
 import logging
 import os
-from datetime import date, datetime
+import time
+from datetime import date, datetime, timedelta
 from typing import Optional
 
 import pytz
 import pandas_market_calendars as m_cal
 import robin_stocks.robinhood.authentication as auth
 
-PACKAGE_ROOT = "/Users/meow/Desktop/AlgoTrade/Robin"
+PACKAGE_ROOT = os.getenv("ROBIN_PACKAGE_ROOT", "/Users/meow/Desktop/AlgoTrade/Robin")
+
+
+class Clock(object):
+	"""
+	Clock
+	Time source of the trading loops: get_datetime, sleep and the timeouts waited for all go through the clock set
+	by set_clock, the wall clock by default.
+	"""
+
+	def now(self) -> datetime:
+		return datetime.now(pytz.timezone('US/Eastern'))
+
+	def sleep(self, seconds: float):
+		time.sleep(seconds)
+
+	def real_seconds(self, seconds: float) -> float:
+		"""
+		Real seconds passing while the clock advances by the given seconds.
+		"""
+		return seconds
+
+
+class SimulatedClock(Clock):
+	"""
+	SimulatedClock
+	Clock starting at a given time and running faster than real time, to replay the trading loops offline.
+	@params:
+	start: time of the clock when created
+	speed: clock seconds per real second
+	"""
+
+	def __init__(self, start: datetime, speed: float = 1):
+		self._start = start
+		self._speed = speed
+		self._real_start = time.monotonic()
+
+	def now(self) -> datetime:
+		elapsed = timedelta(seconds=(time.monotonic() - self._real_start) * self._speed)
+		return (self._start + elapsed).astimezone(pytz.timezone('US/Eastern'))
+
+	def sleep(self, seconds: float):
+		time.sleep(seconds / self._speed)
+
+	def real_seconds(self, seconds: float) -> float:
+		return seconds / self._speed
+
+
+_clock: Clock = Clock()
+
+
+def set_clock(clock: Clock):
+	global _clock
+	_clock = clock
+
+
+def sleep(seconds: float):
+	_clock.sleep(seconds)
+
+
+def real_seconds(seconds: float) -> float:
+	return _clock.real_seconds(seconds)
 
 
 def log_info(msg):
@@ -50,7 +112,7 @@ def get_yyyymmdd_hhmmss_time(time: Optional[datetime]):
 
 
 def get_datetime() -> datetime:
-	return datetime.now(pytz.timezone('US/Eastern'))
+	return _clock.now()
 
 
 def get_current_hhmmss_time(time: Optional[datetime] = None):
@@ -0,0 +1,35 @@
+import dataclasses
+import json
+
+from datetime import date
+
+from trading.walk_forward import WalkForward
+from util.util import PACKAGE_ROOT, json_serial, log_info, mkdir, set_log_level
+
+START_DATE = date(2024, 6, 3)
+
+END_DATE = date(2024, 7, 31)
+
+OUTPUT_ROOT = f"{PACKAGE_ROOT}/Data/WalkForward"
+
+
+def main():
+	set_log_level()
+	with open(f"{PACKAGE_ROOT}/Config/stock_list.txt") as f:
+		stocks = f.read().split(",")
+	result = WalkForward(stocks).run(START_DATE, END_DATE)
+
+	mkdir(OUTPUT_ROOT)
+	output_name = f"{OUTPUT_ROOT}/walk_forward.{START_DATE:%Y%m%d}-{END_DATE:%Y%m%d}"
+	log_info(f"Writing equity curve and trading snapshots to: {output_name}.*...")
+	result.equity_curve.rename('net_value').to_csv(f"{output_name}.equity.csv", index_label='time')
+	with open(f"{output_name}.snapshots.json", 'w') as outfile:
+		outfile.write(json.dumps(
+			[dataclasses.asdict(snapshot) for snapshot in result.trade_snapshots], default=json_serial, indent=4))
+	for snapshot in result.trade_snapshots:
+		log_info(f"{snapshot.time}: net value {snapshot.current_net_value}, daily PnL {snapshot.daily_pnl} "
+				 f"({snapshot.daily_pnl_percentage}%)")
+
+
+if __name__ == "__main__":
+	main()